@@ -14,6 +14,9 @@ like NLTK to help you with the latter part." (project PDF)
 Job Execution:
 To run this file you need to run the following commands in the Terminal:
 $ python Task1_final.py --runner=local --no-bootstrap-mrjob title.basics.tsv > Task1_results.txt
+# shuffle the words as integer ids of a key dictionary (see common/keys.py); the first run builds the dictionary
+$ python Task1_final.py --runner=local --no-bootstrap-mrjob --build-key-dictionary words.keys title.basics.tsv
+$ python Task1_final.py --runner=local --no-bootstrap-mrjob --key-dictionary words.keys title.basics.tsv
 
 '''
 
@@ -23,6 +26,15 @@ from mrjob.step import MRStep   # To define the steps of the job
 import re                       # To create patterns for words matching
 import nltk
 from nltk.corpus import stopwords as sw  # To remove stop words
+import os
+import sys
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.compressed import CompressedInputMixin
+from common.keys import KeyEncodingMixin
 
 
 # Create a list of the stopwords from different languages
@@ -39,7 +51,10 @@ type_index = 1      # Index of the titleType within the given records "map input
 title_index = 2     # Index of the primaryTitle within the given records "map input"
 
 # Create a sub_class of the class MRJob
-class MostCommonKeywords(MRJob):
+class MostCommonKeywords(CompressedInputMixin, ProfilingMixin, KeyEncodingMixin, ResultCacheMixin, BinaryProtocolMixin,
+                         MRJob):
+    # copy the shared helpers (common/) into the working directory of every task
+    DIRS = ['../common']
 
     def mapper_get_words(self, _, line):
         '''
@@ -54,6 +69,7 @@ class MostCommonKeywords(MRJob):
         Notes:
         - We used split("\t"), since the line information are separated by tabs
         - We converted the words to lowercase then "e.g. HELLO and hello" are not treated as 2 different words.
+        - With --key-dictionary the words are replaced by their integer ids (see common/keys.py).
         '''
 
 
@@ -61,7 +77,7 @@ class MostCommonKeywords(MRJob):
         if line[type_index] in ['movie', 'short']:
             for word in WORD_RE.findall(line[title_index]):
                 if word.lower() not in stop_words:
-                    yield (word.lower(), 1)
+                    yield (self.encode_key(word.lower()), 1)
 
 
     def combiner_count_words(self, word, counts):
@@ -91,7 +107,10 @@ class MostCommonKeywords(MRJob):
                  step in our job is to find out the most 50 frequent words then the last reducer should have
                  access to all the tuples to decide.
         '''
-        yield None, (sum(counts), word)
+        total = sum(counts)
+        # every word comes to this reducer exactly once, so the words of --build-key-dictionary are counted here
+        self.record_key(word, total)
+        yield None, (total, word)
 
 
     def reducer_sort_counts(self, _, word_count_pairs):
@@ -104,13 +123,15 @@ class MostCommonKeywords(MRJob):
 
         Notes:
         sorted method has been used to sort the (#occurrences, word) tuples based on
-        the #occurrences in a descending manner
+        the #occurrences in a descending manner; words with the same count are sorted alphabetically (after
+        decode_key, so the order does not depend on the key dictionary)
         '''
 
-        top50_words = sorted(word_count_pairs, key= lambda x: x[0], reverse=True) [:50]
+        decoded_pairs = ((count, self.decode_key(word)) for count, word in word_count_pairs)
+        top50_words = sorted(decoded_pairs, key= lambda x: (-x[0], x[1])) [:50]
 
-        for word in top50_words:
-            yield word
+        for count, word in top50_words:
+            yield count, word
 
     # Define the steps of our MRJob
     def steps(self):
@@ -15,6 +15,9 @@ as keywords. You can use libraries like NLTK to help you with the latter part."
 
 To RUN:
 1. $ python Task2.py --runner=local --no-bootstrap-mrjob title.basics.tsv > Task2-results.txt
+2. shuffle the genres and words as integer ids of a key dictionary (see common/keys.py); the first run builds it:
+   $ python Task2.py --runner=local --no-bootstrap-mrjob --build-key-dictionary genres-words.keys title.basics.tsv
+   $ python Task2.py --runner=local --no-bootstrap-mrjob --key-dictionary genres-words.keys title.basics.tsv
 
 Input-
 1. title.basics.tsv
@@ -25,8 +28,18 @@ Output-
 
 from mrjob.job import MRJob
 from mrjob.step import MRStep
+import heapq
 import re
 from nltk.corpus import stopwords
+import os
+import sys
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.compressed import CompressedInputMixin
+from common.keys import KeyEncodingMixin
 
 # includes stopwords from all languages (english, german, spanish, french, italian, etc.)
 stop_words = list(stopwords.words())
@@ -34,7 +47,10 @@ stop_words = list(stopwords.words())
 WORD_RE = re.compile(r"[\w']+") # match words- either alphanumeric or an apostrophe! basically no whitespace
 # source- https://mrjob.readthedocs.io/en/latest/guides/writing-mrjobs.html
 
-class MostCommonKeywordsPerGenre(MRJob):
+class MostCommonKeywordsPerGenre(CompressedInputMixin, ProfilingMixin, KeyEncodingMixin, ResultCacheMixin,
+                                 BinaryProtocolMixin, MRJob):
+    # copy the shared helpers (common/) into the working directory of every task
+    DIRS = ['../common']
 
     def mapper_get_words(self, _, line):
         '''
@@ -62,7 +78,8 @@ class MostCommonKeywordsPerGenre(MRJob):
             for word in WORD_RE.findall(primary_title): # find all words in the title
                 for genre in WORD_RE.findall(genres):
                     if word.lower() not in stop_words: # CAPS MATTERS A != a
-                        yield ((genre, word.lower()), 1) # for each word, make a pair with every genre for this movie
+                        # for each word, make a pair with every genre for this movie (as ids with --key-dictionary)
+                        yield (self.encode_key((genre, word.lower())), 1)
 
     def combiner_count_words(self, key, counts):
         '''
@@ -90,13 +107,17 @@ class MostCommonKeywordsPerGenre(MRJob):
         '''
 
         genre, word = key
-        yield genre, (sum(counts), word)
+        total = sum(counts)
+        # every (genre, word) comes to this reducer exactly once, so --build-key-dictionary counts them here
+        self.record_key(key, total)
+        # the genre is the key of the output, which is sorted by it, so it is decoded here (there are only a few)
+        yield self.decode_key(genre), (total, word)
 
     def reducer_sort_counts(self, genre, word_count_pairs):
         '''
         Each reducer receives the words and their counts for one particular genre, which is the key. Each reducer
-        sorts the words based on their counts from highest to lowest and then yields the 15 words with the highest
-        counts.
+        finds the 15 words with the highest counts and yields them from highest to lowest count (and alphabetically
+        for the same count).
 
         :param _: key: key= genre
         :param word_count_pairs: each item of word_count_pairs is (count, word)
@@ -104,10 +125,13 @@ class MostCommonKeywordsPerGenre(MRJob):
         15 highest values!
         '''
 
-        sorted_by_count = sorted(word_count_pairs, key=lambda x: x[0], reverse=True)
+        # a genre can have more words than fit into memory, so only the 15 highest counts are kept; words with the
+        # same count are ordered alphabetically (after decode_key, so the order does not depend on the key dictionary)
+        decoded_pairs = ((count, self.decode_key(word)) for count, word in word_count_pairs)
+        top_15 = heapq.nsmallest(15, decoded_pairs, key=lambda x: (-x[0], x[1]))
 
-        for i in range(15):
-            yield (genre, sorted_by_count[i][1]), sorted_by_count[i][0]
+        for count, word in top_15:
+            yield (genre, word), count
 
 
     def steps(self):
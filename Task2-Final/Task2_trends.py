@@ -0,0 +1,176 @@
+'''
+Petio Todorov
+Wael Fato
+
+Task2_trends.py
+
+The most common keywords in the primary titles of movies (like Task1 and Task2), broken down by time: by decade
+and by year of startYear (field 5 of title.basics.tsv), for all movies and for every genre. Instead of running the
+keyword jobs once per slice, every title is read once and all slices are counted at the same time.
+
+Step 1 - for every word of a movie title the mapper yields one count per (slice, genre) the movie belongs to, e.g.
+         a Drama,Romance movie from 1994 is counted in (decade 1990, ALL), (decade 1990, Drama),
+         (decade 1990, Romance), (year 1994, ALL), (year 1994, Drama) and (year 1994, Romance). The combiners and
+         reducers sum the counts per (slice type, genre, word, slice).
+Step 2 - one reducer call per (slice type, genre, word) gets the counts of the word in all slices, i.e. its time
+         series. From it, the biggest rise of the word from one slice to the next (year over year, or decade over
+         decade) is found.
+Step 3 - one reducer call per (slice type, genre) keeps the --top-k most common words of every slice and the --top-k
+         biggest risers in heaps, so only O(slices * k) values are in memory.
+
+To RUN:
+$ python Task2_trends.py --runner=local --no-bootstrap-mrjob title.basics.tsv > Task2-trends.txt
+$ python Task2_trends.py --runner=local --no-bootstrap-mrjob --slices decade --top-k 20 title.basics.tsv
+
+Output-
+1. The trend table: one line per slice type, genre and slice, e.g.
+   ["top", "decade", "Drama", 1990]	[["love", 830], ["life", 512], ...]
+2. The biggest risers: one line per slice type and genre, e.g.
+   ["risers", "year", "ALL", null]	[["christmas", 2019, 310, 402, 92], ...] (word, slice, count in the previous
+   slice, count in the slice, rise)
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+import heapq
+import os
+import sys
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.compressed import CompressedInputMixin
+# the same words are keywords as in Task2
+from Task2 import WORD_RE, stop_words
+
+stop_words = set(stop_words)
+
+# Define the indices of the "interesting" fields within the given data records
+type_index = 1      # titleType
+title_index = 2     # primaryTitle
+year_index = 5      # startYear
+genres_index = 8    # genres
+
+all_genres = 'ALL'  # the genre of the counts over all movies
+slice_lengths = {'decade': 10, 'year': 1}  # slice type -> number of years in one slice
+
+
+class KeywordTrends(CompressedInputMixin, ProfilingMixin, ResultCacheMixin, BinaryProtocolMixin, MRJob):
+    # copy the shared helpers (common/) and Task2.py into the working directory of every task
+    FILES = ['Task2.py']
+    DIRS = ['../common']
+
+    def configure_args(self):
+        '''
+        --slices: the slice types to count, a comma separated list of decade and year
+        --top-k: the number of words per slice, and the number of risers per slice type and genre
+        '''
+        super(KeywordTrends, self).configure_args()
+        self.add_passthru_arg('--slices', default='decade,year', help='comma separated slice types: decade, year')
+        self.add_passthru_arg('--top-k', type=int, default=10, help='number of keywords per slice')
+
+    def mapper_init_slices(self):
+        self.slice_types = [slice_type for slice_type in self.options.slices.split(',') if slice_type]
+        for slice_type in self.slice_types:
+            if slice_type not in slice_lengths:
+                raise ValueError("unknown slice type %r, use %s" % (slice_type, ', '.join(slice_lengths)))
+
+    def mapper_count_slices(self, _, line):
+        '''
+        :param line: one line from the input file [tconst titleType primaryTitle originalTitle isAdult startYear
+        endYear runtimeMinutes genres]
+        :return: ((slice type, genre, word, slice), 1) for every word of the title, every slice type and every genre
+                 of the movie (and ALL)
+        '''
+        fields = line.split("\t")
+        if len(fields) <= genres_index or fields[type_index] != 'movie' or not fields[year_index].isdigit():
+            return
+
+        year = int(fields[year_index])
+        genres = [all_genres] + [genre for genre in fields[genres_index].split(',') if genre != '\\N']
+        words = [word.lower() for word in WORD_RE.findall(fields[title_index])]
+        words = [word for word in words if word not in stop_words]
+
+        for slice_type in self.slice_types:
+            length = slice_lengths[slice_type]
+            first_year = year - year % length
+            for genre in genres:
+                for word in words:
+                    yield (slice_type, genre, word, first_year), 1
+
+    def combiner_sum_counts(self, key, counts):
+        yield key, sum(counts)
+
+    def reducer_sum_counts(self, key, counts):
+        '''
+        :return: ((slice type, genre, word), (slice, count))
+        '''
+        slice_type, genre, word, first_year = key
+        yield (slice_type, genre, word), (first_year, sum(counts))
+
+    def reducer_word_series(self, key, slice_counts):
+        '''
+        Gets the counts of one word in all slices of one slice type and genre.
+
+        :return: ((slice type, genre), (word, [[slice, count], ...], biggest rise)) where biggest rise is
+                 [slice, count in the previous slice, count in the slice, rise] or None
+        '''
+        slice_type, genre, word = key
+        series = dict(slice_counts)
+        length = slice_lengths[slice_type]
+
+        best_rise = None
+        for first_year, count in series.items():
+            previous = series.get(first_year - length, 0)
+            # a rise needs the word in the previous slice, otherwise every new word would be a riser
+            if previous and (best_rise is None or count - previous > best_rise[3]):
+                best_rise = [first_year, previous, count, count - previous]
+        yield (slice_type, genre), (word, sorted(series.items()), best_rise)
+
+    def reducer_top_slices(self, key, word_series):
+        '''
+        Keeps the top-k words of every slice and the top-k risers of one slice type and genre.
+
+        :return: (("top", slice type, genre, slice), [[word, count], ...]) for every slice and
+                 (("risers", slice type, genre, None), [[word, slice, previous count, count, rise], ...])
+        '''
+        slice_type, genre = key
+        top_k = self.options.top_k
+        top_words = {}  # slice -> heap of (count, word)
+        risers = []     # heap of (rise, word, slice, previous count, count)
+
+        for word, series, best_rise in word_series:
+            for first_year, count in series:
+                heap = top_words.setdefault(first_year, [])
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (count, word))
+                elif (count, word) > heap[0]:
+                    heapq.heapreplace(heap, (count, word))
+            if best_rise is not None:
+                first_year, previous, count, rise = best_rise
+                if len(risers) < top_k:
+                    heapq.heappush(risers, (rise, word, first_year, previous, count))
+                elif (rise, word) > risers[0][:2]:
+                    heapq.heapreplace(risers, (rise, word, first_year, previous, count))
+
+        for first_year in sorted(top_words):
+            ranked = sorted(top_words[first_year], reverse=True)
+            yield ("top", slice_type, genre, first_year), [[word, count] for count, word in ranked]
+        ranked = sorted(risers, reverse=True)
+        yield ("risers", slice_type, genre, None), [[word, first_year, previous, count, rise]
+                                                     for rise, word, first_year, previous, count in ranked]
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.mapper_init_slices,
+                   mapper=self.mapper_count_slices,
+                   combiner=self.combiner_sum_counts,
+                   reducer=self.reducer_sum_counts),
+            MRStep(reducer=self.reducer_word_series),
+            MRStep(reducer=self.reducer_top_slices)
+        ]
+
+
+if __name__ == '__main__':
+    KeywordTrends.run()
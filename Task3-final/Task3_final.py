@@ -13,11 +13,32 @@ To run this file you need to run the following commands in the Terminal:
 $ python Task3_final.py --runner=local --no-bootstrap-mrjob retail1011.csv > Task3-results1011.txt
 # for the retail year 2009-2010
 $ python Task3_final.py --runner=local --no-bootstrap-mrjob retail0910.csv > Task3-results0910.txt
+# a quick approximate answer from 10% of the customers (see common/sampling.py)
+$ python Task3_final.py --runner=local --no-bootstrap-mrjob --sample-rate 0.1 retail1011.csv
+
+Every output line of a top 10 buyer has the value {"customer_id": ..., "total_revenues": ...}. With --sample-rate
+the value also has "estimated_rank": ..., "rank_ci": [lowest, highest] and "ambiguous": ..., where ambiguous
+means that customers outside the sample could push the buyer out of the top 10, and a last line has the sample rate
+and the estimated number of customers and total revenues of all customers with their 95% confidence intervals.
+
+# parse and sum blocks of 10000 lines with numpy instead of one line at a time (see common/batches.py)
+$ python Task3_final.py --runner=local --no-bootstrap-mrjob --batch-size 10000 retail1011.csv
 '''
 
 # Import required libraries
 from mrjob.job import MRJob     # To create the job
 from mrjob.job import MRStep    # To define the steps of the job
+import os
+import sys
+import numpy as np
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.compressed import CompressedInputMixin
+from common.sampling import SamplingMixin, rank_estimate, count_interval, scaled_total
+from common.batches import BatchMapperMixin, split_columns, parse_floats, group_rows, sum_by_group
 
 # Define the indices of the "interesting" fields within the given data records
 customer_ID_index = 6   # Index of the field "Customer ID" within the given records "map inputs"
@@ -61,7 +82,12 @@ def exception_handler(row):
 
 
 # Create our job class
-class MRTop10Buyers(MRJob):
+class MRTop10Buyers(CompressedInputMixin, ProfilingMixin, ResultCacheMixin, SamplingMixin, BatchMapperMixin,
+                    BinaryProtocolMixin, MRJob):
+    # copy the shared helpers (common/) into the working directory of every task
+    DIRS = ['../common']
+    # with --batch-size the mapper gets blocks of lines
+    BATCH_MAPPERS = {'mapper_get_customer_revenue': 'mapper_batch_customer_revenue'}
 
     # Define a map function for our job
     def mapper_get_customer_revenue (self, _, line):
@@ -83,12 +109,51 @@ class MRTop10Buyers(MRJob):
         '''
 
         record_fields = line.split(',')
+        # With --sample-rate, the lines of the customers outside the sample are dropped before they are parsed
+        if not self.in_sample(record_fields[customer_ID_index]):
+            return
         # Notice: The records which have errors in its values will be ignored in this implementation
         checked_line = exception_handler(record_fields)
         if checked_line != "THIS ROW HAS AN ERROR" :
             yield (checked_line[0], checked_line[1] * checked_line[2])
 
 
+    # Define the batch version of our map function
+    def mapper_batch_customer_revenue(self, lines):
+        '''
+        mapper_batch_customer_revenue:
+        It does the same as mapper_get_customer_revenue for a block of lines (with --batch-size):
+        1- splits every line based on "," and keeps the needed fields.
+        2- converts the prices and quantities of all lines with numpy, and every distinct customer ID of the block
+            only once; the lines with errors are ignored like in exception_handler.
+        3- sums the revenues of every customer of the block, so the block yields one pair per customer instead of
+            one pair per line.
+
+        :param self: a reference to the current instance of the class.
+        :param lines: a list of lines from the input file.
+        :return: intermediate key value pairs (customerID, sum of the revenues of the customer in the block).
+        '''
+
+        raw_ids, prices, quantities = split_columns(lines, ',', customer_ID_index, price_index, quantity_index)
+        prices, valid_prices = parse_floats(prices)
+        quantities, valid_quantities = parse_floats(quantities)
+        raw_ids, inverse = group_rows(raw_ids)
+
+        customer_ids = []
+        for raw_id in raw_ids:
+            try:
+                # With --sample-rate, the customers outside the sample are dropped like errors
+                customer_ids.append(int(raw_id) if self.in_sample(raw_id) else None)
+            except ValueError:
+                customer_ids.append(None)
+        valid_ids = np.array([customer_id is not None for customer_id in customer_ids])
+
+        valid = valid_prices & valid_quantities & valid_ids[inverse]
+        counts, (revenues,) = sum_by_group(inverse, len(raw_ids), valid, prices * quantities)
+        for index in np.flatnonzero(counts).tolist():
+            yield customer_ids[index], float(revenues[index])
+
+
     # Define a combiner function for our MRJob
     def combiner_sum_customer_revenues(self, customer_id, revenues):
         '''
@@ -151,7 +216,35 @@ class MRTop10Buyers(MRJob):
         top10_buyers = sorted(totalRevenues_cusID_pairs, key=lambda pair: pair[0], reverse=True)
         list_length = len(top10_buyers) if len(top10_buyers) <= 10 else 10
         for i in range(list_length):
-            yield "Customer_ID: " + str(top10_buyers[i][1]) , "With Total Revenues: "+str(top10_buyers[i][0])
+            yield "Customer_ID: " + str(top10_buyers[i][1]), {'customer_id': top10_buyers[i][1],
+                                                             'total_revenues': top10_buyers[i][0]}
+
+    # Define the second reducer function for the sampling mode of our MRJob
+    def reducer_get_sampled_top10_buyers(self, _, totalRevenues_cusID_pairs):
+        '''
+        reducer_get_sampled_top10_buyers:
+        this final reducer replaces reducer_get_top10_buyers with --sample-rate below 1
+        - It gets the customerIDs of the sample, each with its (exact) total revenues
+        - Yields the Top 10 of them with their estimated rank among all customers and an ambiguity flag
+        - Then yields the estimated number of customers and total revenues of all customers
+
+        :param _: discard the key; "since all the output tuples of the previous step should be sent to this reducer"
+        :param totalRevenues_cusID_pairs: (total revenues, customer ID) of every customer in the sample
+        :return: the Top 10 customers of the sample and the estimated totals (see common/sampling.py)
+        '''
+
+        rate = self.options.sample_rate
+        sampled_buyers = sorted(totalRevenues_cusID_pairs, key=lambda pair: pair[0], reverse=True)
+        for position, (total_revenues, customer_id) in enumerate(sampled_buyers[:10]):
+            result = {'customer_id': customer_id, 'total_revenues': total_revenues}
+            result.update(rank_estimate(position, 10, rate))
+            yield "Customer_ID: " + str(customer_id), result
+
+        yield "Estimated Totals (sample rate %g):" % rate, {
+            'sample_rate': rate,
+            'sampled_customers': len(sampled_buyers),
+            'customers': list(count_interval(len(sampled_buyers), rate)),
+            'total_revenues': list(scaled_total([pair[0] for pair in sampled_buyers], rate))}
 
     # Define the steps of our MRJob
     def steps(self):
@@ -159,7 +252,8 @@ class MRTop10Buyers(MRJob):
             MRStep(mapper=self.mapper_get_customer_revenue,
                     combiner=self.combiner_sum_customer_revenues,
                     reducer=self.reducer_total_customer_revenues),
-            MRStep(reducer=self.reducer_get_top10_buyers)
+            MRStep(reducer=self.reducer_get_sampled_top10_buyers if self.is_sampled() else
+                   self.reducer_get_top10_buyers)
         ]
 
 if __name__ == "__main__":
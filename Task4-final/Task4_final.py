@@ -12,12 +12,36 @@ and once in terms of total revenue for both retail years." (source: Project pdf)
 
 Job Execution:
 $ python Task4_final.py --runner=local --no-bootstrap-mrjob retail1011.csv retail0910.csv > Task4-both-results.txt
+# a quick approximate answer from 10% of the products (see common/sampling.py)
+$ python Task4_final.py --runner=local --no-bootstrap-mrjob --sample-rate 0.1 retail1011.csv retail0910.csv
+# shuffle the StockCodes as integer ids of a key dictionary (see common/keys.py); the first run builds it
+$ python Task4_final.py --runner=local --no-bootstrap-mrjob --build-key-dictionary stock-codes.keys retail1011.csv
+$ python Task4_final.py --runner=local --no-bootstrap-mrjob --key-dictionary stock-codes.keys retail1011.csv
+# parse and sum blocks of 10000 lines with numpy instead of one line at a time (see common/batches.py)
+$ python Task4_final.py --runner=local --no-bootstrap-mrjob --batch-size 10000 retail1011.csv retail0910.csv
+
+The values of the best selling products are {"stock_code": ..., "total_quantity" or "total_revenues": ...}.
+With --sample-rate the best selling products are the best ones of the sample (a product outside the sample may sell
+more), and a last line has the sample rate and the estimated number of products, total quantity and total revenues of
+all products with their 95% confidence intervals.
 
 '''
 
 # Import required libraries
 from mrjob.job import MRJob     # To create the job
 from mrjob.job import MRStep    # To define the steps of the job
+import os
+import sys
+import numpy as np
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.compressed import CompressedInputMixin
+from common.keys import KeyEncodingMixin
+from common.sampling import SamplingMixin, count_interval, scaled_total
+from common.batches import BatchMapperMixin, split_columns, parse_floats, group_rows, sum_by_group
 
 # Define the indices of the "interesting" fields within the given data lines
 stockCode_index = 1     # Index of the field "stock code" for a certain product within the given records
@@ -65,7 +89,12 @@ def exception_handler(row):
 
 
 # Create our job class
-class MRTheBestSellingProduct(MRJob):
+class MRTheBestSellingProduct(CompressedInputMixin, ProfilingMixin, KeyEncodingMixin, ResultCacheMixin, SamplingMixin,
+                              BatchMapperMixin, BinaryProtocolMixin, MRJob):
+    # copy the shared helpers (common/) into the working directory of every task
+    DIRS = ['../common']
+    # with --batch-size the mapper gets blocks of lines
+    BATCH_MAPPERS = {'mapper_get_product_quantity_revenue': 'mapper_batch_product_quantity_revenue'}
 
     # Define a map function for our job
     def mapper_get_product_quantity_revenue (self, _, line):
@@ -88,10 +117,54 @@ class MRTheBestSellingProduct(MRJob):
         '''
 
         record_fields = line.split(',')
+        # With --sample-rate, the lines of the products outside the sample are dropped before they are parsed
+        if not self.in_sample(record_fields[stockCode_index]):
+            return
         # Notice: The records which have errors in its values will be ignored in this implementation
         checked_line = exception_handler(record_fields)
         if checked_line != "THIS ROW HAS AN ERROR" :
-            yield checked_line[0], (checked_line[1], checked_line[2] * checked_line[1])
+            quantity_revenue = (checked_line[1], checked_line[2] * checked_line[1])
+            # with --build-key-dictionary the value also counts the line, so the StockCodes are counted by how
+            # often they occur
+            if self.options.build_key_dictionary:
+                quantity_revenue += (1,)
+            # with --key-dictionary the StockCode is replaced by its integer id
+            yield self.encode_key(checked_line[0]), quantity_revenue
+
+    # Define the batch version of our map function
+    def mapper_batch_product_quantity_revenue(self, lines):
+        '''
+        mapper_batch_product_quantity_revenue:
+        It does the same as mapper_get_product_quantity_revenue for a block of lines (with --batch-size):
+        1- splits every line based on "," and keeps the needed fields.
+        2- converts the prices and quantities of all lines with numpy; the lines with errors (or an empty stock
+            code) are ignored like in exception_handler.
+        3- sums the quantities and revenues of every product of the block, so the block yields one pair per product
+            instead of one pair per line.
+
+        :param self: a reference to the current instance of the class.
+        :param lines: a list of lines from the input file.
+        :return: intermediate key value pairs (product_SC, (sum of the quantities, sum of the revenues)) of the block.
+        '''
+
+        products_SC, prices, quantities = split_columns(lines, ',', stockCode_index, price_index, quantity_index)
+        prices, valid_prices = parse_floats(prices)
+        quantities, valid_quantities = parse_floats(quantities)
+        products_SC, inverse = group_rows(products_SC)
+
+        # With --sample-rate, the products outside the sample are dropped like errors
+        valid_products = np.array([product_SC != "" and self.in_sample(product_SC) for product_SC in products_SC])
+
+        valid = valid_prices & valid_quantities & valid_products[inverse]
+        counts, (total_quantities, total_revenues) = sum_by_group(inverse, len(products_SC), valid, quantities,
+                                                                  prices * quantities)
+        for index in np.flatnonzero(counts).tolist():
+            quantity_revenue = (float(total_quantities[index]), float(total_revenues[index]))
+            # with --build-key-dictionary the value also counts the lines (see mapper_get_product_quantity_revenue)
+            if self.options.build_key_dictionary:
+                quantity_revenue += (int(counts[index]),)
+            # with --key-dictionary the StockCode is replaced by its integer id
+            yield self.encode_key(products_SC[index]), quantity_revenue
 
     # Define a combiner function for our MRJob
     def combiner_sum_product_quantities_revenues(self,product_SC, quantities_revenues_pairs):
@@ -129,7 +202,11 @@ class MRTheBestSellingProduct(MRJob):
             quantities.append(list_quantities_revenues[i][0])
             revenues.append(list_quantities_revenues[i][1])
 
-        yield (product_SC, (sum(quantities), sum(revenues)))
+        quantities_revenues = (sum(quantities), sum(revenues))
+        # with --build-key-dictionary the number of lines of the product is summed as well
+        if self.options.build_key_dictionary:
+            quantities_revenues += (sum(pair[2] for pair in list_quantities_revenues),)
+        yield (product_SC, quantities_revenues)
 
 
     def reducer_total_quantities_revenues(self, product_SC, total_quantities_revenues_pairs):
@@ -166,6 +243,10 @@ class MRTheBestSellingProduct(MRJob):
             total_quantities.append(list_total_quantities_revenues[i][0])
             total_revenues.append(list_total_quantities_revenues[i][1])
 
+        # every product comes to this reducer exactly once, so --build-key-dictionary counts the StockCodes here,
+        # by the number of input lines of the product (not by the number of pairs, which depends on the splits)
+        if self.options.build_key_dictionary:
+            self.record_key(product_SC, sum(pair[2] for pair in list_total_quantities_revenues))
         yield None, ((sum(total_quantities), sum(total_revenues)), product_SC)
 
 
@@ -190,22 +271,65 @@ class MRTheBestSellingProduct(MRJob):
 
         '''
 
+        # the stock codes are decoded first, so that products with the same total are ordered by their stock code
+        # and the result does not depend on the key dictionary
+        products = [(totals, self.decode_key(product_SC)) for totals, product_SC in total_quantReven_prodSC_pairs]
+
         # Sort the received pairs based on the quantity "product with highest total quantity first"
-        products = sorted(total_quantReven_prodSC_pairs, key=lambda pair: pair[0][0], reverse=True)
+        products.sort(key=lambda pair: (-pair[0][0], pair[1]))
         # Get the pair of the best seller product in terms of total quantity
         bestSelling_quantities= products[0]
 
         # Sort the products list again but based on the revenues "product with highest total revenues first"
-        products.sort(key=lambda pair: pair[0][1], reverse=True)
+        products.sort(key=lambda pair: (-pair[0][1], pair[1]))
         # Get the pair of the best seller product in terms of total revenues
         bestSelling_revenues = products[0]
 
         yield ('The Best Selling Product in Terms of (Quantity) has:',
-               ('StockCode: '+ bestSelling_quantities[1],'Total Quantity: ' + str(bestSelling_quantities[0][0])))
+               {'stock_code': bestSelling_quantities[1],
+                'total_quantity': bestSelling_quantities[0][0]})
+
+        yield ('The Best Selling Product in Terms of (Revenues) has:',
+               {'stock_code': bestSelling_revenues[1],
+                'total_revenues': bestSelling_revenues[0][1]})
+
+
+    def reducer_sampled_bestSelling_quantities_revenues(self, _, total_quantReven_prodSC_pairs):
+        '''
+        reducer_sampled_bestSelling_quantities_revenues:
+        this final reducer replaces reducer_bestSelling_quantities_revenues with --sample-rate below 1
+        - It gets the productSC of the sample, each with its (exact) total quantities and total revenues
+        - Yields the best selling product of the sample in terms of quantity and in terms of revenues
+        - Then yields the estimated number of products, total quantity and total revenues of all products
+
+        :param _: discard the key; "since all the output tuples of the previous step should be sent to this reducer"
+        :param total_quantReven_prodSC_pairs: ((total quantities, total revenues), product_SC) of every product in
+        the sample
+        :return: the best selling products of the sample and the estimated totals (see common/sampling.py)
+        '''
+
+        rate = self.options.sample_rate
+        # decoded first, so that products with the same total are ordered by their stock code
+        products = [(totals, self.decode_key(product_SC)) for totals, product_SC in total_quantReven_prodSC_pairs]
+
+        # no rank estimate here: the best product of the sample has no sampled product before it whatever its totals,
+        # so its rank interval would only depend on the rate (see rank_interval in common/sampling.py)
+        bestSelling_quantities = min(products, key=lambda pair: (-pair[0][0], pair[1]))
+        yield ('The Best Selling Product in Terms of (Quantity) has:',
+               {'stock_code': bestSelling_quantities[1],
+                'total_quantity': bestSelling_quantities[0][0]})
 
+        bestSelling_revenues = min(products, key=lambda pair: (-pair[0][1], pair[1]))
         yield ('The Best Selling Product in Terms of (Revenues) has:',
-               ('StockCode: '+ bestSelling_revenues[1],'Total Revenues: ' + str(bestSelling_revenues[0][1])))
+               {'stock_code': bestSelling_revenues[1],
+                'total_revenues': bestSelling_revenues[0][1]})
 
+        yield 'Estimated Totals (sample rate %g):' % rate, {
+            'sample_rate': rate,
+            'sampled_products': len(products),
+            'products': list(count_interval(len(products), rate)),
+            'total_quantity': list(scaled_total([pair[0][0] for pair in products], rate)),
+            'total_revenues': list(scaled_total([pair[0][1] for pair in products], rate))}
 
     # Define the steps of our Job
     def steps(self):
@@ -213,7 +337,8 @@ class MRTheBestSellingProduct(MRJob):
             MRStep(mapper=self.mapper_get_product_quantity_revenue,
                     combiner=self.combiner_sum_product_quantities_revenues,
                     reducer=self.reducer_total_quantities_revenues),
-            MRStep(reducer=self.reducer_bestSelling_quantities_revenues)
+            MRStep(reducer=self.reducer_sampled_bestSelling_quantities_revenues if self.is_sampled() else
+                   self.reducer_bestSelling_quantities_revenues)
         ]
 
 
@@ -24,6 +24,9 @@ To RUN:
 1. Before running Task5.py, we need to use the Create-JSON-lines-file.py program to convert the file arxivData.json
 from JSON format into JSON line format. The output file is named mod-arxivData.jl.
 2. $ python Task5.py --runner=local --no-bootstrap-mrjob  mod-arxivData.jl > Task5-output.txt
+3. the paper ids can be shuffled as integer ids of a key dictionary (see common/keys.py); the first run builds it:
+   $ python Task5.py --runner=local --no-bootstrap-mrjob --build-key-dictionary paper-ids.keys mod-arxivData.jl
+   $ python Task5.py --runner=local --no-bootstrap-mrjob --key-dictionary paper-ids.keys mod-arxivData.jl
 
 Input-
 1. A json file with metadata (including summaries) of scientific papers from arxiv, mod-arxivData.jl
@@ -36,11 +39,21 @@ Output-
 import mrjob.protocol
 from mrjob.job import MRJob
 from mrjob.step import MRStep
+import heapq
 import re
 import numpy as np
 import nltk
 from nltk.corpus import stopwords
 from sklearn import feature_extraction
+import os
+import sys
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.compressed import CompressedInputMixin
+from common.keys import KeyEncodingMixin
 
 stop_words = list(stopwords.words('english'))
 
@@ -139,7 +152,11 @@ text_to_match = "features and enables the model to reason relations between seve
 cleaned_search_text = clean_input_text(text_to_match)
 
 
-class MRcosineSimilarity(MRJob):
+class MRcosineSimilarity(CompressedInputMixin, ProfilingMixin, KeyEncodingMixin, ResultCacheMixin,
+                         BinaryProtocolMixin, MRJob):
+    # copy the shared helpers (common/) into the working directory of every task
+    DIRS = ['../common']
+
     # we first need to indicate that each line of the input file is actually in JSON
     # source: https://mrjob.readthedocs.io/en/latest/job.html
     INPUT_PROTOCOL = mrjob.protocol.JSONValueProtocol
@@ -164,20 +181,36 @@ class MRcosineSimilarity(MRJob):
         vec = vectorize_text(trans_words, cleaned_search_text).toarray()
         cos_sim = cosine_similarity(vec[0], vec[1])
 
-        yield None, (cos_sim, id_num, summary)
+        # with --key-dictionary the paper id is replaced by its integer id
+        yield None, (cos_sim, self.encode_key(id_num), summary)
 
     def reduce_sort_cos_sim(self, _, index_cos_sim):
         '''
-        A single reducer which sorts the input tuples from highest to lowest by their cosine similarity score.
+        A single reducer which finds the input tuples with the highest cosine similarity scores.
 
         :param _: None (no key for each tuple)
         :param index_cos_sim: a tuple with format: (cos. sim. score, scientific paper id, scientific paper summary)
         :return: yields the 10 highest cosine similarity scores and the id of their corresponding scientific paper
         '''
-        sorted_cos_sim = sorted(index_cos_sim, key=lambda x: x[0], reverse=True) # sort by cos. sim. score
+        # the summaries of all papers do not fit into memory, so only the 10 highest cos. sim. scores are kept;
+        # papers with the same score are ordered by their (decoded) id, so the order does not depend on the dictionary
+        top_10 = heapq.nsmallest(10, self.record_paper_ids(index_cos_sim),
+                                 key=lambda x: (-x[0], self.decode_key(x[1])))
+
+        for cos_sim, id_num, _ in top_10: # yield the 10 highest scores
+            yield cos_sim, self.decode_key(id_num)
 
-        for i in range(10): # yield the 10 highest scores
-            yield sorted_cos_sim[i][0], sorted_cos_sim[i][1]
+    def record_paper_ids(self, index_cos_sim):
+        '''
+        Every paper comes to reduce_sort_cos_sim exactly once, so the paper ids of --build-key-dictionary are counted
+        there.
+
+        :param index_cos_sim: tuples (cos. sim. score, scientific paper id, scientific paper summary)
+        :return: the same tuples
+        '''
+        for paper in index_cos_sim:
+            self.record_key(paper[1])
+            yield paper
 
     def steps(self):
         return [
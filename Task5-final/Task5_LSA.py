@@ -0,0 +1,168 @@
+'''
+Petio Todorov
+Wael Fato
+
+Task5_LSA.py
+
+Semantic search over the arxiv paper summaries using Latent Semantic Analysis (LSA).
+
+The bag of words cosine similarity in Task5.py only scores words that appear in BOTH the query and the summary,
+so papers that describe the same idea with different words (synonyms) get a score of 0. LSA fixes that by
+projecting every summary into a small "concept" space: we first build a TF-IDF matrix of the whole corpus and then
+reduce it with a truncated SVD. Words that are used in similar contexts end up pointing in similar directions, so
+two summaries can be close to each other even if they share few exact words.
+
+This is split into two stages:
+1. build (offline, run once): TF-IDF + truncated SVD of all summaries. The document vectors are normalized to
+   unit length and stored as a float32 matrix on disk (lsa-vectors.f32) that is later opened with np.memmap.
+   The fitted TF-IDF vectorizer and SVD are pickled (lsa-model.pkl) so queries are projected the same way, and the
+   paper ids are stored in the same row order (lsa-ids.json).
+2. search: the query is cleaned with the same clean_input_text() as Task5.py, projected into the LSA space and
+   normalized. Since all rows have length 1, the cosine similarity of every paper is ONE matrix-vector product
+   (several queries are answered at once with one matrix-matrix product). np.argpartition then picks the top 10
+   without sorting the whole corpus.
+
+To RUN:
+1. $ python Task5_LSA.py build mod-arxivData.jl
+2. $ python Task5_LSA.py search "features and enables the model to reason relations between parts of the image"
+
+Input-
+1. The JSON lines file created by Create-JSON-lines-file.py, mod-arxivData.jl
+2. One or more query strings
+
+Output-
+1. build: lsa-vectors.f32, lsa-meta.json, lsa-ids.json, lsa-model.pkl
+2. search: the top 10 paper ids with their (LSA) cosine similarity score, same format as Task5-output.txt
+'''
+
+import sys
+import json
+import pickle
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
+
+from Task5 import clean_input_text
+
+# number of latent dimensions ("concepts") kept by the truncated SVD
+n_components = 200
+# number of results returned for each query
+top_k = 10
+
+# files written by the build stage
+vectors_file = "lsa-vectors.f32"
+meta_file = "lsa-meta.json"
+ids_file = "lsa-ids.json"
+model_file = "lsa-model.pkl"
+
+
+def build_index(input_path, n_components=n_components):
+    '''
+    Builds the LSA representation of all summaries in the JSON lines file and stores it on disk.
+
+    :param input_path: path of the JSON lines file (one paper per line, with the fields 'id' and 'summary')
+    :param n_components: number of latent dimensions of the truncated SVD
+    :return: the shape (number of papers, number of dimensions) of the stored matrix
+    '''
+    ids = []
+    summaries = []
+    with open(input_path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            paper = json.loads(line)
+            ids.append(paper['id'])
+            summaries.append(clean_input_text(paper['summary']))
+
+    # TF-IDF instead of raw counts: words that appear in almost every summary ("model", "method") get a low weight
+    vectorizer = TfidfVectorizer(analyzer='word', ngram_range=(1, 2), min_df=2, sublinear_tf=True)
+    tfidf = vectorizer.fit_transform(summaries)
+
+    # the SVD cannot have more components than the smallest dimension of the TF-IDF matrix
+    n_components = min(n_components, min(tfidf.shape) - 1)
+    svd = TruncatedSVD(n_components=n_components, random_state=0)
+    doc_vectors = svd.fit_transform(tfidf).astype(np.float32)
+
+    # normalize the rows so that the dot product of two rows is their cosine similarity
+    norms = np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1  # empty summaries stay a zero vector instead of a division by 0
+    doc_vectors /= norms
+
+    stored = np.memmap(vectors_file, dtype=np.float32, mode='w+', shape=doc_vectors.shape)
+    stored[:] = doc_vectors
+    stored.flush()
+
+    with open(meta_file, 'w') as file:
+        json.dump({'shape': list(doc_vectors.shape), 'dtype': 'float32'}, file)
+    with open(ids_file, 'w') as file:
+        json.dump(ids, file)
+    with open(model_file, 'wb') as file:
+        pickle.dump((vectorizer, svd), file)
+
+    return doc_vectors.shape
+
+
+class LSAIndex:
+    '''
+    Read-only view of the stored LSA vectors. The matrix is memory mapped, so opening the index is instant and
+    only the pages that are touched by a query are read from disk.
+    '''
+
+    def __init__(self):
+        with open(meta_file, 'r') as file:
+            meta = json.load(file)
+        with open(ids_file, 'r') as file:
+            self.ids = json.load(file)
+        with open(model_file, 'rb') as file:
+            self.vectorizer, self.svd = pickle.load(file)
+        self.vectors = np.memmap(vectors_file, dtype=meta['dtype'], mode='r', shape=tuple(meta['shape']))
+
+    def project(self, queries):
+        '''
+        Maps query strings into the LSA space with the same cleaning, TF-IDF weights and SVD as the corpus.
+
+        :param queries: a list of strings
+        :return: a (number of queries, number of dimensions) float32 matrix with normalized rows
+        '''
+        cleaned = [clean_input_text(query) for query in queries]
+        query_vectors = self.svd.transform(self.vectorizer.transform(cleaned)).astype(np.float32)
+        norms = np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return query_vectors / norms
+
+    def search(self, queries, k=top_k):
+        '''
+        Finds the k most similar papers for every query.
+
+        :param queries: a list of strings
+        :param k: number of results per query
+        :return: for each query a list of (cosine similarity score, paper id), highest score first
+        '''
+        query_vectors = self.project(queries)
+        # one product for all queries: (papers x dims) . (dims x queries) = (papers x queries)
+        scores = np.asarray(self.vectors @ query_vectors.T)
+
+        k = min(k, scores.shape[0])
+        results = []
+        for q in range(scores.shape[1]):
+            column = scores[:, q]
+            # argpartition puts the k largest scores in the last k places without sorting the rest
+            top = np.argpartition(column, -k)[-k:]
+            top = top[np.argsort(column[top])[::-1]]
+            results.append([(float(column[i]), self.ids[i]) for i in top])
+        return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'search'):
+        print('usage: python Task5_LSA.py build mod-arxivData.jl | python Task5_LSA.py search "query" ["query" ...]')
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        shape = build_index(sys.argv[2])
+        print("Stored %d papers with %d LSA dimensions" % shape)
+    else:
+        index = LSAIndex()
+        for result in index.search(sys.argv[2:]):
+            for score, id_num in result:
+                print("%s\t%s" % (score, json.dumps(id_num)))
@@ -0,0 +1,88 @@
+'''
+Petio Todorov
+Wael Fato
+
+Benchmark-sparse.py
+
+Compares the run time of the sparse, two-phase and block modes of Task6.py for random sparse input matrices of
+different densities (fraction of non-zero elements). The matrices have the same shape as A and B (M_r x 50 and
+50 x N_c), are written in COO format (only non-zero tuples) and every result is checked against the numpy product.
+
+To RUN:
+$ python Benchmark-sparse.py
+
+Output-
+1. One line per (density, mode) with the number of non-zero input tuples, the run time and whether the result
+matches the numpy product.
+'''
+
+import os
+import time
+import tempfile
+import numpy as np
+
+from Task6 import MRMatrixDot, mat1, mat2, M_r, N_c
+
+inner = 50  # number of columns of A = number of rows of B
+densities = [0.001, 0.01, 0.05]
+modes = ['sparse', 'two-phase', 'block']
+runner = 'inline'  # 'local' runs the tasks in subprocesses, like the commands in Task6.py
+max_difference = .0000000001
+
+
+def random_sparse_matrix(rows, cols, density, rng):
+    '''
+    :return: a dense numpy array in which roughly a fraction "density" of the elements is non-zero
+    '''
+    matrix = rng.random((rows, cols))
+    matrix[rng.random((rows, cols)) >= density] = 0
+    return matrix
+
+
+def write_coo_tuples(matrix, name, file_path):
+    '''
+    Writes only the non-zero elements of the matrix as tuples <name,i,j,value>.
+
+    :return: the number of tuples written
+    '''
+    rows, cols = np.nonzero(matrix)
+    with open(file_path, 'w') as file:
+        for i, j in zip(rows, cols):
+            file.write("%s %d %d %r\n" % (name, i, j, float(matrix[i, j])))
+    return len(rows)
+
+
+def run_job(mode, input_paths):
+    '''
+    Runs MRMatrixDot and collects its output as a dense numpy array (missing elements are zeros).
+
+    :return: (run time in seconds, the output matrix)
+    '''
+    job = MRMatrixDot(args=['-r', runner, '--mode', mode, *input_paths])
+    result = np.zeros((M_r, N_c))
+
+    start = time.perf_counter()
+    with job.make_runner() as job_runner:
+        job_runner.run()
+        for (i, k), value in job.parse_output(job_runner.cat_output()):
+            result[i, k] = value
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for density in densities:
+            A = random_sparse_matrix(M_r, inner, density, rng)
+            B = random_sparse_matrix(inner, N_c, density, rng)
+            A_path = os.path.join(tmp_dir, 'A_tuples.txt')
+            B_path = os.path.join(tmp_dir, 'B_tuples.txt')
+            nnz = write_coo_tuples(A, mat1, A_path) + write_coo_tuples(B, mat2, B_path)
+            expected = A.dot(B)
+
+            for mode in modes:
+                seconds, result = run_job(mode, [A_path, B_path])
+                matches = np.max(np.abs(result - expected)) <= max_difference
+                print("density=%-6s mode=%-6s non-zero tuples=%-7d time=%.2fs matches=%s"
+                      % (density, mode, nnz, seconds, matches))
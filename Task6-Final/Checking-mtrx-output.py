@@ -9,46 +9,174 @@ This program checks whether our resulting matrix, computed with mrjob,
 matches the product of input matrices A and B when they are computed
 in numpy. Note that the mrjob computation yields tuples in the format:
 (index in final output matrix, element value in final output matrix).
-There was a problem importing file C.txt (the shape was not correct)
-so we directly computed C by multiplying A and B as matrices in numpy.
 
-To RUN: run it like a regular .py file in Pycharm.
+Nothing here needs the whole output or the whole product C = A.dot(B) in memory, so products like 50k x 50k
+can be validated:
+1. The job output is read in chunks of chunk_lines lines. Each chunk is parsed at once with numpy (the brackets
+   and commas are removed and the remaining numbers are converted in one call) into arrays of i, k and values.
+   The elements are then appended, in binary, to one temporary bucket file per block of block_rows output rows.
+2. A and B are opened as memory mapped .mtx files (see matrix_format.py, created by gen_A_B_tuples.py). For every
+   block of rows, the reference values A[rows].dot(B[:, cols]) are computed for one block of columns at a time and
+   compared with the elements of the bucket.
+
+It reports the maximum absolute and relative error, the number of mismatches (elements that differ by more than
+max_difference + max_relative_difference * |expected value|), the number of duplicate elements, the number of missing elements (only counted as errors when
+the correct value is not 0, since the sparse modes of Task6.py do not yield zeros) and the number of elements with
+an index outside of the matrix.
+
+To RUN: run it like a regular .py file in Pycharm, or
+$ python Checking-mtrx-output.py [mtrx-output.txt [A.mtx B.mtx]]
 Make sure to load the correct files for A, B, and computed_values_mrjob.
 
 Output-
-1. Proper output- "Success, all values match!"
-2. Improper output- -1 (indicates that some values between matrix C and the values computed
-with mrjob do not match).
+1. The error report
+2. Proper output- "Success, all values match!"
+3. Improper output- -1 (indicates that some values between matrix C and the values computed
+with mrjob do not match, or that elements are missing or duplicated).
 '''
 
 
+import os
+import sys
+import tempfile
 import numpy as np
-import math
-import ast
+import matrix_format
 
-# max error that we allow between the mrjob computed values and the numpy dot product values.
+# max error that we allow between the mrjob computed values and the numpy dot product values: an element matches if
+# abs(value - expected) <= max_difference + max_relative_difference * abs(expected), like np.isclose, so the absolute
+# tolerance counts near 0 and the relative one for large values (whose rounding errors grow with their size)
 max_difference = .0000000001
+max_relative_difference = .000000001
 
 computed_values_mrjob = "mtrx-output.txt"
-A = np.loadtxt("A.txt", dtype='float')
-B = np.loadtxt("B.txt", dtype='float')
-original_C_matrix = A.dot(B)
-#print(original_C_matrix.shape)
-
-with open(computed_values_mrjob, 'r') as sparse_matrix:
-    data = sparse_matrix.readlines()
-    flag = False
-    for line in data:
-        # matrix output line format e.g. [0, 0]	10.673303052759014
-        line = line.split("	")
-        index = ast.literal_eval(line[0]) # creates a list of the index in the final output matrix, e.g. [i, k]
-        value = float(line[1].strip()) # element value at index [i, k]
-
-        if(math.fabs(value - original_C_matrix[index[0], index[1]]) > max_difference):
-            flag = True
-            break
-
-    if flag == False:
-        print("Success, all values match!")
-    else:
+A_path = "A.mtx"
+B_path = "B.mtx"
+
+chunk_lines = 1000000   # number of output lines parsed at once
+block_rows = 1024       # number of rows of C compared at once
+block_cols = 4096       # number of columns of C computed at once
+
+# characters of the output lines (e.g. "[0, 0]\t10.673303052759014") that are not part of the numbers
+separators = str.maketrans('[],"', '    ')
+
+
+def read_output_chunks(file_path):
+    '''
+    Reads the job output chunk by chunk and parses each chunk with numpy.
+
+    :return: a generator of (i, k, values) numpy arrays, one triple per chunk
+    '''
+    with open(file_path, 'r') as file:
+        while True:
+            lines = file.readlines(chunk_lines * 32)  # readlines takes a size hint in characters
+            if not lines:
+                break
+            numbers = np.array(''.join(lines).translate(separators).split(), dtype=np.float64).reshape(-1, 3)
+            yield numbers[:, 0].astype(np.int64), numbers[:, 1].astype(np.int64), numbers[:, 2]
+
+
+def bucket_output(file_path, shape, bucket_dir):
+    '''
+    Splits the output elements into one binary file per block of block_rows rows, so that each block can later be
+    compared on its own.
+
+    :return: the number of elements with an index outside of the matrix
+    '''
+    out_of_range = 0
+    for i, k, values in read_output_chunks(file_path):
+        valid = (i >= 0) & (i < shape[0]) & (k >= 0) & (k < shape[1])
+        out_of_range += int(np.count_nonzero(~valid))
+        i, k, values = i[valid], k[valid], values[valid]
+
+        blocks = i // block_rows
+        order = np.argsort(blocks, kind='stable')
+        blocks, i, k, values = blocks[order], i[order], k[order], values[order]
+        starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]])
+        ends = np.r_[starts[1:], len(blocks)]
+
+        for start, end in zip(starts, ends):
+            with open(os.path.join(bucket_dir, '%d.bin' % blocks[start]), 'ab') as bucket:
+                # i and k fit in a float64 exactly, so the three arrays can be stored as one
+                np.column_stack((i[start:end], k[start:end], values[start:end])).astype(np.float64).tofile(bucket)
+    return out_of_range
+
+
+def compare_blocks(A, B, bucket_dir):
+    '''
+    Compares every bucket with the corresponding block of rows of A.dot(B).
+
+    :return: a dictionary with the error statistics
+    '''
+    report = {'elements': 0, 'max_abs_error': 0.0, 'max_rel_error': 0.0, 'mismatches': 0, 'duplicates': 0,
+              'missing': 0, 'missing_nonzero': 0}
+    n_rows, n_cols = A.shape[0], B.shape[1]
+
+    for block in range((n_rows + block_rows - 1) // block_rows):
+        first_row = block * block_rows
+        rows = min(block_rows, n_rows - first_row)
+        bucket_path = os.path.join(bucket_dir, '%d.bin' % block)
+        if os.path.exists(bucket_path):
+            elements = np.fromfile(bucket_path, dtype=np.float64).reshape(-1, 3)
+        else:
+            elements = np.empty((0, 3))
+        r = elements[:, 0].astype(np.int64) - first_row
+        k = elements[:, 1].astype(np.int64)
+        values = elements[:, 2]
+        report['elements'] += len(values)
+
+        # how many times every element of this block of rows was yielded
+        counts = np.zeros((rows, n_cols), dtype=np.int32)
+        np.add.at(counts, (r, k), 1)
+        report['duplicates'] += int(np.sum(counts[counts > 1] - 1))
+        report['missing'] += int(np.count_nonzero(counts == 0))
+
+        A_rows = np.asarray(A[first_row:first_row + rows])
+        for first_col in range(0, n_cols, block_cols):
+            cols = min(block_cols, n_cols - first_col)
+            reference = A_rows.dot(B[:, first_col:first_col + cols])
+
+            in_block = (k >= first_col) & (k < first_col + cols)
+            expected = reference[r[in_block], k[in_block] - first_col]
+            abs_error = np.abs(values[in_block] - expected)
+            if abs_error.size:
+                report['max_abs_error'] = max(report['max_abs_error'], float(abs_error.max()))
+                # relative to at least max_difference, so that expected values close to 0 do not blow it up
+                rel_error = abs_error / np.maximum(np.abs(expected), max_difference)
+                report['max_rel_error'] = max(report['max_rel_error'], float(rel_error.max()))
+                tolerance = max_difference + max_relative_difference * np.abs(expected)
+                report['mismatches'] += int(np.count_nonzero(abs_error > tolerance))
+
+            missing = counts[:, first_col:first_col + cols] == 0
+            report['missing_nonzero'] += int(np.count_nonzero(missing & (np.abs(reference) > max_difference)))
+
+    return report
+
+
+def check_output(output_path, A_path, B_path):
+    '''
+    :return: the error report (a dictionary)
+    '''
+    _, A = matrix_format.open_matrix(A_path)
+    _, B = matrix_format.open_matrix(B_path)
+
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        out_of_range = bucket_output(output_path, (A.shape[0], B.shape[1]), bucket_dir)
+        report = compare_blocks(A, B, bucket_dir)
+    report['out_of_range'] = out_of_range
+    return report
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        computed_values_mrjob = sys.argv[1]
+    if len(sys.argv) > 3:
+        A_path, B_path = sys.argv[2], sys.argv[3]
+
+    report = check_output(computed_values_mrjob, A_path, B_path)
+    for name, value in report.items():
+        print("%-16s %s" % (name, value))
+
+    if report['mismatches'] or report['duplicates'] or report['missing_nonzero'] or report['out_of_range']:
         print(-1)
+    else:
+        print("Success, all values match!")
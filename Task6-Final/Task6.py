@@ -15,6 +15,54 @@ stored in text files A.txt and B.txt into the previously mentioned format.
 To RUN:
 python Task6.py --runner=local --no-bootstrap-mrjob  A_tuples.txt B_tuples.txt > mtrx-output.txt
 
+Block (tiled) mode- the matrices are cut into square tiles of --block-size x --block-size elements. Instead of
+replicating every single element, the mappers replicate whole tiles, so the number of records in the shuffle drops
+from O(n^3) to O(n^3/b):
+python Task6.py --runner=local --no-bootstrap-mrjob --mode=block --block-size=100 A_tuples.txt B_tuples.txt > mtrx-output.txt
+
+Sparse mode- the input files only need to contain the non-zero elements (COO format, absent tuples are zeros).
+Zeros are dropped by the mappers and the reducers join the row of M and the column of N on the index j instead of
+on the position in the sorted lists, so missing elements do not shift the products. Output elements that have no
+non-zero product are not yielded (the output is in COO format as well):
+python Task6.py --runner=local --no-bootstrap-mrjob --mode=sparse A_tuples.txt B_tuples.txt > mtrx-output.txt
+The block mode skips zeros too, and all-zero tiles are never sent. Benchmark-sparse.py compares the modes for
+different densities.
+
+Two-phase mode- the classic two step algorithm: the first step joins M and N on the index j and yields one partial
+product m_ij * n_jk per pair, keyed by (i,k); the second step sums the partial products (in-mapper combining first,
+then the reducers). Zeros are skipped here as well:
+python Task6.py --runner=local --no-bootstrap-mrjob --mode=two-phase A_tuples.txt B_tuples.txt > mtrx-output.txt
+
+Auto mode- one pass over the input files counts the (non-zero) tuples of M and N and finds the inner dimension.
+From those numbers the amount of data that every algorithm would send through the shuffle is estimated and the
+cheapest one is run (the estimates and the choice are printed to stderr):
+python Task6.py --runner=local --no-bootstrap-mrjob --mode=auto A_tuples.txt B_tuples.txt > mtrx-output.txt
+
+Binary input- instead of the text tuples, the matrices can be given as .mtx files (see matrix_format.py, they are
+written by gen_A_B_tuples.py). The shape of the matrices is then read from the file headers instead of M_r and N_c
+below. The job input becomes a small list of (file, chunk) pairs and each mapper opens its chunks of rows with
+np.memmap, so the elements are neither copied nor parsed from text. The local and inline runners open the .mtx files
+by their absolute path; the other runners (hadoop, emr, ...) upload them with the job, and every chunk gets its own
+mapper (see common/launcher.py). This works with every mode:
+python Task6.py --runner=local --no-bootstrap-mrjob --mode=block A.mtx B.mtx > mtrx-output.txt
+For other input (e.g. only some non-zero tuples) the shape can be given with --m-rows and --n-cols.
+
+Local engine- when A, B and C together (stored densely) are smaller than --local-max-bytes, MapReduce is not
+needed: local_engine.py multiplies memory mapped blocks of the matrices with numpy in --threads threads and streams
+C to the output in the same format as the job (all elements, zeros included). --engine=auto (the default) makes this
+choice from the shape of the matrices, --engine=mapreduce and --engine=local force one of the two. An explicit --mode
+asks for one of the MapReduce algorithms, so it implies --engine=mapreduce unless --engine=local is given:
+python Task6.py --engine=local A.mtx B.mtx > mtrx-output.txt
+The shape is read from the .mtx headers; for text tuples the rows of M and the columns of N are --m-rows and
+--n-cols (as in the MapReduce job), and only the inner dimension of two text inputs needs a scan of the files.
+The local engine only runs from the command line, with the inline or local runner and input files on this machine
+(not stdin, hdfs:// or s3://); make_runner() and the other runners always run the MapReduce job.
+
+Batch mappers- with --batch-size the mappers of every mode get blocks of lines (see common/batches.py). The text
+tuples of a block are parsed with numpy and the elements are replicated with np.repeat / np.tile instead of one
+Python loop iteration per output pair:
+python Task6.py --runner=local --no-bootstrap-mrjob --mode=block --batch-size=10000 A_tuples.txt B_tuples.txt
+
 Output-
 1. A text file with the resulting matrix, mtrx-output.txt
 The output matrix can be checked by running the program Checking-mtrx-output.py
@@ -25,6 +73,20 @@ from mrjob.job import MRJob
 from mrjob.step import MRStep
 import mrjob.protocol
 from ast import literal_eval  # https://stackoverflow.com/questions/8494514/converting-string-to-tuple
+from collections import defaultdict
+import numpy as np
+import sys
+import os
+import matrix_format
+import local_engine
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+from common.cache import ResultCacheMixin
+from common.groups import MemoryBudgetMixin
+from common.batches import BatchMapperMixin
+from common.launcher import set_option, default_option, replace_inputs
 
 # Data for small sized matrices. These were used to test the program initially.
 # mat1= "M" # Matrix Name
@@ -36,11 +98,366 @@ from ast import literal_eval  # https://stackoverflow.com/questions/8494514/conv
 # Matrix data- for input matrices A and B
 mat1 = "A" # Matrix Name
 mat2 = "B" # Matrix Name
-M_r = 1000  # number of rows in Matrix M
-N_c = 2000  # number of columns of Matrix N
+M_r = 1000  # number of rows in Matrix M (default of --m-rows, the .mtx files store their own shape)
+N_c = 2000  # number of columns of Matrix N (default of --n-cols)
+
+modes = ['one-phase', 'sparse', 'two-phase', 'block']  # the algorithms that --mode can select
+local_max_bytes = 8 * 1024 ** 3  # default of --local-max-bytes: below this size the matrices are multiplied locally
+replicate_pairs = 100000  # pairs built at once by replicate_elements
+
+
+def open_chunk(items):
+    '''
+    :param items: one line of job input, split on whitespace
+    :return: (Matrix name, index of the first row, memory mapped rows of the chunk) if the line is a chunk
+             descriptor "<path of a .mtx file> <chunk index>" (see chunk_descriptors), otherwise None
+    '''
+    if len(items) != 2:
+        return None
+    header, first_row, rows = matrix_format.read_chunk(items[0], int(items[1]))
+    return header['name'], first_row, rows
+
+
+def chunk_elements(first_row, rows, skip_zeros=False):
+    '''
+    Finds the elements of a chunk with numpy, directly on the memory mapped rows.
+
+    :param skip_zeros: leave out the elements with value 0
+    :return: (row indices, column indices, element values) as numpy arrays
+    '''
+    if skip_zeros:
+        row_indices, col_indices = np.nonzero(rows)
+        return row_indices + first_row, col_indices, np.asarray(rows[row_indices, col_indices])
+    row_indices, col_indices = np.indices(rows.shape)
+    return (row_indices + first_row).ravel(), col_indices.ravel(), np.asarray(rows).ravel()
+
+
+def read_elements(line, skip_zeros=False):
+    '''
+    Turns one line of job input into matrix elements. A line is either a text tuple <M,i,j,m_ij>, or a chunk
+    descriptor, in which case all elements of the chunk are found in the memory mapped file with numpy (see
+    chunk_elements) and only then turned into Python numbers.
+
+    :param line: one line of the job input
+    :param skip_zeros: leave out the elements with value 0
+    :return: a generator of (Matrix name, row index, column index, element value)
+    '''
+    items = line.split()
+    chunk = open_chunk(items)
+    if chunk is None:
+        name, row, col, value = items
+        value = float(value)
+        if value != 0 or not skip_zeros:
+            yield name, int(row), int(col), value
+        return
+
+    name, first_row, rows = chunk
+    row_indices, col_indices, values = chunk_elements(first_row, rows, skip_zeros)
+    for i, j, value in zip(row_indices.tolist(), col_indices.tolist(), values.tolist()):
+        yield name, i, j, value
+
+
+def tuple_arrays(tuples):
+    '''
+    :param tuples: text tuples <M,i,j,m_ij>, each split into its four items
+    :return: a generator of (Matrix name, row indices, column indices, element values), where the last three are
+             numpy arrays
+    '''
+    if not tuples:
+        return
+    names, rows, cols, values = zip(*tuples)
+    names = np.array(names)
+    rows = np.array(rows, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    values = np.array(values, dtype=float)
+    for name in np.unique(names).tolist():
+        selected = names == name
+        yield name, rows[selected], cols[selected], values[selected]
+
+
+def read_element_arrays(lines):
+    '''
+    Batch version of read_elements: turns a block of lines of job input into arrays of matrix elements. The text
+    tuples of the block are parsed together with numpy, and every chunk descriptor gives all elements of its chunk.
+
+    :param lines: lines of the job input
+    :return: a generator of (Matrix name, row indices, column indices, element values), where the last three are
+             numpy arrays
+    '''
+    tuples = []
+    for line in lines:
+        items = line.split()
+        chunk = open_chunk(items)
+        if chunk is None:
+            tuples.append(items)
+        else:
+            name, first_row, rows = chunk
+            yield (name,) + chunk_elements(first_row, rows)
+    yield from tuple_arrays(tuples)
+
+
+def chunk_descriptors(matrix_paths, names):
+    '''
+    Lists all chunks of the given .mtx files, one chunk descriptor per line. The list is the actual input of the job,
+    so every mapper gets a share of the chunks.
+
+    :param matrix_paths: paths of .mtx files
+    :param names: the paths under which the tasks open the files (see LauncherMixin.ship_file)
+    :return: a generator of the chunk descriptors
+    '''
+    for path, name in zip(matrix_paths, names):
+        header = matrix_format.read_header(path)
+        for chunk_index in range(matrix_format.number_of_chunks(header)):
+            yield b"%s %d" % (name.encode('utf_8'), chunk_index)
+
+
+def scan_inputs(input_paths):
+    '''
+    Reads all input tuples once, without replicating anything, to collect the numbers that the shuffle costs
+    depend on. The .mtx files are counted chunk by chunk with numpy.
+
+    :param input_paths: the input files of the job
+    :return: a dictionary with the number of tuples and non-zero tuples of M and N, the number of rows of M,
+             the number of columns of N and the inner dimension
+    '''
+    stats = {'M_tuples': 0, 'N_tuples': 0, 'M_nonzero': 0, 'N_nonzero': 0, 'inner': 0, 'M_rows': 0, 'N_cols': 0}
+    for path in input_paths:
+        if path.endswith(matrix_format.extension):
+            header, matrix = matrix_format.open_matrix(path)
+            rows, cols = header['shape']
+            prefix = 'M' if header['name'] == mat1 else 'N'
+            stats[prefix + '_tuples'] += rows * cols
+            for first_row in range(0, rows, header['chunk_rows']):
+                stats[prefix + '_nonzero'] += int(np.count_nonzero(matrix[first_row:first_row + header['chunk_rows']]))
+            if prefix == 'M':
+                stats['M_rows'], stats['inner'] = rows, max(stats['inner'], cols)
+            else:
+                stats['N_cols'], stats['inner'] = cols, max(stats['inner'], rows)
+            continue
+
+        with open(path, 'r') as file:
+            for line in file:
+                items = line.split()
+                if len(items) != 4:
+                    continue
+                name, row, col, value = items
+                if name == mat1:
+                    prefix, j = 'M', int(col)
+                    stats['M_rows'] = max(stats['M_rows'], int(row) + 1)
+                elif name == mat2:
+                    prefix, j = 'N', int(row)
+                    stats['N_cols'] = max(stats['N_cols'], int(col) + 1)
+                else:
+                    continue
+                stats[prefix + '_tuples'] += 1
+                if float(value) != 0:
+                    stats[prefix + '_nonzero'] += 1
+                stats['inner'] = max(stats['inner'], j + 1)
+    return stats
+
+
+def estimate_shuffle_costs(stats, block_size):
+    '''
+    Estimates, for every algorithm, how many values (keys and element values, summed over all records) are sent
+    through the shuffle. The estimates assume that the non-zero elements are spread uniformly over the matrices.
+
+    :param stats: the output of scan_inputs
+    :param block_size: the tile size of the block algorithm
+    :return: a dictionary mode -> estimated number of shuffled values
+    '''
+    inner = max(stats['inner'], 1)
+    M_r, N_c = max(stats['M_rows'], 1), max(stats['N_cols'], 1)
+    nnz_M, nnz_N = stats['M_nonzero'], stats['N_nonzero']
+    b = block_size
+    n_I, n_K, n_J = (M_r + b - 1) // b, (N_c + b - 1) // b, (inner + b - 1) // b
+
+    costs = {}
+    # one record (key i,k + name, j, value) per replica of every element, zeros included
+    costs['one-phase'] = 5 * (stats['M_tuples'] * N_c + stats['N_tuples'] * M_r)
+    costs['sparse'] = 5 * (nnz_M * N_c + nnz_N * M_r)
+
+    # step 1: every non-zero element once (key j + name, index, value), then one partial product (key i,k + value)
+    #         per pair of elements with the same j is written out for step 2
+    # step 2: at most one record per output element and mapper after the in-mapper combining
+    products = nnz_M * nnz_N / inner
+    costs['two-phase'] = 4 * (nnz_M + nnz_N) + 3 * products + 3 * min(products, M_r * N_c)
+
+    # step 1: every non-zero element once per tile it is replicated to (row offset, column offset, value)
+    # step 2: one dense partial tile for each (I, K, J) with two non-empty tiles (at most all of them)
+    density_M = nnz_M / float(M_r * inner)
+    density_N = nnz_N / float(inner * N_c)
+    tile_pairs = n_I * n_K * n_J * min(1.0, density_M * b * b) * min(1.0, density_N * b * b)
+    costs['block'] = 3 * (nnz_M * n_K + nnz_N * n_I) + (b * b + 2) * tile_pairs
+
+    # the one-phase algorithm pairs the elements by position, so it is only correct when no tuple is missing
+    if stats['M_tuples'] != M_r * inner or stats['N_tuples'] != inner * N_c:
+        del costs['one-phase']
+    return costs
+
+
+def choose_mode(stats, block_size):
+    '''
+    :param stats: the output of scan_inputs
+    :return: the mode with the lowest estimated shuffle cost for the given input files
+    '''
+    costs = estimate_shuffle_costs(stats, block_size)
+    mode = min(costs, key=costs.get)
+    for name in sorted(costs, key=costs.get):
+        sys.stderr.write("estimated shuffle values for %-9s: %d\n" % (name, costs[name]))
+    sys.stderr.write("auto mode chose: %s\n" % mode)
+    return mode
+
+
+class MRMatrixDot(ProfilingMixin, ResultCacheMixin, MemoryBudgetMixin, BatchMapperMixin, BinaryProtocolMixin, MRJob):
+    # the helper modules have to be copied next to the job script in the working directory of every task
+    FILES = ['matrix_format.py', 'local_engine.py']
+    DIRS = ['../common']
+    # with --batch-size the mappers get blocks of lines
+    BATCH_MAPPERS = {'mapper_produce_pairs': 'mapper_batch_produce_pairs',
+                     'mapper_produce_sparse_pairs': 'mapper_batch_produce_sparse_pairs',
+                     'mapper_collect_blocks': 'mapper_batch_collect_blocks',
+                     'mapper_join_on_j': 'mapper_batch_join_on_j'}
+
+    # the result of scan_inputs, if the input files were scanned
+    input_stats = None
+
+    def rewrite_args(self, args):
+        '''
+        The input files are only available in the process that launches the job, so two things are resolved here:
+        - with --mode=auto the algorithm is chosen from a scan of the input files
+        - .mtx input files are replaced by the list of their chunks (and shipped to the tasks), and the shape of the
+          matrices is taken from their headers
+        so that the mappers and reducers receive the concrete mode and shape.
+        '''
+        args = super(MRMatrixDot, self).rewrite_args(args)
+        input_paths = self.options.args
+        binary_paths = [path for path in input_paths if path.endswith(matrix_format.extension)]
 
+        if self.options.mode == 'auto':
+            stats = self.input_stats = scan_inputs(input_paths)
+            args = set_option(args, '--mode', choose_mode(stats, self.options.block_size))
+            # the scan found the shape of the matrices as well
+            args = default_option(args, '--m-rows', stats['M_rows'])
+            args = default_option(args, '--n-cols', stats['N_cols'])
 
-class MRMatrixDot(MRJob):
+        if binary_paths:
+            for path in binary_paths:
+                header = matrix_format.read_header(path)
+                if header['name'] == mat1:
+                    args = default_option(args, '--m-rows', header['shape'][0])
+                elif header['name'] == mat2:
+                    args = default_option(args, '--n-cols', header['shape'][1])
+            names = [self.ship_file(path) for path in binary_paths]
+            chunk_list = self.write_input_list('Task6-chunks-', chunk_descriptors(binary_paths, names))
+            args = replace_inputs(args, binary_paths, chunk_list)
+        return args
+
+    def configure_args(self):
+        '''
+        Command line options of the job:
+        --mode: which multiplication algorithm to run (one-phase, the default, is the original algorithm of the course
+                theory, auto picks the algorithm with the lowest estimated shuffle cost); giving a mode runs the
+                MapReduce job even if the local engine could be used
+        --block-size: the side length of the square tiles used by the block algorithm
+        --m-rows, --n-cols: the number of rows of M and the number of columns of N (set automatically for .mtx input)
+        --engine: mapreduce runs the job, local multiplies the matrices on this machine (local_engine.py), auto uses
+                  the local engine when the dense matrices take less than --local-max-bytes
+        --local-max-bytes: size threshold of --engine=auto
+        --threads: number of threads of the local engine
+        '''
+        super(MRMatrixDot, self).configure_args()
+        # None: one-phase, or the local engine if --engine=auto selects it
+        self.add_passthru_arg('--mode', default=None, choices=modes + ['auto'],
+                              help='matrix multiplication algorithm to use (default: one-phase)')
+        self.add_passthru_arg('--block-size', type=int, default=100,
+                              help='side length of the square tiles in block mode')
+        self.add_passthru_arg('--m-rows', type=int, default=M_r, help='number of rows of matrix M')
+        self.add_passthru_arg('--n-cols', type=int, default=N_c, help='number of columns of matrix N')
+        self.add_passthru_arg('--engine', default='auto', choices=['auto', 'mapreduce', 'local'],
+                              help='run the MapReduce job or multiply on this machine')
+        self.add_passthru_arg('--local-max-bytes', type=int, default=local_max_bytes,
+                              help='largest size of A, B and C (dense float64) for which --engine=auto is local')
+        self.add_passthru_arg('--threads', type=int, default=local_engine.threads,
+                              help='number of threads of the local engine')
+
+    def input_shapes(self):
+        '''
+        :return: the shapes of M and N. The shape of a .mtx file comes from its header; for text tuples the rows of M
+                 and the columns of N are --m-rows and --n-cols, like in the MapReduce job, and the inner dimension
+                 comes from the other matrix or, if both are text tuples, from a scan of the files.
+        '''
+        shapes = {}
+        for path in self.original_input_paths:
+            if path.endswith(matrix_format.extension):
+                header = matrix_format.read_header(path)
+                shapes[header['name']] = tuple(header['shape'])
+        if mat1 in shapes and mat2 in shapes:
+            return shapes
+
+        if mat1 in shapes:
+            inner = shapes[mat1][1]
+        elif mat2 in shapes:
+            inner = shapes[mat2][0]
+        else:
+            if self.input_stats is None:
+                self.input_stats = scan_inputs(self.original_input_paths)
+            inner = self.input_stats['inner']
+        shapes.setdefault(mat1, (self.options.m_rows, inner))
+        shapes.setdefault(mat2, (inner, self.options.n_cols))
+        return shapes
+
+    def local_inputs(self):
+        '''
+        :return: True if the job runs on this machine (inline or local runner) and every input is an existing local
+                 file, so the local engine can read the inputs
+        '''
+        if not self.runs_locally() or not self.original_input_paths:
+            return False
+        return all(os.path.isfile(path) for path in self.original_input_paths)
+
+    def use_local_engine(self):
+        '''
+        :return: True for --engine=local, and for --engine=auto without an explicit --mode when the job runs on this
+                 machine with local input files and A, B and C (dense) take at most --local-max-bytes
+        '''
+        if self.options.engine == 'local' and not self.local_inputs():
+            self.arg_parser.error('--engine=local needs local input files and the inline or local runner')
+        if self.options.engine != 'auto' or self.options.mode is not None:
+            return self.options.engine == 'local'
+        if not self.local_inputs():
+            return False
+        # if C alone is too large, the inner dimension does not matter
+        if 8 * self.options.m_rows * self.options.n_cols > self.options.local_max_bytes:
+            return False
+        shapes = self.input_shapes()
+        size = local_engine.dense_bytes(shapes[mat1], shapes[mat2])
+        sys.stderr.write("dense size of the matrices: %d bytes, local engine up to %d bytes\n"
+                         % (size, self.options.local_max_bytes))
+        return size <= self.options.local_max_bytes
+
+    def run_job(self):
+        '''
+        Runs from the command line only: multiplies the matrices with the local engine if it is selected, otherwise
+        runs the MapReduce job as usual. If the inputs do not contain both matrices mat1 and mat2 (e.g. other matrix
+        names), the MapReduce job runs as well.
+        '''
+        if not self.use_local_engine():
+            return super(MRMatrixDot, self).run_job()
+
+        matrices = local_engine.load_inputs(self.original_input_paths, self.input_shapes())
+        if mat1 not in matrices or mat2 not in matrices:
+            sys.stderr.write("the inputs do not contain the matrices %s and %s, running the MapReduce job\n"
+                             % (mat1, mat2))
+            return super(MRMatrixDot, self).run_job()
+
+        sys.stderr.write("running the local engine with %d threads\n" % self.options.threads)
+        if self.options.output_dir:
+            os.makedirs(self.options.output_dir, exist_ok=True)
+            with open(os.path.join(self.options.output_dir, 'part-00000'), 'wb') as out:
+                local_engine.multiply(matrices[mat1], matrices[mat2], out, self.options.threads)
+        else:
+            local_engine.multiply(matrices[mat1], matrices[mat2], self.stdout, self.options.threads)
+            self.stdout.flush()
 
     def mapper_produce_pairs(self, _, line):
         '''
@@ -52,22 +469,68 @@ class MRMatrixDot(MRJob):
         (Matrix name, j, element value from input matrix)
 
         :param _: None
-        :param line: one line (containing a tuple) from an input matrix file
+        :param line: one line (containing a tuple or a chunk descriptor) from the job input
         :return: tuples of the form (index in final output matrix, (Matrix name, j, element value from input matrix))
         '''
-        items = line.split()
-        itemTuple = tuple(items)
+        for element in read_elements(line):
+            for pair in self.replicate_element(*element):
+                yield pair
+
+    def replicate_element(self, name, row, col, value):
+        '''
+        Yields one copy of an element for every output element it contributes to.
 
+        :return: tuples of the form (index in final output matrix, (Matrix name, j, element value from input matrix))
+        '''
         # the output format depends on whether a tuple comes from matrix M or N
-        if itemTuple[0] == mat1:
-            name, i, j, Mij = itemTuple
-            for k in range(N_c):  # M 0 0 1.0 is the tuple format
-                yield (int(i), k), (name, int(j), float(Mij))  # i, j, Mij are strings that should be cast to int
+        if name == mat1:
+            i, j = row, col
+            for k in range(self.options.n_cols):  # M 0 0 1.0 is the tuple format
+                yield (i, k), (name, j, value)
 
-        if itemTuple[0] == mat2:
-            name, j, k, Njk = itemTuple
-            for i in range(M_r): #N 0 0 10.0 is the tuple format
-                yield (i, int(k)), (name, int(j), float(Njk))  # k, j, Njk are strings that should be cast to int
+        if name == mat2:
+            j, k = row, col
+            for i in range(self.options.m_rows): #N 0 0 10.0 is the tuple format
+                yield (i, k), (name, j, value)
+
+    def mapper_batch_produce_pairs(self, lines):
+        '''
+        Batch version of mapper_produce_pairs (with --batch-size).
+
+        :param lines: a block of lines (containing tuples or chunk descriptors) from the job input
+        :return: tuples of the form (index in final output matrix, (Matrix name, j, element value from input matrix))
+        '''
+        for name, rows, cols, values in read_element_arrays(lines):
+            yield from self.replicate_elements(name, rows, cols, values)
+
+    def replicate_elements(self, name, rows, cols, values):
+        '''
+        Batch version of replicate_element: the copies of many elements are built with numpy, replicate_pairs at
+        a time.
+
+        :return: tuples of the form (index in final output matrix, (Matrix name, j, element value from input matrix))
+        '''
+        if name == mat1:
+            i, j = rows, cols
+            copies = self.options.n_cols  # the element is needed for (i, k) for every k
+        elif name == mat2:
+            j, k = rows, cols
+            copies = self.options.m_rows  # the element is needed for (i, k) for every i
+        else:
+            return
+
+        step = max(1, replicate_pairs // copies)
+        for start in range(0, len(values), step):
+            block = slice(start, start + step)
+            every_index = np.tile(np.arange(copies), len(values[block])).tolist()
+            if name == mat1:
+                keys = zip(np.repeat(i[block], copies).tolist(), every_index)
+            else:
+                keys = zip(every_index, np.repeat(k[block], copies).tolist())
+            j_copies = np.repeat(j[block], copies).tolist()
+            value_copies = np.repeat(values[block], copies).tolist()
+            for key, j_copy, value in zip(keys, j_copies, value_copies):
+                yield key, (name, j_copy, value)
 
     def combiner_produce_partial_lists(self, key, value):
         '''
@@ -100,6 +563,10 @@ class MRMatrixDot(MRJob):
         in the list) multiplied and all of the products summed. The final result will be yielded along
         with the key (i,k).
 
+        A row of M and a column of N can be too long for the memory of a reducer, so the items are sorted within
+        --memory-budget (common/groups.py): by (j, matrix name), which puts the items m_ij and n_jk of every j next
+        to each other, so the products are formed while the sorted items stream past.
+
         It is not necessary to cast the generator object "value" into a list because we are not transferring it
         to another step or within a step of an mrjob.
 
@@ -110,29 +577,348 @@ class MRMatrixDot(MRJob):
         '''
         key = tuple(key)
 
-        M_items = []  # items from Matrix M in one reducer
-        N_items = []  # items from Matrix N in one reducer
-
-        # distribute the tuples based on which matrix (M or N) they are coming from
-        for item_list in value:
-            for tup in item_list:
-                if tup[0] == mat1:
-                    M_items.append(tup)
-                else:
-                    N_items.append(tup)
-
-        sorted_M_items = sorted(M_items, key=lambda x: x[1])  # sort the items by index j
-        sorted_N_items = sorted(N_items, key=lambda x: x[1])  # sort the items by index j
+        # the tuples of all lists, sorted by index j and then by matrix: (M, j, m_ij), (N, j, n_jk), ...
+        items = (tup for item_list in value for tup in item_list)
+        sorted_items = self.sorted_group(items, key=lambda x: (x[1], x[0] != mat1))
 
         # essentially we are multiplying corresponding elements from one row in M with the corresponding
         # elements of a column in N and then summing the resulting products.
         # the final value is the element value at index (i,k) in the final output matrix
-        final_value = sum(
-            [sorted_M_items[i][2] * sorted_N_items[i][2] for i in range(len(sorted_M_items))])
+        final_value = sum(M_item[2] * N_item[2] for M_item, N_item in zip(sorted_items, sorted_items))
 
         yield (key, final_value)
 
+    def mapper_produce_sparse_pairs(self, _, line):
+        '''
+        Sparse mode: same as mapper_produce_pairs, but tuples with an element value of 0 are dropped since they
+        cannot contribute to any product.
+
+        :param _: None
+        :param line: one line (containing a tuple or a chunk descriptor) from the job input
+        :return: tuples of the form (index in final output matrix, (Matrix name, j, element value from input matrix))
+        '''
+        for element in read_elements(line, skip_zeros=True):
+            for pair in self.replicate_element(*element):
+                yield pair
+
+    def mapper_batch_produce_sparse_pairs(self, lines):
+        '''
+        Sparse mode: batch version of mapper_produce_sparse_pairs (with --batch-size).
+
+        :param lines: a block of lines (containing tuples or chunk descriptors) from the job input
+        :return: tuples of the form (index in final output matrix, (Matrix name, j, element value from input matrix))
+        '''
+        for name, rows, cols, values in read_element_arrays(lines):
+            non_zero = values != 0
+            yield from self.replicate_elements(name, rows[non_zero], cols[non_zero], values[non_zero])
+
+    def reducer_ik_sparse_items(self, key, value):
+        '''
+        Sparse mode: the items of row i of M are stored in a dictionary by their index j. For every item of column k
+        of N we look up the item of M with the same j; if one of them is missing it is a zero, so the product is
+        skipped. Nothing is yielded if there was no product at all (the output element is 0).
+
+        :param key: (i,k) index in the final output matrix, obtained as input from the combiner
+        :param value: a generator object with lists of tuples of the form (M, j, m_ij) or (N, j, n_ij)
+        :return: a tuple of the form: (index in final output matrix, element value in final output matrix)
+        '''
+        M_items = {}  # j -> m_ij
+        N_items = []  # (j, n_jk)
+
+        for item_list in value:
+            for name, j, item in item_list:
+                if name == mat1:
+                    M_items[j] = item
+                else:
+                    N_items.append((j, item))
+
+        products = [M_items[j] * item for j, item in N_items if j in M_items]
+        if products:
+            yield tuple(key), sum(products)
+
+    def mapper_init_blocks(self):
+        '''
+        Block mode: each mapper collects the elements it reads into the tiles they belong to, so that it can yield
+        whole tiles instead of single elements (in-mapper combining). A tile is stored as three lists holding the
+        row and column offsets inside the tile and the element values.
+        '''
+        self.blocks = defaultdict(lambda: ([], [], []))
+
+    def mapper_collect_blocks(self, _, line):
+        '''
+        Block mode: adds one tuple <M,i,j,m_ij> to the tile (M, i // b, j // b), or all elements of a chunk of a
+        .mtx file to their tiles (see collect_chunk_tiles). Nothing is yielded here; the tiles are yielded in
+        mapper_final_blocks once the mapper has seen all of its input.
+
+        :param _: None
+        :param line: one line (containing a tuple or a chunk descriptor) from the job input
+        '''
+        items = line.split()
+        chunk = open_chunk(items)
+        if chunk is not None:
+            self.collect_chunk_tiles(*chunk)
+            return
+
+        name, row, col, value = items
+        value = float(value)
+        if value == 0:
+            return  # the tiles are filled with zeros, so zero elements do not need to be sent
+
+        b = self.options.block_size
+        row, col = int(row), int(col)
+        rows, cols, values = self.blocks[(name, row // b, col // b)]
+        rows.append(row % b)
+        cols.append(col % b)
+        values.append(value)
+
+    def collect_chunk_tiles(self, name, first_row, rows):
+        '''
+        Block mode: cuts the memory mapped rows of a chunk into the parts of the tiles they cover (a chunk can start
+        and end inside a tile row) and adds the non-zero elements of every part to its tile with numpy.
+
+        :param name: Matrix name
+        :param first_row: index of the first row of the chunk
+        :param rows: memory mapped rows of the chunk
+        '''
+        b = self.options.block_size
+        last_row = first_row + rows.shape[0]
+        for tile_row in range(first_row // b, (last_row + b - 1) // b):
+            start, end = max(tile_row * b, first_row), min((tile_row + 1) * b, last_row)
+            for tile_col in range((rows.shape[1] + b - 1) // b):
+                part = rows[start - first_row:end - first_row, tile_col * b:(tile_col + 1) * b]
+                part_rows, part_cols = np.nonzero(part)
+                if len(part_rows) == 0:
+                    continue  # all-zero tiles are never sent
+                tile_rows, tile_cols, tile_values = self.blocks[(name, tile_row, tile_col)]
+                tile_rows.extend((part_rows + (start - tile_row * b)).tolist())
+                tile_cols.extend(part_cols.tolist())
+                tile_values.extend(part[part_rows, part_cols].tolist())
+
+    def mapper_batch_collect_blocks(self, lines):
+        '''
+        Block mode: batch version of mapper_collect_blocks (with --batch-size). The elements of a block of lines are
+        sorted by their tile with numpy and added to the tiles one tile at a time; chunks of .mtx files are cut into
+        tiles directly (see collect_chunk_tiles).
+
+        :param lines: a block of lines (containing tuples or chunk descriptors) from the job input
+        '''
+        b = self.options.block_size
+        tuples = []
+        for line in lines:
+            items = line.split()
+            chunk = open_chunk(items)
+            if chunk is None:
+                tuples.append(items)
+            else:
+                self.collect_chunk_tiles(*chunk)
+
+        for name, rows, cols, values in tuple_arrays(tuples):
+            non_zero = values != 0
+            rows, cols, values = rows[non_zero], cols[non_zero], values[non_zero]
+
+            tiles, inverse = np.unique(np.stack([rows // b, cols // b], axis=1), axis=0, return_inverse=True)
+            order = np.argsort(inverse.ravel(), kind='stable')
+            bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(tiles) + 1))
+            for (tile_row, tile_col), start, end in zip(tiles.tolist(), bounds[:-1], bounds[1:]):
+                selected = order[start:end]
+                tile_rows, tile_cols, tile_values = self.blocks[(name, tile_row, tile_col)]
+                tile_rows.extend((rows[selected] % b).tolist())
+                tile_cols.extend((cols[selected] % b).tolist())
+                tile_values.extend(values[selected].tolist())
+
+    def mapper_final_blocks(self):
+        '''
+        Block mode: yields every collected tile once for each tile of the final output it contributes to.
+        A tile (I, J) of M is needed for the tiles (I, K) of the output for every K, and a tile (J, K) of N is
+        needed for the tiles (I, K) of the output for every I.
+
+        :return: tuples of the form ((I, K, J), (Matrix name, row offsets, column offsets, values))
+        '''
+        b = self.options.block_size
+        n_I = (self.options.m_rows + b - 1) // b  # number of tile rows of the output matrix
+        n_K = (self.options.n_cols + b - 1) // b  # number of tile columns of the output matrix
+
+        for (name, tile_row, tile_col), (rows, cols, values) in self.blocks.items():
+            if name == mat1:
+                I, J = tile_row, tile_col
+                for K in range(n_K):
+                    yield (I, K, J), (name, rows, cols, values)
+            elif name == mat2:
+                J, K = tile_row, tile_col
+                for I in range(n_I):
+                    yield (I, K, J), (name, rows, cols, values)
+
+    def reducer_multiply_blocks(self, key, value):
+        '''
+        Block mode: each reducer gets the tile (I, J) of M and the tile (J, K) of N (possibly in several pieces,
+        one for each mapper that read a part of the tile), rebuilds them as numpy arrays and multiplies them.
+        The result is the contribution of the inner tile J to the output tile (I, K).
+
+        :param key: (I, K, J) tile indices
+        :param value: pieces of the two tiles of the form (Matrix name, row offsets, column offsets, values)
+        :return: tuples of the form ((I, K), partial output tile as a nested list)
+        '''
+        b = self.options.block_size
+        I, K, J = key
+        M_block = np.zeros((b, b))
+        N_block = np.zeros((b, b))
+        seen = set()
+
+        for name, rows, cols, values in value:
+            block = M_block if name == mat1 else N_block
+            block[rows, cols] = values
+            seen.add(name)
+
+        # a missing tile only contains zeros, so it does not contribute to the output tile
+        if len(seen) == 2:
+            yield (I, K), M_block.dot(N_block).tolist()
+
+    def combiner_sum_blocks(self, key, value):
+        '''
+        Block mode: sums the partial output tiles (I, K) of one reducer of the first step before they are sent
+        to the second step.
+
+        :param key: (I, K) tile indices
+        :param value: partial output tiles for different inner tiles J
+        :return: tuples of the form ((I, K), summed partial output tile)
+        '''
+        yield tuple(key), np.sum([np.asarray(tile) for tile in value], axis=0).tolist()
+
+    def reducer_sum_blocks(self, key, value):
+        '''
+        Block mode: sums the partial output tiles over all inner tiles J and yields the elements of the output
+        tile in the same format as the one-phase algorithm. The tiles on the border of the matrix can be partly
+        outside of it; those padding elements are not yielded.
+
+        :param key: (I, K) tile indices
+        :param value: partial output tiles for different inner tiles J
+        :return: tuples of the form (index in final output matrix, element value in final output matrix)
+        '''
+        b = self.options.block_size
+        I, K = key
+        tile = np.sum([np.asarray(tile) for tile in value], axis=0)
+
+        for r in range(min(b, self.options.m_rows - I * b)):
+            for c in range(min(b, self.options.n_cols - K * b)):
+                yield (I * b + r, K * b + c), float(tile[r, c])
+
+    def mapper_join_on_j(self, _, line):
+        '''
+        Two-phase mode, step 1: every non-zero element is sent to the reducer of its index j (the column index for
+        M and the row index for N), so that one reducer gets column j of M and row j of N.
+
+        :param _: None
+        :param line: one line (containing a tuple or a chunk descriptor) from the job input
+        :return: tuples of the form (j, (Matrix name, i or k, element value))
+        '''
+        for name, row, col, value in read_elements(line, skip_zeros=True):
+            if name == mat1:
+                yield col, (name, row, value)
+            elif name == mat2:
+                yield row, (name, col, value)
+
+    def mapper_batch_join_on_j(self, lines):
+        '''
+        Two-phase mode, step 1: batch version of mapper_join_on_j (with --batch-size).
+
+        :param lines: a block of lines (containing tuples or chunk descriptors) from the job input
+        :return: tuples of the form (j, (Matrix name, i or k, element value))
+        '''
+        for name, rows, cols, values in read_element_arrays(lines):
+            non_zero = values != 0
+            rows, cols, values = rows[non_zero].tolist(), cols[non_zero].tolist(), values[non_zero].tolist()
+
+            if name == mat1:
+                for row, col, value in zip(rows, cols, values):
+                    yield col, (name, row, value)
+            elif name == mat2:
+                for row, col, value in zip(rows, cols, values):
+                    yield row, (name, col, value)
+
+    def reducer_join_products(self, j, value):
+        '''
+        Two-phase mode, step 1: multiplies every element m_ij of column j of M with every element n_jk of row j
+        of N. Each product is one of the terms of the sum for the output element (i,k).
+
+        :param j: the inner index
+        :param value: tuples of the form (Matrix name, i or k, element value)
+        :return: tuples of the form ((i,k), m_ij * n_jk)
+        '''
+        M_items = []
+        N_items = []
+        for name, index, item in value:
+            if name == mat1:
+                M_items.append((index, item))
+            else:
+                N_items.append((index, item))
+
+        for i, m_ij in M_items:
+            for k, n_jk in N_items:
+                yield (i, k), m_ij * n_jk
+
+    def mapper_init_sum_products(self):
+        '''
+        Two-phase mode, step 2: the partial products are summed in a dictionary inside each mapper (in-mapper
+        combining), so every mapper sends at most one record per output element.
+        '''
+        self.partial_sums = defaultdict(float)
+
+    def mapper_sum_products(self, key, value):
+        '''
+        Two-phase mode, step 2: adds one partial product to the running sum of its output element.
+
+        :param key: (i,k) index in the final output matrix
+        :param value: one partial product m_ij * n_jk
+        '''
+        self.partial_sums[tuple(key)] += value
+
+    def mapper_final_sum_products(self):
+        '''
+        Two-phase mode, step 2: yields the partial sums of this mapper.
+
+        :return: tuples of the form (index in final output matrix, partial sum)
+        '''
+        for key, partial_sum in self.partial_sums.items():
+            yield key, partial_sum
+
+    def reducer_sum_products(self, key, value):
+        '''
+        Two-phase mode, step 2: sums the partial sums of all mappers.
+
+        :param key: (i,k) index in the final output matrix
+        :param value: the partial sums of the mappers
+        :return: a tuple of the form: (index in final output matrix, element value in final output matrix)
+        '''
+        yield tuple(key), sum(value)
+
     def steps(self):
+        if self.options.mode == 'two-phase':
+            return [
+                MRStep(mapper=self.mapper_join_on_j,
+                       reducer=self.reducer_join_products),
+                MRStep(mapper_init=self.mapper_init_sum_products,
+                       mapper=self.mapper_sum_products,
+                       mapper_final=self.mapper_final_sum_products,
+                       reducer=self.reducer_sum_products)
+            ]
+
+        if self.options.mode == 'block':
+            return [
+                MRStep(mapper_init=self.mapper_init_blocks,
+                       mapper=self.mapper_collect_blocks,
+                       mapper_final=self.mapper_final_blocks,
+                       reducer=self.reducer_multiply_blocks),
+                MRStep(combiner=self.combiner_sum_blocks,
+                       reducer=self.reducer_sum_blocks)
+            ]
+
+        if self.options.mode == 'sparse':
+            return [
+                MRStep(mapper=self.mapper_produce_sparse_pairs,
+                       combiner=self.combiner_produce_partial_lists,
+                       reducer=self.reducer_ik_sparse_items)
+            ]
+
         return [
             MRStep(mapper=self.mapper_produce_pairs,
                    combiner=self.combiner_produce_partial_lists,
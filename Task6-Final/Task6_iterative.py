@@ -0,0 +1,244 @@
+'''
+Petio Todorov
+Wael Fato
+
+Task6_iterative.py
+
+Iterative linear algebra (matrix-vector products, A^T A and power iteration / PageRank) on top of mrjob.
+
+Running such an algorithm as a chain of independent MRMatrixDot jobs would re-read and re-parse all tuples of the
+matrix in every iteration, although only the (small) vector changes. Here the matrix is instead partitioned ONCE
+into row blocks that are stored as binary .mtx files (see matrix_format.py) in a cache directory. The partitions
+are reused by every iteration and by later runs, as long as the source file does not change.
+
+Every iteration is one mapper-only job (MRPartitionedMatrixVector in Task6_matvec.py): the input is the list of
+partition files and the current vector is shipped to the tasks as a small .npy file. Each mapper multiplies its
+partitions (memory mapped, no parsing) with the vector and yields its slice of the result, so there is no shuffle at
+all. A^T A is computed by a second operation in which each mapper yields P^T P of its partitions and a
+combiner/reducer sums them.
+
+To RUN:
+$ python Task6_iterative.py matvec A.mtx --vector x.npy
+$ python Task6_iterative.py gram A.mtx
+$ python Task6_iterative.py power M.mtx --tol 1e-10 --max-iter 100
+$ python Task6_iterative.py pagerank M.mtx --damping 0.85
+The matrix can be a .mtx file or a text file of <M,i,j,m_ij> tuples (missing tuples are zeros). Power iteration
+and PageRank need a square matrix; for PageRank it should be column stochastic (column j holds the probabilities of
+going from page j to the other pages).
+
+Output-
+1. matvec: the result vector, gram: the matrix A^T A, power/pagerank: the final vector (saved as .npy files)
+2. The time of every iteration and the convergence measure, printed to stderr
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+import matrix_format
+from Task6_matvec import MRPartitionedMatrixVector
+
+cache_dir = 'Task6-cache'   # where the partitions of the matrices are stored
+partition_rows = 250        # number of rows of the matrix in one partition
+runner = 'inline'           # 'local' runs the tasks in subprocesses
+
+
+def fingerprint(file_path):
+    '''
+    :return: a description of the file that changes whenever the file is modified
+    '''
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'partition_rows': partition_rows}
+
+
+def load_dense(file_path):
+    '''
+    Opens a matrix as an array: .mtx files are memory mapped, text tuples are written into a temporary memory
+    mapped file on disk (so the matrix does not have to fit in memory).
+
+    :return: (matrix name, array)
+    '''
+    if file_path.endswith(matrix_format.extension):
+        header, matrix = matrix_format.open_matrix(file_path)
+        return header['name'], matrix
+
+    name, rows, cols = None, 0, 0
+    with open(file_path, 'r') as file:
+        for line in file:
+            name, row, col, _ = line.split()
+            rows, cols = max(rows, int(row) + 1), max(cols, int(col) + 1)
+
+    matrix = np.memmap(tempfile.TemporaryFile(), dtype='<f8', mode='w+', shape=(rows, cols))
+    with open(file_path, 'r') as file:
+        for line in file:
+            _, row, col, value = line.split()
+            matrix[int(row), int(col)] = float(value)
+    return name, matrix
+
+
+def partition_matrix(file_path):
+    '''
+    Splits the matrix into row partitions of partition_rows rows, stored as .mtx files in the cache directory.
+    If the partitions of the same (unchanged) file already exist they are reused.
+
+    :param file_path: a .mtx file or a text file of tuples
+    :return: (list of partition paths, shape of the matrix)
+    '''
+    key = os.path.basename(file_path).replace('.', '_')
+    directory = os.path.join(cache_dir, key)
+    manifest_path = os.path.join(directory, 'manifest.json')
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        if manifest['source'] == fingerprint(file_path):
+            return manifest['partitions'], tuple(manifest['shape'])
+
+    os.makedirs(directory, exist_ok=True)
+    name, matrix = load_dense(file_path)
+    partitions = []
+    for first_row in range(0, matrix.shape[0], partition_rows):
+        block = matrix[first_row:first_row + partition_rows]
+        path = os.path.abspath(os.path.join(directory, '%s-%d%s' % (name, first_row, matrix_format.extension)))
+        with matrix_format.MatrixWriter(path, name, block.shape) as writer:
+            writer.write_rows(block)
+        partitions.append(path)
+
+    with open(manifest_path, 'w') as file:
+        json.dump({'source': fingerprint(file_path), 'partitions': partitions, 'shape': list(matrix.shape)}, file)
+    return partitions, matrix.shape
+
+
+def write_partition_list(partitions):
+    '''
+    Writes one line "<partition path> <index of its first row>" per partition; the mappers use the first row to
+    place their result. The caller removes the file when it is done with it.
+
+    :return: path of a temporary text file with the partitions (the input of the job)
+    '''
+    handle, list_path = tempfile.mkstemp(prefix='Task6-partitions-', suffix='.txt')
+    first_row = 0
+    with os.fdopen(handle, 'w') as file:
+        for path in partitions:
+            file.write('%s %d\n' % (path, first_row))
+            first_row += matrix_format.read_header(path)['shape'][0]
+    return list_path
+
+
+def run_operation(partition_list, shape, operation, vector=None):
+    '''
+    Runs one MRPartitionedMatrixVector job over the cached partitions.
+
+    :return: the result vector (matvec) or matrix (gram) as a numpy array
+    '''
+    args = ['-r', runner, '--operation', operation, partition_list]
+    vector_path = None
+    if vector is not None:
+        handle, vector_path = tempfile.mkstemp(suffix='.npy')
+        os.close(handle)
+        np.save(vector_path, vector)
+        args += ['--vector', vector_path]
+
+    job = MRPartitionedMatrixVector(args=args)
+    try:
+        with job.make_runner() as job_runner:
+            job_runner.run()
+            if operation == 'gram':
+                for _, gram in job.parse_output(job_runner.cat_output()):
+                    return np.asarray(gram)
+            result = np.zeros(shape[0])
+            for first_row, rows in job.parse_output(job_runner.cat_output()):
+                result[first_row:first_row + len(rows)] = rows
+            return result
+    finally:
+        if vector_path is not None:
+            os.remove(vector_path)
+
+
+def matvec(file_path, vector):
+    partitions, shape = partition_matrix(file_path)
+    partition_list = write_partition_list(partitions)
+    try:
+        return run_operation(partition_list, shape, 'matvec', vector)
+    finally:
+        os.remove(partition_list)
+
+
+def gram(file_path):
+    partitions, shape = partition_matrix(file_path)
+    partition_list = write_partition_list(partitions)
+    try:
+        return run_operation(partition_list, shape, 'gram')
+    finally:
+        os.remove(partition_list)
+
+
+def power_iteration(file_path, tol=1e-10, max_iter=100, damping=None):
+    '''
+    Power iteration: x <- A x / ||A x|| until the vector stops changing. With a damping factor d this is PageRank:
+    x <- d A x + (1 - d) / n, normalized so that the elements sum to 1.
+
+    The matrix is partitioned once; every iteration only ships the vector.
+
+    :param tol: stop when the L1 distance between two consecutive vectors is below tol
+    :return: (final vector, list of (iteration, seconds, L1 change))
+    '''
+    partitions, shape = partition_matrix(file_path)
+    if shape[0] != shape[1]:
+        raise ValueError("power iteration needs a square matrix, got %s" % (shape,))
+    partition_list = write_partition_list(partitions)
+
+    n = shape[0]
+    x = np.full(n, 1.0 / n)
+    timings = []
+    try:
+        for iteration in range(1, max_iter + 1):
+            start = time.perf_counter()
+            y = run_operation(partition_list, shape, 'matvec', x)
+            if damping is not None:
+                y = damping * y + (1 - damping) / n
+                y /= np.sum(np.abs(y))
+            else:
+                y /= np.linalg.norm(y)
+
+            change = float(np.sum(np.abs(y - x)))
+            timings.append((iteration, time.perf_counter() - start, change))
+            sys.stderr.write("iteration %d: %.3fs, L1 change %.3e\n" % timings[-1])
+            x = y
+            if change < tol:
+                break
+    finally:
+        os.remove(partition_list)
+    return x, timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Iterative linear algebra on cached matrix partitions')
+    parser.add_argument('operation', choices=['matvec', 'gram', 'power', 'pagerank'])
+    parser.add_argument('matrix', help='.mtx file or text file of tuples')
+    parser.add_argument('--vector', help='.npy file with the vector (matvec)')
+    parser.add_argument('--tol', type=float, default=1e-10)
+    parser.add_argument('--max-iter', type=int, default=100)
+    parser.add_argument('--damping', type=float, default=0.85, help='damping factor (pagerank)')
+    parser.add_argument('--output', default='iterative-output.npy')
+    parser.add_argument('--runner', default=runner, choices=['inline', 'local'])
+    options = parser.parse_args()
+    runner = options.runner
+
+    if options.operation == 'matvec':
+        result = matvec(options.matrix, np.load(options.vector))
+    elif options.operation == 'gram':
+        result = gram(options.matrix)
+    else:
+        damping = options.damping if options.operation == 'pagerank' else None
+        result, timings = power_iteration(options.matrix, options.tol, options.max_iter, damping)
+        total = sum(seconds for _, seconds, _ in timings)
+        sys.stderr.write("%d iterations in %.3fs\n" % (len(timings), total))
+
+    np.save(options.output, result)
+    print("Result saved to", options.output)
@@ -0,0 +1,89 @@
+'''
+Petio Todorov
+Wael Fato
+
+Task6_matvec.py
+
+The mrjob job used by Task6_iterative.py. Its input is a list of row partitions of a matrix stored as .mtx files
+(one line "<partition path> <index of its first row>" per partition, see write_partition_list in Task6_iterative.py).
+--operation=matvec multiplies every partition with the vector given by --vector (a .npy file that mrjob ships to
+every task) in a mapper-only step; --operation=gram sums P^T P over all partitions P, which gives A^T A.
+
+To RUN: it is started by Task6_iterative.py, but it can also be run on its own:
+$ python Task6_matvec.py --runner=local --no-bootstrap-mrjob --vector x.npy partition-list.txt > matvec-output.txt
+'''
+
+import numpy as np
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+
+import matrix_format
+import os
+import sys
+# the shared helpers are in the folder "common" at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.protocols import BinaryProtocolMixin
+from common.profiling import ProfilingMixin
+
+
+class MRPartitionedMatrixVector(ProfilingMixin, BinaryProtocolMixin, MRJob):
+    '''
+    The input of this job is a list of partition files (one "<path> <first row>" line per partition).
+    --operation=matvec: yields (first row of the partition, partition . vector)
+    --operation=gram: yields (None, sum of P^T P over all partitions)
+    '''
+    FILES = ['matrix_format.py']
+    DIRS = ['../common']
+
+    def configure_args(self):
+        super(MRPartitionedMatrixVector, self).configure_args()
+        self.add_passthru_arg('--operation', default='matvec', choices=['matvec', 'gram'])
+        self.add_file_arg('--vector', help='.npy file with the vector to multiply with (matvec only)')
+
+    def mapper_init_vector(self):
+        '''
+        Loads the vector once per mapper; it is shipped to the working directory of the task by mrjob.
+        '''
+        self.vector = np.load(self.options.vector)
+
+    def mapper_multiply_partition(self, _, line):
+        '''
+        :param line: path of one partition file and the index of its first row
+        :return: (index of the first row of the partition, the rows of the result vector for this partition)
+        '''
+        path, first_row = line.strip().rsplit(' ', 1)
+        header, partition = matrix_format.open_matrix(path)
+        yield int(first_row), partition.dot(self.vector).tolist()
+
+    def mapper_gram_partition(self, _, line):
+        '''
+        A^T A is the sum of P^T P over the row partitions P of A.
+
+        :param line: path of one partition file and the index of its first row
+        :return: (None, P^T P as a nested list)
+        '''
+        header, partition = matrix_format.open_matrix(line.strip().rsplit(' ', 1)[0])
+        yield None, partition.T.dot(partition).tolist()
+
+    def reducer_sum_grams(self, _, grams):
+        '''
+        Sums the P^T P matrices of the partitions (used as combiner and as reducer).
+        '''
+        yield None, np.sum([np.asarray(gram) for gram in grams], axis=0).tolist()
+
+    def steps(self):
+        if self.options.operation == 'gram':
+            return [
+                MRStep(mapper=self.mapper_gram_partition,
+                       combiner=self.reducer_sum_grams,
+                       reducer=self.reducer_sum_grams)
+            ]
+
+        return [
+            MRStep(mapper_init=self.mapper_init_vector,
+                   mapper=self.mapper_multiply_partition)
+        ]
+
+
+if __name__ == '__main__':
+    MRPartitionedMatrixVector.run()
@@ -11,39 +11,76 @@ Converts matrices stored in text files into text files that have tuples with the
 To RUN:
 run it like a regular .py file in Pycharm.
 
+It also converts them into the binary matrix format of matrix_format.py (A.mtx, B.mtx), which Task6.py can read
+directly with np.memmap and which stores the shape of the matrix, so M_r and N_c do not need to be hard coded.
+
+Both conversions stream the input matrix one row at a time; neither the matrix nor the list of tuples is ever
+fully in memory.
+
 Output-
 1. Text files with the correct format for the matrix. A_tuples.txt, B_tuples.txt.
+2. Binary matrix files. A.mtx, B.mtx.
 Used as input to Task6.py
 '''
 
 import numpy as np
 from pathlib import Path
+import matrix_format
 
 # These matrices were created and then used for testing purposes only.
 M = np.array([[1, 2, 3,4], [4, 5, 6,7],[3,3,3,3]])
 N= np.array([[10,10],[20,20], [30,30],[40,40]])
-np.savetxt('M.txt', M, fmt='%s')
-np.savetxt('N.txt', N, fmt='%s')
+
+
+def read_rows(file_path):
+    '''
+    Reads a matrix stored as a text file (one row per line, elements separated by spaces) one row at a time.
+
+    :return: a generator of 1-d numpy arrays, one for each row
+    '''
+    with open(file_path, 'r') as file:
+        for line in file:
+            if line.strip():
+                yield np.array(line.split(), dtype=float)
 
 
 def generate_tuples(file_path):
     matrix_name = Path(file_path).stem # cuts the stem, only the name of the file remains e.g. C.txt -- C
-    matrix = np.loadtxt(file_path, delimiter=" ") # load the file contents into an np array
 
-    matrix_tuples = []
-    for i in range(len(matrix)):
-        for j in range(len(matrix[0])):
-            matrix_tuples.append((matrix_name, i, j, matrix[i][j]))
-    np.savetxt(fr"{matrix_name}_tuples.txt", matrix_tuples, fmt='%s') # save the tuples to a text file
+    with open(fr"{matrix_name}_tuples.txt", 'w') as tuples_file:
+        for i, row in enumerate(read_rows(file_path)):
+            # the tuples are written as soon as a row is read instead of being collected in a list first
+            tuples_file.writelines("%s %d %d %s\n" % (matrix_name, i, j, value) for j, value in enumerate(row))
+
+
+def generate_binary(file_path, chunk_rows=matrix_format.default_chunk_rows):
+    matrix_name = Path(file_path).stem
+
+    # the file is read once: the first row gives the number of columns, and the writer counts the rows and stores
+    # their number in the header at the end
+    rows = read_rows(file_path)
+    first_row = next(rows)
+
+    with matrix_format.MatrixWriter(fr"{matrix_name}{matrix_format.extension}", matrix_name, (None, len(first_row)),
+                                    chunk_rows=chunk_rows) as writer:
+        writer.write_rows(first_row)
+        for row in rows:
+            writer.write_rows(row)
+
 
+if __name__ == '__main__':
+    np.savetxt('M.txt', M, fmt='%s')
+    np.savetxt('N.txt', N, fmt='%s')
 
-# Generate the new files for the input matrices A and B
-generate_tuples("A.txt")
-generate_tuples("B.txt")
+    # Generate the new files for the input matrices A and B
+    generate_tuples("A.txt")
+    generate_tuples("B.txt")
+    generate_binary("A.txt")
+    generate_binary("B.txt")
 
-# these two files of tuples were used for testing purposes only
-generate_tuples("M.txt")
-generate_tuples("N.txt")
+    # these two files of tuples were used for testing purposes only
+    generate_tuples("M.txt")
+    generate_tuples("N.txt")
 
 
 
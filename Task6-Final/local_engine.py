@@ -0,0 +1,130 @@
+'''
+Petio Todorov
+Wael Fato
+
+local_engine.py
+
+Single machine, out-of-core matrix multiplication for Task6.py. When the matrices fit on the disk of one machine,
+sending every element through mrjob is much slower than letting numpy (BLAS) multiply blocks of them, so Task6.py
+uses this engine automatically below a size threshold (see --engine and --local-max-bytes in Task6.py).
+
+- A and B are opened as memory mapped arrays (.mtx files directly; text tuple files are first copied into temporary
+  memory mapped files), so they never have to be fully in memory.
+- C is computed block of rows by block of rows: A[rows].dot(B[:, cols]) for one block of columns at a time. The
+  blocks of rows are computed by a pool of threads (numpy releases the GIL while it multiplies).
+- Every finished block of rows is written to the output immediately, in the same format as MRMatrixDot:
+  "[i, k]\t<value>" per element. Only a few blocks are in memory at the same time.
+
+To RUN: it is used by Task6.py, e.g.
+$ python Task6.py --engine=local A.mtx B.mtx > mtrx-output.txt
+'''
+
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import matrix_format
+
+block_rows = 256     # rows of C computed by one thread at a time
+block_cols = 4096    # columns of B read at once
+threads = os.cpu_count() or 1
+
+
+def load_tuples(paths, shapes=None):
+    '''
+    Copies the elements of text tuple files (<M,i,j,m_ij>, missing tuples are zeros) into temporary memory mapped
+    arrays, one per matrix name. The files are read twice: once to find the shape of every matrix, once to fill it.
+
+    :param paths: text files of tuples
+    :param shapes: optional dictionary name -> shape, used instead of the largest indices in the files
+    :return: a dictionary matrix name -> array
+    '''
+    found = {}
+    for path in paths:
+        with open(path, 'r') as file:
+            for line in file:
+                name, row, col, _ = line.split()
+                rows, cols = found.get(name, (0, 0))
+                found[name] = (max(rows, int(row) + 1), max(cols, int(col) + 1))
+    found.update(shapes or {})
+
+    matrices = {name: np.memmap(tempfile.TemporaryFile(), dtype='<f8', mode='w+', shape=shape)
+                for name, shape in found.items()}
+    for path in paths:
+        with open(path, 'r') as file:
+            for line in file:
+                name, row, col, value = line.split()
+                matrices[name][int(row), int(col)] = float(value)
+    return matrices
+
+
+def load_inputs(paths, shapes=None):
+    '''
+    :param paths: .mtx files and/or text tuple files
+    :param shapes: optional dictionary name -> shape for matrices given as text tuples
+    :return: a dictionary matrix name -> array (memory mapped)
+    '''
+    matrices = {}
+    for path in paths:
+        if path.endswith(matrix_format.extension):
+            header, matrix = matrix_format.open_matrix(path)
+            matrices[header['name']] = matrix
+    text_paths = [path for path in paths if not path.endswith(matrix_format.extension)]
+    if text_paths:
+        shapes = {name: shape for name, shape in (shapes or {}).items() if name not in matrices}
+        matrices.update(load_tuples(text_paths, shapes))
+    return matrices
+
+
+def dense_bytes(A_shape, B_shape):
+    '''
+    :return: the size in bytes of A, B and C stored densely as float64
+    '''
+    (m, n), (_, p) = A_shape, B_shape
+    return 8 * (m * n + n * p + m * p)
+
+
+def _compute_rows(A, B, first_row):
+    '''
+    Computes the rows first_row ... first_row + block_rows of C and formats them as output lines.
+
+    :return: the output lines of this block as bytes
+    '''
+    A_rows = np.asarray(A[first_row:first_row + block_rows])
+    C_rows = np.empty((A_rows.shape[0], B.shape[1]))
+    for first_col in range(0, B.shape[1], block_cols):
+        C_rows[:, first_col:first_col + block_cols] = A_rows.dot(B[:, first_col:first_col + block_cols])
+
+    lines = []
+    for i, row in enumerate(C_rows.tolist(), first_row):
+        prefix = "[%d, " % i
+        # %r gives the shortest repr of the float, which is what the JSON output protocol of mrjob writes
+        lines.append("".join(["%s%d]\t%r\n" % (prefix, k, value) for k, value in enumerate(row)]))
+    return "".join(lines).encode('utf_8')
+
+
+def multiply(A, B, out, n_threads=threads):
+    '''
+    Computes C = A.dot(B) block by block and writes it to out in the output format of MRMatrixDot.
+
+    :param A: array-like (e.g. memory mapped) of shape (m, n)
+    :param B: array-like of shape (n, p)
+    :param out: a binary file object
+    :param n_threads: number of threads that compute blocks of rows in parallel
+    :return: the number of elements written
+    '''
+    if A.shape[1] != B.shape[0]:
+        raise ValueError("shapes %s and %s cannot be multiplied" % (A.shape, B.shape))
+
+    row_blocks = list(range(0, A.shape[0], block_rows))
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        # keep at most 2 blocks per thread in flight, and write the blocks in order as soon as they are done
+        window = 2 * n_threads
+        futures = [pool.submit(_compute_rows, A, B, first_row) for first_row in row_blocks[:window]]
+        for index in range(len(row_blocks)):
+            out.write(futures[index].result())
+            futures[index] = None  # free the block
+            if index + window < len(row_blocks):
+                futures.append(pool.submit(_compute_rows, A, B, row_blocks[index + window]))
+    return A.shape[0] * B.shape[1]
@@ -0,0 +1,143 @@
+'''
+Petio Todorov
+Wael Fato
+
+matrix_format.py
+
+A binary on-disk format for the input matrices of Task6.py, used instead of the text files of <M,i,j,m_ij> tuples.
+With text tuples every element is stored as a line of ~30 characters that has to be split and converted with
+float() again by every mapper, and the shape of the matrices has to be hard coded in Task6.py.
+
+File layout (extension .mtx):
+- a header of header_size bytes: magic "MTRX", format version, matrix name, numpy dtype, number of rows,
+  number of columns and the number of rows per chunk
+- the elements in row-major (C) order. The file is split into chunks of chunk_rows complete rows; since the rows
+  are stored one after the other, a chunk is simply a contiguous slice of the file.
+
+Because the elements are stored exactly as they are in memory, the whole matrix (or any chunk of it) can be opened
+with np.memmap without copying or parsing anything; only the pages that are actually read are loaded from disk.
+
+To RUN: this module is imported by gen_A_B_tuples.py (to write .mtx files) and Task6.py (to read them).
+'''
+
+import struct
+import numpy as np
+
+extension = '.mtx'
+magic = b'MTRX'
+version = 1
+# magic, version, (padding), matrix name, dtype, rows, columns, rows per chunk
+header_struct = struct.Struct('<4sB3x8s8sQQQ')
+header_size = 64  # the header is padded so that the elements start at an aligned offset
+default_chunk_rows = 100
+
+
+def read_header(file_path):
+    '''
+    :param file_path: path of a .mtx file
+    :return: a dictionary with the fields of the header (name, dtype, shape, chunk_rows)
+    '''
+    with open(file_path, 'rb') as file:
+        raw = file.read(header_struct.size)
+
+    file_magic, file_version, name, dtype, rows, cols, chunk_rows = header_struct.unpack(raw)
+    if file_magic != magic or file_version != version:
+        raise ValueError("%s is not a matrix file of version %d" % (file_path, version))
+
+    return {'name': name.rstrip(b'\0').decode(),
+            'dtype': np.dtype(dtype.rstrip(b'\0').decode()),
+            'shape': (rows, cols),
+            'chunk_rows': chunk_rows}
+
+
+def open_matrix(file_path):
+    '''
+    Opens the elements of a .mtx file as a read-only memory mapped numpy array (zero-copy).
+
+    :param file_path: path of a .mtx file
+    :return: (header dictionary, memory mapped array of shape header['shape'])
+    '''
+    header = read_header(file_path)
+    matrix = np.memmap(file_path, dtype=header['dtype'], mode='r', offset=header_size, shape=header['shape'])
+    return header, matrix
+
+
+def number_of_chunks(header):
+    '''
+    :param header: a header dictionary returned by read_header
+    :return: the number of row-block chunks of the matrix
+    '''
+    rows = header['shape'][0]
+    return (rows + header['chunk_rows'] - 1) // header['chunk_rows']
+
+
+def read_chunk(file_path, chunk_index):
+    '''
+    Opens one row-block chunk of a .mtx file without reading the rest of the file.
+
+    :param file_path: path of a .mtx file
+    :param chunk_index: index of the chunk (0 is the first chunk_rows rows)
+    :return: (header dictionary, index of the first row of the chunk, memory mapped array with the rows of the chunk)
+    '''
+    header, matrix = open_matrix(file_path)
+    first_row = chunk_index * header['chunk_rows']
+    return header, first_row, matrix[first_row:first_row + header['chunk_rows']]
+
+
+class MatrixWriter:
+    '''
+    Writes a .mtx file block of rows by block of rows, so that a matrix never has to be fully in memory.
+    The rows have to be written in order and the file is checked to be complete when it is closed. If the number of
+    rows is not known in advance (shape[0] is None), the rows written are counted and stored in the header when the
+    file is closed.
+
+    Usage:
+        with MatrixWriter('A.mtx', 'A', (1000, 50)) as writer:
+            for block in blocks_of_rows:
+                writer.write_rows(block)
+    '''
+
+    def __init__(self, file_path, name, shape, dtype='<f8', chunk_rows=default_chunk_rows):
+        self.file_path = file_path
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+
+        self.file = open(file_path, 'wb')
+        self.write_header(self.shape[0] or 0)
+
+    def write_header(self, rows):
+        header = header_struct.pack(magic, version, self.name.encode(), self.dtype.str.encode(),
+                                    rows, self.shape[1], self.chunk_rows)
+        self.file.write(header.ljust(header_size, b'\0'))
+
+    def write_rows(self, rows):
+        '''
+        :param rows: a 1-d array (one row) or 2-d array (several rows) with shape[1] columns
+        '''
+        rows = np.ascontiguousarray(np.atleast_2d(rows), dtype=self.dtype)
+        if rows.shape[1] != self.shape[1] or (self.shape[0] is not None and
+                                              self.rows_written + rows.shape[0] > self.shape[0]):
+            raise ValueError("rows of shape %s do not fit in matrix %s" % (rows.shape, self.shape))
+        self.file.write(rows.tobytes())
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        if self.shape[0] is None:
+            self.shape = (self.rows_written, self.shape[1])
+            self.file.seek(0)
+            self.write_header(self.rows_written)
+        self.file.close()
+        if self.rows_written != self.shape[0]:
+            raise ValueError("%s: %d of %d rows were written" % (self.file_path, self.rows_written, self.shape[0]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
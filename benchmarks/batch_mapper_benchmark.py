@@ -0,0 +1,118 @@
+'''
+Petio Todorov
+Wael Fato
+
+batch_mapper_benchmark.py
+
+Measures the speedup of the batch mappers (common/batches.py) of Task3, Task4 and Task6. Every job is run in-process
+(common/simulate.py) on the same input lines, once with the line mappers (--batch-size 0) and once with the batch
+mappers (--batch-size N). We report:
+- the time of the mappers of the first step alone (the best of --repeat runs, since the first run also warms up
+  the caches and imports)
+- the time of the whole simulated job (mappers, encoding, sorting, combiners and reducers)
+- the number of records that leave the mappers (the batch mappers of Task3 and Task4 sum the values of every key of
+  a block, so fewer records go to the combiners)
+- whether both runs gave the same output: the outputs are decoded into the results of common/api.py and the floats
+  are compared with a tolerance, since the revenues are summed in another order and their last bits can differ
+
+To RUN (from the root of the repository; jobs without an input file are skipped):
+$ python benchmarks/batch_mapper_benchmark.py --task3 retail1011.csv --task4 retail1011.csv --batch-size 10000
+Task6 uses Task6-Final/A_tuples.txt and B_tuples.txt in block mode by default; other matrices need their shape:
+$ python benchmarks/batch_mapper_benchmark.py --task6 A_tuples-1x.txt B_tuples-1x.txt --task6-shape 100 100 \
+    --task6-modes one-phase sparse two-phase block
+
+Output-
+1. A table with one line per (task, mapper), and the speedups of the batch mappers
+'''
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.tasks import root_dir, load_job_class
+from common.simulate import simulate_job
+from common.api import result_types
+from protocol_benchmark import read_lines, same_values
+
+
+def time_mappers(job, lines, repeat):
+    '''
+    :return: (best seconds of the mappers of the first step, number of records they yielded)
+    '''
+    input_protocol = job.input_protocol()
+    pairs = [input_protocol.read(line) for line in lines]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = sum(1 for _ in job.map_pairs(pairs, 0))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, records
+
+
+def same_results(task, output1, output2):
+    '''
+    :return: whether two outputs of a task have the same results in the same order (up to rounding of floats)
+    '''
+    results1 = [result_types[task](key, value) for key, value in output1]
+    results2 = [result_types[task](key, value) for key, value in output2]
+    # Task6 yields the elements of C in the order of the shuffle, which is the same for both mappers
+    return len(results1) == len(results2) and all(same_values(list(x), list(y)) for x, y in zip(results1, results2))
+
+
+def benchmark_job(task, lines, args, batch_size, repeat):
+    '''
+    :return: one result row per mapper ('line' and 'batch'), and whether both gave the same output
+    '''
+    job_class = load_job_class(task)
+    rows, outputs = [], []
+    for mapper, size in [('line', 0), ('batch', batch_size)]:
+        job_args = args + ['--batch-size', str(size)]
+        mapper_seconds, records = time_mappers(job_class(args=job_args), lines, repeat)
+        start = time.perf_counter()
+        output, _ = simulate_job(job_class(args=job_args), lines)
+        rows.append([mapper, mapper_seconds, time.perf_counter() - start, records])
+        outputs.append(output)
+    return rows, same_results(task, outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='line mappers vs batch mappers')
+    parser.add_argument('--task3', nargs='+', help='input file(s) of Task3')
+    parser.add_argument('--task4', nargs='+', help='input file(s) of Task4')
+    parser.add_argument('--task6', nargs='+',
+                        help='tuple files of Task6 (default: Task6-Final/A_tuples.txt B_tuples.txt)')
+    parser.add_argument('--task6-shape', nargs=2, type=int, metavar=('M_ROWS', 'N_COLS'),
+                        help='rows of M and columns of N, if the matrices are not the default ones of Task6.py')
+    parser.add_argument('--task6-modes', nargs='+', default=['block'], help='--mode values of the Task6 job')
+    parser.add_argument('--max-lines', type=int, default=100000, help='lines read from every Task3 and Task4 file')
+    parser.add_argument('--batch-size', type=int, default=10000, help='--batch-size of the batch mappers')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of the mappers; the best time is reported')
+    options = parser.parse_args()
+
+    if options.task6 is None:
+        options.task6 = [os.path.join(root_dir, 'Task6-Final', 'A_tuples.txt'),
+                         os.path.join(root_dir, 'Task6-Final', 'B_tuples.txt')]
+    task6_args = ['--engine', 'mapreduce']
+    if options.task6_shape:
+        task6_args += ['--m-rows', str(options.task6_shape[0]), '--n-cols', str(options.task6_shape[1])]
+
+    # (name, task, input files, lines read from every file, extra arguments)
+    runs = [('Task3', 'Task3', options.task3, options.max_lines, []),
+            ('Task4', 'Task4', options.task4, options.max_lines, [])]
+    # the one-phase mode needs the complete matrices, so all lines of the tuple files are read
+    runs += [('Task6 ' + mode, 'Task6', options.task6, None, task6_args + ['--mode', mode])
+             for mode in options.task6_modes]
+
+    print("%-16s %-6s %10s %10s %10s %8s %8s %5s"
+          % ('job', 'mapper', 'map s', 'job s', 'records', 'map x', 'job x', 'same'))
+    for name, task, paths, max_lines, args in runs:
+        if not paths:
+            continue
+        (line_row, batch_row), same = benchmark_job(task, read_lines(paths, max_lines), args, options.batch_size,
+                                                    options.repeat)
+        for row in (line_row, batch_row):
+            print("%-16s %-6s %10.3f %10.3f %10d %8.2f %8.2f %5s"
+                  % (name, row[0], row[1], row[2], row[3], line_row[1] / row[1], line_row[2] / row[2], same))
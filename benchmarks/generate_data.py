@@ -0,0 +1,233 @@
+'''
+Petio Todorov
+Wael Fato
+
+generate_data.py
+
+Generates synthetic input files for all tasks, at several scales, so that the jobs can be benchmarked on more than
+the small sample files of the repository. The files have the same format as the real inputs and distributions that
+look like the real data:
+- title.basics.tsv (Task1, Task2): the words of the titles follow a Zipf distribution (a few words such as "the",
+  "love" or "night" are very common, most words are rare), the genres are skewed (Drama and Comedy are much more
+  common than Film-Noir) and most titles are recent (startYear).
+- retail CSV (Task3, Task4): the number of invoice lines per customer and per product is heavy-tailed (Zipf), the
+  quantities are mostly small and the prices log-normal. About 20% of the lines have no Customer ID, like in the
+  real data.
+- arxiv JSON lines (Task5): summaries of 80 to 200 Zipfian words.
+- matrix tuples (Task6): two dense square matrices A and B as <M,i,j,m_ij> tuples.
+
+Scale 1 is small enough for a laptop (e.g. 100,000 titles), scale 10 and 100 multiply the number of lines (for the
+matrices, the number of tuples). The random generator is seeded, so the same scale always gives the same files.
+
+To RUN (from the root of the repository):
+$ python benchmarks/generate_data.py --scales 1 10 100
+The files are written to benchmarks/data/, e.g. title.basics-10x.tsv, retail-10x.csv, arxiv-10x.jl,
+A_tuples-10x.txt and B_tuples-10x.txt.
+'''
+
+import os
+import math
+import json
+import argparse
+import numpy as np
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+seed = 2021
+
+# number of lines (or tuples) at scale 1
+base_titles = 100000
+base_retail = 50000
+base_papers = 2000
+base_matrix_side = 100  # A and B are base_matrix_side x base_matrix_side at scale 1
+
+vocabulary_size = 50000
+zipf_exponent = 1.1
+# the most common words of the vocabulary, the rest are made up from syllables
+common_words = ['the', 'of', 'a', 'love', 'in', 'and', 'man', 'night', 'life', 'story', 'to', 'world', 'day',
+                'girl', 'last', 'time', 'house', 'my', 'dead', 'home', 'christmas', 'war', 'little', 'one', 'new',
+                'model', 'learning', 'network', 'data', 'neural', 'image', 'method', 'problem', 'results']
+syllables = ['ka', 'lo', 'mi', 'ren', 'to', 'sa', 'vel', 'dor', 'an', 'is', 'ur', 'be', 'chi', 'mon', 'ta', 'ri',
+             'ne', 'os', 'pal', 'gen', 'ex', 'qu', 'zo', 'fi', 'la', 'ter', 'in', 'ma']
+
+# (genre, relative frequency), roughly the frequencies of the real title.basics.tsv
+genres = [('Drama', 30), ('Comedy', 20), ('Documentary', 12), ('Short', 10), ('Romance', 6), ('Action', 6),
+          ('Thriller', 5), ('Crime', 5), ('Horror', 4), ('Family', 4), ('Adventure', 4), ('Animation', 3),
+          ('Music', 3), ('Biography', 2), ('History', 2), ('Fantasy', 2), ('Mystery', 2), ('Sci-Fi', 2),
+          ('Western', 1), ('Musical', 1), ('War', 1), ('Sport', 1), ('Film-Noir', 0.2)]
+# (titleType, relative frequency)
+title_types = [('tvEpisode', 60), ('short', 12), ('movie', 10), ('video', 5), ('tvSeries', 3), ('tvMovie', 2),
+               ('videoGame', 0.5)]
+countries = [('United Kingdom', 90), ('Germany', 2), ('France', 2), ('EIRE', 2), ('Spain', 1), ('Netherlands', 1),
+             ('Belgium', 1), ('Switzerland', 1)]
+
+
+def make_vocabulary(rng):
+    '''
+    :return: vocabulary_size distinct words; the first ones are common_words
+    '''
+    words = list(common_words)
+    seen = set(words)
+    while len(words) < vocabulary_size:
+        word = ''.join(rng.choice(syllables, size=rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return np.array(words)
+
+
+def zipf_probabilities(n, exponent=zipf_exponent):
+    '''
+    :return: the probabilities of the ranks 1..n of a (finite) Zipf distribution
+    '''
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def weighted_choice(rng, choices, size):
+    '''
+    :param choices: list of (value, relative frequency)
+    :return: size values drawn with the given frequencies
+    '''
+    values = [value for value, _ in choices]
+    weights = np.array([weight for _, weight in choices], dtype=np.float64)
+    return rng.choice(values, size=size, p=weights / weights.sum())
+
+
+def zipf_texts(rng, vocabulary, n_words):
+    '''
+    :param n_words: number of words of every text
+    :return: one text of Zipfian words per element of n_words (all words are drawn at once, since drawing with
+             probabilities is slow for single values)
+    '''
+    words = rng.choice(vocabulary, size=int(np.sum(n_words)), p=zipf_probabilities(len(vocabulary)))
+    ends = np.cumsum(n_words)
+    return [' '.join(words[end - n:end]) for n, end in zip(n_words, ends)]
+
+
+def generate_titles(path, rows, rng, vocabulary):
+    '''
+    Writes rows lines of title.basics.tsv: tconst titleType primaryTitle originalTitle isAdult startYear endYear
+    runtimeMinutes genres (tab separated, \\N for missing values).
+    '''
+    titles = zipf_texts(rng, vocabulary, rng.integers(1, 7, size=rows))
+    types = weighted_choice(rng, title_types, rows)
+    # most titles are recent: the years are skewed towards the end of 1890 ... 2020
+    years = (2021 - np.floor(rng.exponential(18, size=rows))).astype(int).clip(1890, 2020)
+    runtimes = rng.integers(5, 180, size=rows)
+    has_runtime = rng.random(rows) < 0.7
+    n_genres = rng.integers(1, 4, size=rows)
+    all_genres = weighted_choice(rng, genres, int(n_genres.sum()))
+    genre_ends = np.cumsum(n_genres)
+
+    with open(path, 'w') as file:
+        file.write('tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes\t'
+                   'genres\n')
+        for n in range(rows):
+            title = titles[n].title()
+            title_genres = sorted(set(all_genres[genre_ends[n] - n_genres[n]:genre_ends[n]]))
+            runtime = str(runtimes[n]) if has_runtime[n] else '\\N'
+            file.write('tt%07d\t%s\t%s\t%s\t0\t%d\t\\N\t%s\t%s\n'
+                       % (n + 1, types[n], title, title, years[n], runtime, ','.join(title_genres)))
+
+
+def generate_retail(path, rows, rng):
+    '''
+    Writes rows lines of the online retail CSV: Invoice,StockCode,Description,Quantity,InvoiceDate,Price,
+    Customer ID,Country.
+    '''
+    n_customers = max(100, rows // 20)
+    n_products = max(100, rows // 10)
+    customers = 12346 + rng.permutation(n_customers)[rng.choice(n_customers, size=rows,
+                                                                 p=zipf_probabilities(n_customers))]
+    products = rng.choice(n_products, size=rows, p=zipf_probabilities(n_products))
+    product_prices = np.round(rng.lognormal(1.0, 0.9, size=n_products), 2)
+    quantities = np.minimum(rng.geometric(0.25, size=rows), 1000)
+    quantities[rng.random(rows) < 0.02] *= -1  # cancellations
+    no_customer = rng.random(rows) < 0.2
+    country = weighted_choice(rng, countries, rows)
+
+    with open(path, 'w') as file:
+        file.write('Invoice,StockCode,Description,Quantity,InvoiceDate,Price,Customer ID,Country\n')
+        invoice = 489434
+        for n in range(rows):
+            if rng.random() < 0.05:  # about 20 lines per invoice
+                invoice += 1
+            customer = '' if no_customer[n] else str(customers[n])
+            file.write('%d,%d,PRODUCT %d,%d,2010-12-01 08:26:00,%.2f,%s,%s\n'
+                       % (invoice, 10000 + products[n], products[n], quantities[n], product_prices[products[n]],
+                          customer, country[n]))
+
+
+def generate_papers(path, rows, rng, vocabulary):
+    '''
+    Writes rows JSON lines with the fields of mod-arxivData.jl that Task5 uses.
+    '''
+    titles = zipf_texts(rng, vocabulary, rng.integers(4, 12, size=rows))
+    summaries = zipf_texts(rng, vocabulary, rng.integers(80, 200, size=rows))
+    with open(path, 'w') as file:
+        for n in range(rows):
+            paper = {'id': '%04d.%05d' % (1000 + n // 100000, n % 100000), 'title': titles[n],
+                     'summary': summaries[n]}
+            json.dump(paper, file)
+            file.write('\n')
+
+
+def generate_matrices(A_path, B_path, side, rng):
+    '''
+    Writes two dense side x side matrices as <M,i,j,m_ij> tuples, in the format of gen_A_B_tuples.py.
+    '''
+    for name, path in (('A', A_path), ('B', B_path)):
+        matrix = rng.random((side, side))
+        with open(path, 'w') as file:
+            for i in range(side):
+                file.write(''.join('%s %d %d %r\n' % (name, i, j, value) for j, value in enumerate(matrix[i].tolist())))
+
+
+def dataset_paths(scale, directory=data_dir):
+    '''
+    :return: a dictionary dataset name -> list of the files of that dataset at the given scale
+    '''
+    suffix = '-%dx' % scale
+    return {'titles': [os.path.join(directory, 'title.basics%s.tsv' % suffix)],
+            'retail': [os.path.join(directory, 'retail%s.csv' % suffix)],
+            'papers': [os.path.join(directory, 'arxiv%s.jl' % suffix)],
+            'matrices': [os.path.join(directory, 'A_tuples%s.txt' % suffix),
+                         os.path.join(directory, 'B_tuples%s.txt' % suffix)]}
+
+
+def generate(scale, directory=data_dir, datasets=None):
+    '''
+    Writes the files of the given datasets (all by default) at the given scale.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    paths = dataset_paths(scale, directory)
+    datasets = datasets or list(paths)
+    # every dataset has its own seeded generator, so generating one dataset does not change the others
+    rng_for = lambda dataset: np.random.default_rng([seed, scale, list(paths).index(dataset)])
+    vocabulary = make_vocabulary(np.random.default_rng(seed))
+
+    if 'titles' in datasets:
+        generate_titles(paths['titles'][0], base_titles * scale, rng_for('titles'), vocabulary)
+    if 'retail' in datasets:
+        generate_retail(paths['retail'][0], base_retail * scale, rng_for('retail'))
+    if 'papers' in datasets:
+        generate_papers(paths['papers'][0], base_papers * scale, rng_for('papers'), vocabulary)
+    if 'matrices' in datasets:
+        side = int(round(base_matrix_side * math.sqrt(scale)))
+        generate_matrices(paths['matrices'][0], paths['matrices'][1], side, rng_for('matrices'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='synthetic input files for the benchmarks')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1], help='scales to generate, e.g. 1 10 100')
+    parser.add_argument('--datasets', nargs='+', choices=['titles', 'retail', 'papers', 'matrices'],
+                        help='datasets to generate (default: all)')
+    parser.add_argument('--out-dir', default=data_dir, help='folder of the generated files')
+    options = parser.parse_args()
+
+    for scale in options.scales:
+        generate(scale, options.out_dir, options.datasets)
+        for dataset, paths in dataset_paths(scale, options.out_dir).items():
+            for path in paths:
+                if os.path.exists(path):
+                    print("%-9s %4dx %s (%d bytes)" % (dataset, scale, path, os.path.getsize(path)))
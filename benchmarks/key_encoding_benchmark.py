@@ -0,0 +1,115 @@
+'''
+Petio Todorov
+Wael Fato
+
+key_encoding_benchmark.py
+
+Measures the dictionary encoding of the shuffle keys (common/keys.py) for the jobs of Task1, Task2, Task4 and Task5.
+Every job is run in-process (common/simulate.py) on the same input lines:
+1. once with --build-key-dictionary, to build the dictionary of the input (not measured)
+2. once with the plain string keys
+3. once with --key-dictionary, i.e. with the keys shuffled as integer ids
+and this is repeated for both internal protocols (json and binary). For every boundary (combiner input, shuffle,
+input of the next step) we report the number of records, the bytes, the CPU time spent encoding and decoding them
+and the CPU time of the combiners or reducers that read them.
+
+The last column compares the final output with the one of the plain keys: "yes" if it is the same, "ties" if only
+the order of equal counts differs (the records reach the final reducer sorted by their encoded keys, so a top 15
+or top 50 that ends in the middle of equal counts can pick other words with that count), "NO" otherwise.
+
+To RUN (from the root of the repository; jobs without an input file are skipped):
+$ python benchmarks/key_encoding_benchmark.py --task1 title.basics.tsv --task2 title.basics.tsv \
+    --task4 retail1011.csv --task5 mod-arxivData.jl --max-lines 100000
+
+Output-
+1. A table with one line per (task, boundary, protocol, keys)
+'''
+
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.tasks import load_job_class
+from common.simulate import simulate_job
+from common.keys import write_dictionary
+from protocol_benchmark import read_lines, same_output, protocols
+
+tasks = ['Task1', 'Task2', 'Task4', 'Task5']
+
+
+def numbers(value):
+    '''
+    :return: the sorted numbers in a value (a pair of the output, or a list of pairs)
+    '''
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return []
+    if isinstance(value, (int, float)):
+        return [value]
+    return sorted(number for item in value for number in numbers(item))
+
+
+def compare_outputs(plain_output, encoded_output):
+    if same_output(plain_output, encoded_output):
+        return 'yes'
+    if numbers([list(pair) for pair in plain_output]) == numbers([list(pair) for pair in encoded_output]):
+        return 'ties'
+    return 'NO'
+
+
+def build_dictionary(job_class, lines, protocol, path):
+    '''
+    Runs the job with --build-key-dictionary and writes the dictionary of the keys it counted.
+
+    :return: the number of keys of the dictionary
+    '''
+    job = job_class(args=['--internal-protocol', protocol, '--build-key-dictionary', path])
+    simulate_job(job, lines)
+    # simulate_job calls the reducers directly, so the counts are still in the job instead of in part files
+    return write_dictionary(job.key_counts, path)
+
+
+def benchmark_task(task, paths, max_lines, dictionary_dir):
+    '''
+    :return: rows of the result table
+    '''
+    job_class = load_job_class(task)
+    lines = read_lines(paths, max_lines)
+    dictionary_path = os.path.join(dictionary_dir, task + '.keys')
+    rows = []
+
+    for protocol in protocols:
+        n_keys = build_dictionary(job_class, lines, protocol, dictionary_path)
+        first_row = len(rows)
+        outputs = {}
+        for keys, extra_args in [('plain', []), ('dictionary', ['--key-dictionary', dictionary_path])]:
+            job = job_class(args=['--internal-protocol', protocol] + extra_args)
+            outputs[keys], stats = simulate_job(job, lines)
+            for boundary in stats:
+                rows.append([task, boundary.name, protocol, keys, boundary.records, boundary.bytes,
+                             boundary.encode_seconds, boundary.decode_seconds, boundary.process_seconds])
+        same = compare_outputs(outputs['plain'], outputs['dictionary'])
+        sys.stderr.write("%s %s: dictionary with %d keys\n" % (task, protocol, n_keys))
+        for row in rows[first_row:]:
+            row.append(same)
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='shuffle with plain string keys vs dictionary encoded keys')
+    for task in tasks:
+        parser.add_argument('--' + task.lower(), nargs='+', help='input file(s) of ' + task)
+    parser.add_argument('--max-lines', type=int, default=100000, help='lines read from every input file')
+    options = parser.parse_args()
+
+    print("%-6s %-22s %-7s %-11s %10s %12s %9s %9s %10s %5s"
+          % ('task', 'boundary', 'proto', 'keys', 'records', 'bytes', 'encode s', 'decode s', 'reduce s', 'same'))
+    with tempfile.TemporaryDirectory(prefix='key-dictionaries-') as dictionary_dir:
+        for task in tasks:
+            paths = getattr(options, task.lower())
+            if not paths:
+                continue
+            for row in benchmark_task(task, paths, options.max_lines, dictionary_dir):
+                print("%-6s %-22s %-7s %-11s %10d %12d %9.3f %9.3f %10.3f %5s" % tuple(row))
@@ -0,0 +1,112 @@
+'''
+Petio Todorov
+Wael Fato
+
+protocol_benchmark.py
+
+Compares the JSON internal protocol of mrjob with BinaryProtocol (common/protocols.py) for the jobs of Task1 to
+Task6. Every job is run in-process (common/simulate.py) once with --internal-protocol=json and once with
+--internal-protocol=binary on the same input lines. For every boundary (combiner input, shuffle, input of the next
+step) we report the number of records, the bytes and the CPU time spent encoding and decoding. The final outputs of
+both runs are compared as well, since the protocol must not change the results (the order of the output and the
+last bits of sums of floats can differ, since the records are sorted by their encoded keys).
+
+To RUN (from the root of the repository; jobs without an input file are skipped):
+$ python benchmarks/protocol_benchmark.py --task1 title.basics.tsv --task2 title.basics.tsv \
+    --task3 retail1011.csv --task4 retail1011.csv --task5 mod-arxivData.jl --max-lines 100000
+Task6 uses Task6-Final/A_tuples.txt and B_tuples.txt by default.
+
+Output-
+1. A table with one line per (task, boundary, protocol)
+'''
+
+import os
+import sys
+import json
+import math
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.tasks import TASKS, root_dir, load_job_class
+from common.simulate import simulate_job
+
+protocols = ['json', 'binary']
+
+
+def read_lines(paths, max_lines):
+    '''
+    :return: up to max_lines lines of every file, without the trailing newline
+    '''
+    lines = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            lines += [line.rstrip(b'\r\n') for line in itertools.islice(file, max_lines)]
+    return lines
+
+
+def same_values(a, b):
+    '''
+    :return: whether two decoded values are equal, allowing for rounding differences of floats
+    '''
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(same_values(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def same_output(output1, output2):
+    '''
+    :return: whether two job outputs contain the same pairs (in any order)
+    '''
+    output1 = sorted(output1, key=lambda pair: json.dumps(pair[0]))
+    output2 = sorted(output2, key=lambda pair: json.dumps(pair[0]))
+    return len(output1) == len(output2) and all(same_values(list(x), list(y)) for x, y in zip(output1, output2))
+
+
+def benchmark_task(task, paths, max_lines, extra_args):
+    '''
+    :return: (rows of the result table, whether both protocols gave the same output)
+    '''
+    job_class = load_job_class(task)
+    lines = read_lines(paths, max_lines)
+    rows, outputs = [], []
+
+    for protocol in protocols:
+        job = job_class(args=['--internal-protocol', protocol] + extra_args)
+        output, stats = simulate_job(job, lines)
+        outputs.append(output)
+        for boundary in stats:
+            rows.append((task, boundary.name, protocol, boundary.records, boundary.bytes,
+                         boundary.encode_seconds, boundary.decode_seconds))
+
+    return rows, same_output(outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JSON vs binary internal protocol')
+    for task in TASKS:
+        parser.add_argument('--' + task.lower(), nargs='+', help='input file(s) of ' + task)
+    parser.add_argument('--max-lines', type=int, default=100000, help='lines read from every input file')
+    parser.add_argument('--task6-max-lines', type=int, default=2000,
+                        help='lines read from every Task6 file (every tuple is replicated 1000-2000 times)')
+    # the first lines of the tuple files are not complete matrices, so the one-phase mode cannot be used
+    parser.add_argument('--task6-mode', default='sparse', help='--mode of the Task6 job')
+    options = parser.parse_args()
+
+    if options.task6 is None:
+        options.task6 = [os.path.join(root_dir, 'Task6-Final', 'A_tuples.txt'),
+                         os.path.join(root_dir, 'Task6-Final', 'B_tuples.txt')]
+
+    print("%-6s %-26s %-7s %10s %12s %10s %10s %8s"
+          % ('task', 'boundary', 'proto', 'records', 'bytes', 'encode s', 'decode s', 'same'))
+    for task in TASKS:
+        paths = getattr(options, task.lower())
+        if not paths:
+            continue
+        max_lines = options.task6_max_lines if task == 'Task6' else options.max_lines
+        extra_args = ['--mode', options.task6_mode] if task == 'Task6' else []
+        rows, same = benchmark_task(task, paths, max_lines, extra_args)
+        for row in rows:
+            print("%-6s %-26s %-7s %10d %12d %10.3f %10.3f %8s" % (row + (same,)))
@@ -0,0 +1,170 @@
+'''
+Petio Todorov
+Wael Fato
+
+run_benchmarks.py
+
+Runs the job of every task with every runner on the synthetic input files of generate_data.py and appends one line
+per run to a CSV file, so that runs of different versions of the code (the git commit is recorded) or on different
+machines can be compared:
+- input_rows and seconds: lines of the input files and wall time of the job; rows_per_sec = input_rows / seconds
+- peak_rss_mb: the peak resident memory of the process that ran the job and of its child processes (the tasks of
+  the local runner)
+- shuffle_bytes: the size of the sorted reducer input of all steps, i.e. the bytes that went through the shuffle
+- output_records: the number of output lines of the job
+
+Every run happens in its own python process (this script called with --worker), so that the peak memory of one run
+is not mixed with the previous ones. Missing input files are generated first. A run that fails (e.g. because the
+NLTK stop words are not downloaded) is recorded with its error instead of the numbers.
+
+To RUN (from the root of the repository):
+$ python benchmarks/run_benchmarks.py --scales 1 10 --runners inline local --tasks Task3 Task4
+Output-
+1. benchmarks/results.csv (one line per task, runner and scale)
+'''
+
+import os
+import sys
+import csv
+import json
+import math
+import time
+import resource
+import argparse
+import datetime
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.tasks import TASKS, root_dir, load_job_class
+import generate_data
+
+results_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.csv')
+runners = ['inline', 'local']
+
+# the synthetic dataset of every task (see generate_data.dataset_paths)
+task_datasets = {'Task1': 'titles', 'Task2': 'titles', 'Task3': 'retail', 'Task4': 'retail', 'Task5': 'papers',
+                 'Task6': 'matrices'}
+
+columns = ['date', 'commit', 'task', 'runner', 'scale', 'input_rows', 'seconds', 'rows_per_sec', 'peak_rss_mb',
+           'shuffle_bytes', 'output_records', 'status']
+
+
+def count_lines(paths):
+    total = 0
+    for path in paths:
+        with open(path, 'rb') as file:
+            total += sum(chunk.count(b'\n') for chunk in iter(lambda: file.read(1 << 20), b''))
+    return total
+
+
+def task_args(task, paths):
+    '''
+    :return: the extra command line arguments of the job of a task
+    '''
+    if task == 'Task6':
+        # the generated matrices are dense and square; the block mode is the fastest MapReduce mode for them
+        side = math.isqrt(count_lines(paths[:1]))
+        return ['--mode', 'block', '--m-rows', str(side), '--n-cols', str(side)]
+    return []
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=root_dir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_job(task, runner, paths, extra_args):
+    '''
+    Runs one job in the current process (called by the worker process).
+
+    :return: a dictionary with seconds, peak_rss_mb, shuffle_bytes and output_records
+    '''
+    job_class = load_job_class(task)
+    job = job_class(args=['-r', runner] + extra_args + paths)
+
+    start = time.perf_counter()
+    with job.make_runner() as job_runner:
+        job_runner.run()
+        output_records = sum(chunk.count(b'\n') for chunk in job_runner.cat_output())
+        seconds = time.perf_counter() - start
+        # the intermediate files of the runner are deleted when it is closed, so they are measured here
+        shuffle_bytes = 0
+        for step_num in range(len(job.steps())):
+            sorted_input = job_runner._sorted_reducer_input_path(step_num)
+            if os.path.exists(sorted_input):
+                shuffle_bytes += os.path.getsize(sorted_input)
+
+    # ru_maxrss is in kilobytes on Linux; RUSAGE_CHILDREN covers the task processes of the local runner
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {'seconds': seconds, 'peak_rss_mb': peak_kb / 1024.0, 'shuffle_bytes': shuffle_bytes,
+            'output_records': output_records}
+
+
+def benchmark(task, runner, scale, data_dir):
+    '''
+    Runs one job in a new worker process.
+
+    :return: one row of the results file (a dictionary)
+    '''
+    paths = generate_data.dataset_paths(scale, data_dir)[task_datasets[task]]
+    if not all(os.path.exists(path) for path in paths):
+        generate_data.generate(scale, data_dir, [task_datasets[task]])
+
+    row = {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(), 'task': task,
+           'runner': runner, 'scale': scale, 'input_rows': count_lines(paths)}
+    command = [sys.executable, os.path.abspath(__file__), '--worker', task, runner, json.dumps(task_args(task, paths))]
+    worker = subprocess.run(command + paths, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if worker.returncode != 0:
+        # the exception is the last line of the traceback that names an error (NLTK adds a banner of stars)
+        errors = [line.strip() for line in worker.stderr.decode('utf_8', 'replace').splitlines() if 'Error' in line]
+        row['status'] = 'failed: ' + (errors[-1] if errors else 'exit code %d' % worker.returncode)
+        return row
+
+    row.update(json.loads(worker.stdout.decode().strip().splitlines()[-1]))
+    row['rows_per_sec'] = row['input_rows'] / row['seconds'] if row['seconds'] else 0.0
+    row['status'] = 'ok'
+    return row
+
+
+def append_results(rows, path):
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        if new_file:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        task, runner, extra_args = sys.argv[2], sys.argv[3], json.loads(sys.argv[4])
+        print(json.dumps(run_job(task, runner, sys.argv[5:], extra_args)))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description='throughput, memory and shuffle size of every job')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1], help='scales of the input files, e.g. 1 10')
+    parser.add_argument('--tasks', nargs='+', choices=list(TASKS), default=list(TASKS), help='tasks to run')
+    parser.add_argument('--runners', nargs='+', choices=runners, default=runners, help='mrjob runners to use')
+    parser.add_argument('--data-dir', default=generate_data.data_dir, help='folder of the generated input files')
+    parser.add_argument('--results', default=results_path, help='CSV file the results are appended to')
+    options = parser.parse_args()
+
+    print("%-6s %-7s %5s %10s %9s %12s %9s %13s  %s"
+          % ('task', 'runner', 'scale', 'rows', 'seconds', 'rows/sec', 'rss MB', 'shuffle bytes', 'status'))
+    for scale in options.scales:
+        for task in options.tasks:
+            for runner in options.runners:
+                row = benchmark(task, runner, scale, options.data_dir)
+                append_results([row], options.results)
+                if row['status'] == 'ok':
+                    print("%-6s %-7s %5d %10d %9.2f %12.0f %9.1f %13d  ok"
+                          % (task, runner, scale, row['input_rows'], row['seconds'], row['rows_per_sec'],
+                             row['peak_rss_mb'], row['shuffle_bytes']))
+                else:
+                    print("%-6s %-7s %5d %10d %9s %12s %9s %13s  %s"
+                          % (task, runner, scale, row['input_rows'], '', '', '', '', row['status']))
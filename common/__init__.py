@@ -0,0 +1,10 @@
+'''
+Petio Todorov
+Wael Fato
+
+common
+
+Helpers shared by the jobs of all tasks. Every job script adds the root of the repository to sys.path so that
+this package can be imported when the job is launched, and lists it in DIRS so that mrjob copies it into the
+working directory of every task.
+'''
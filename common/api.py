@@ -0,0 +1,141 @@
+'''
+Petio Todorov
+Wael Fato
+
+api.py
+
+Runs the jobs from Python instead of the command line. The job is run with mrjob's make_runner() and its output is
+decoded with the job's output protocol, so the results arrive as Python values instead of text lines that have to be
+parsed again (e.g. with ast.literal_eval). The results are yielded one by one while the output is read, so jobs
+can be chained in one process without writing their results to a text file.
+
+- run_job(job_class, input_paths, args, runner): the decoded (key, value) pairs of any job class
+- run_task(task, input_paths, args, runner): the results of one of the tasks (see common/tasks.py) as named tuples,
+  e.g. KeywordCount(word='love', count=14592) for Task1 or MatrixElement(i=0, k=1, value=9.87) for Task6
+- to_matrix(elements, shape): a numpy array from the MatrixElements of Task6
+
+Example:
+    import sys
+    sys.path.insert(0, '<root of the repository>')
+    from common.api import run_task, to_matrix
+
+    for buyer in run_task('Task3', ['retail1011.csv']):
+        print(buyer.customer_id, buyer.revenue)
+
+    C = to_matrix(run_task('Task6', ['A.mtx', 'B.mtx'], args=['--mode', 'block']), shape=(1000, 2000))
+
+The generators keep the runner (and its temporary files) open until they are exhausted or closed.
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+from common.tasks import load_job_class
+
+KeywordCount = namedtuple('KeywordCount', ['word', 'count'])
+GenreKeywordCount = namedtuple('GenreKeywordCount', ['genre', 'word', 'count'])
+# with --sample-rate (see common/sampling.py) the results of Task3 have an estimated rank, its 95% interval and an
+# ambiguity flag, and the last result of Task3 and Task4 is an EstimatedTotals
+BuyerRevenue = namedtuple('BuyerRevenue', ['customer_id', 'revenue', 'estimated_rank', 'rank_ci', 'ambiguous'],
+                          defaults=(None, None, None))
+BestSellingProduct = namedtuple('BestSellingProduct', ['measure', 'stock_code', 'total'])
+EstimatedTotals = namedtuple('EstimatedTotals', ['sample_rate', 'totals'])
+SimilarPaper = namedtuple('SimilarPaper', ['paper_id', 'similarity'])
+MatrixElement = namedtuple('MatrixElement', ['i', 'k', 'value'])
+
+def _task1_result(key, value):
+    return KeywordCount(value, key)
+
+
+def _task2_result(key, value):
+    return GenreKeywordCount(key[0], key[1], value)
+
+
+def _estimated_totals(value):
+    totals = dict(value)
+    return EstimatedTotals(totals.pop('sample_rate'), totals)
+
+
+def _rank_fields(value):
+    '''
+    :return: (estimated rank, its interval, ambiguous) of a result with --sample-rate, otherwise (None, None, None)
+    '''
+    if 'rank_ci' not in value:
+        return None, None, None
+    return value['estimated_rank'], tuple(value['rank_ci']), value['ambiguous']
+
+
+def _task3_result(key, value):
+    # the last line with --sample-rate has the estimated totals
+    if 'sample_rate' in value:
+        return _estimated_totals(value)
+    return BuyerRevenue(value['customer_id'], value['total_revenues'], *_rank_fields(value))
+
+
+def _task4_result(key, value):
+    if 'sample_rate' in value:
+        return _estimated_totals(value)
+    if 'total_quantity' in value:
+        return BestSellingProduct('quantity', value['stock_code'], value['total_quantity'])
+    return BestSellingProduct('revenue', value['stock_code'], value['total_revenues'])
+
+
+def _task5_result(key, value):
+    return SimilarPaper(value, key)
+
+
+def _task6_result(key, value):
+    return MatrixElement(key[0], key[1], value)
+
+
+# task name -> function that turns one output pair into a named tuple
+result_types = {
+    'Task1': _task1_result,
+    'Task2': _task2_result,
+    'Task3': _task3_result,
+    'Task4': _task4_result,
+    'Task5': _task5_result,
+    'Task6': _task6_result,
+}
+
+
+def run_job(job_class, input_paths, args=(), runner='inline'):
+    '''
+    Runs a job and yields its output.
+
+    :param job_class: an MRJob subclass
+    :param input_paths: the input files of the job
+    :param args: other command line arguments of the job (e.g. ['--mode', 'block'])
+    :param runner: the mrjob runner ('inline', 'local', ...)
+    :return: a generator of the (key, value) pairs of the output, decoded with the job's output protocol
+    '''
+    job = job_class(args=['-r', runner] + list(args) + list(input_paths))
+    with job.make_runner() as job_runner:
+        job_runner.run()
+        for key, value in job.parse_output(job_runner.cat_output()):
+            yield key, value
+
+
+def run_task(task, input_paths, args=(), runner='inline'):
+    '''
+    Runs the job of a task and yields its results as named tuples.
+
+    :param task: a task name of common/tasks.py, e.g. 'Task3'
+    :return: a generator of named tuples (see result_types)
+    '''
+    to_result = result_types[task]
+    for key, value in run_job(load_job_class(task), input_paths, args, runner):
+        yield to_result(key, value)
+
+
+def to_matrix(elements, shape):
+    '''
+    :param elements: MatrixElements (e.g. the results of Task6); missing elements are 0
+    :param shape: the shape of the matrix
+    :return: a numpy array
+    '''
+    matrix = np.zeros(shape)
+    for element in elements:
+        matrix[element.i, element.k] = element.value
+    return matrix
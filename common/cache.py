@@ -0,0 +1,369 @@
+'''
+Petio Todorov
+Wael Fato
+
+cache.py
+
+A content-addressed cache of job results, so that running a job again on the same input with the same parameters
+returns the earlier output at once instead of running all steps again.
+
+The key of a result is a hash of:
+- the content of the input files (a SHA-1 per file; the hashes are kept in fingerprints.json by path, size and
+  modification time, so unchanged files are not read again),
+- the job class,
+- the code of the steps: the source of every mapper, combiner and reducer function (and their init/final
+  functions), of the functions and methods they call and the values of the module level variables they use (e.g.
+  stop_words, text_to_match, WORD_RE). So a change of e.g. the number of results in the last reducer only changes
+  the key of the last step,
+- the source of the shared helpers in common/ (e.g. the mixins that read the input and encode the records) and of the
+  helper modules that the job ships with FILES (e.g. matrix_format.py of Task6); a change there changes every key,
+- the command line options of the job (e.g. --mode and --block-size of Task6), except options that do not change
+  the output (profiling, cache and engine options).
+
+With --cache the final output of a run is stored in --cache-dir. With --cache-steps the output of every step
+except the last one is stored as well, under a key that only contains the code of the steps up to that step; a
+later run whose final result is not in the cache then starts after the last step that is (e.g. a change of the
+final sort of Task1 or Task2 reuses the word counts of the first steps).
+
+Every entry is a folder named after its key. When the cache gets larger than --cache-max-bytes, the entries that
+were used least recently are removed.
+
+A job opts in by inheriting from ResultCacheMixin. The key uses the original input files, also when other mixins
+replace them (see launcher.py), e.g.
+class MyJob(CompressedInputMixin, ProfilingMixin, ResultCacheMixin, BinaryProtocolMixin, MRJob).
+'''
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import codecs
+import shutil
+import hashlib
+import inspect
+import tempfile
+
+from mrjob.step import StepFailedException
+
+common_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(common_dir)
+default_cache_dir = os.path.join(root_dir, 'job-cache')
+default_max_bytes = 2 * 1024 ** 3
+
+# options that do not change the output of a job
+ignored_options = {'cache', 'cache_dir', 'cache_max_bytes', 'cache_steps', 'cache_first_step', 'profile',
+                   'profile_dir', 'profile_interval', 'engine', 'local_max_bytes', 'threads'}
+# the functions of a step whose code is part of the key
+step_functions = ['mapper_init', 'mapper', 'mapper_final', 'mapper_raw', 'combiner_init', 'combiner',
+                  'combiner_final', 'reducer_init', 'reducer', 'reducer_final']
+# module level values that are part of the code version of the functions that use them
+plain_types = (str, bytes, int, float, bool, type(None), list, tuple, set, frozenset, dict)
+
+
+def _hash(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf_8')).hexdigest()
+
+
+def _value_version(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(repr(item) for item in value)
+    if isinstance(value, re.Pattern):
+        return [value.pattern, value.flags]
+    return repr(value)
+
+
+def code_version(function, cls, seen=None):
+    '''
+    :param function: a function or (bound) method
+    :param cls: the job class, to follow calls of other methods (self.something)
+    :return: a hash of the source of the function, of the functions and methods it uses and of the module level
+             values it uses
+    '''
+    seen = set() if seen is None else seen
+    function = getattr(function, '__func__', function)
+    code = getattr(function, '__code__', None)
+    if code is None or code in seen:
+        return ''
+    seen.add(code)
+
+    try:
+        parts = [inspect.getsource(function)]
+    except (OSError, TypeError):
+        parts = [code.co_code.hex()]
+
+    # the names used by the function and by the functions defined inside of it (e.g. lambdas, generators)
+    names, codes = set(), [code]
+    while codes:
+        current = codes.pop()
+        names.update(current.co_names)
+        codes.extend(const for const in current.co_consts if inspect.iscode(const))
+
+    module_globals = getattr(function, '__globals__', {})
+    for name in sorted(names):
+        value = module_globals.get(name, getattr(cls, name, None))
+        if inspect.isfunction(value) or inspect.ismethod(value):
+            if getattr(value, '__module__', None) in (function.__module__, cls.__module__):
+                parts.append(code_version(value, cls, seen))
+        elif isinstance(value, plain_types + (re.Pattern,)) and name in module_globals:
+            parts.append('%s=%s' % (name, _value_version(value)))
+    return _hash(parts)
+
+
+def source_version(paths):
+    '''
+    :return: a hash of the names and the content of the source files
+    '''
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode('utf_8') + b'\0')
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def helper_sources(cls):
+    '''
+    :return: the .py files of common/ and the .py files in FILES of the job class
+    '''
+    paths = glob.glob(os.path.join(common_dir, '*.py'))
+    job_dir = os.path.dirname(os.path.abspath(inspect.getfile(cls)))
+    paths += [os.path.join(job_dir, name) for name in getattr(cls, 'FILES', []) if name.endswith('.py')]
+    return paths
+
+
+class FingerprintCache(object):
+    '''
+    SHA-1 of the content of files, remembered by path, size and modification time.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def fingerprint(self, path):
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            # mrjob reads every file of an input directory
+            return [self.fingerprint(os.path.join(folder, name))
+                    for folder, _, names in sorted(os.walk(path)) for name in sorted(names)]
+
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            sha1 = hashlib.sha1()
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    sha1.update(chunk)
+            entry = self.entries[path] = [stat.st_size, stat.st_mtime_ns, sha1.hexdigest()]
+        return entry[2]
+
+    def save(self):
+        with open(self.path, 'w') as file:
+            json.dump(self.entries, file)
+
+
+class ResultCache(object):
+    '''
+    The store: one folder per key with the cached files and meta.json, whose modification time is the time of the
+    last use.
+    '''
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        '''
+        :return: the sorted paths of the files of an entry (and marks it as used), or None
+        '''
+        entry_dir = self.entry_dir(key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        os.utime(meta_path)
+        return sorted(os.path.join(entry_dir, name) for name in os.listdir(entry_dir) if name != 'meta.json')
+
+    def put(self, key, paths, meta):
+        '''
+        Copies the files into a new entry; meta.json is written last, so an entry is only used once it is complete.
+        '''
+        entry_dir = self.entry_dir(key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.makedirs(entry_dir)
+        for n, path in enumerate(paths):
+            shutil.copyfile(path, os.path.join(entry_dir, 'part-%05d' % n))
+        with open(os.path.join(entry_dir, 'meta.json'), 'w') as file:
+            json.dump(dict(meta, created=time.time()), file)
+        self.evict()
+
+    def evict(self):
+        '''
+        Removes the least recently used entries until the cache is not larger than max_bytes.
+        '''
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.entry_dir(key), 'meta.json')
+            if not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(self.entry_dir(key), name))
+                       for name in os.listdir(self.entry_dir(key)))
+            entries.append((os.path.getmtime(meta_path), size, key))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            total -= size
+
+
+class ResultCacheMixin(object):
+    '''
+    Adds the options --cache, --cache-dir, --cache-max-bytes and --cache-steps to a job (see the top of this file).
+
+    Usage: class MyJob(ResultCacheMixin, MRJob)
+    '''
+
+    def __init__(self, args=None):
+        super(ResultCacheMixin, self).__init__(args)
+        # the input files of the user; LauncherMixin keeps them before other mixins replace them (see launcher.py)
+        if not hasattr(self, 'original_input_paths'):
+            self.original_input_paths = list(self.options.args)
+        # a run that continues from a cached step only runs the steps after it
+        if self.options.cache_first_step:
+            self.steps = lambda: type(self).steps(self)[self.options.cache_first_step:]
+
+    def configure_args(self):
+        super(ResultCacheMixin, self).configure_args()
+        self.add_passthru_arg('--cache', action='store_true', default=False,
+                              help='return the cached result of an identical earlier run, or cache this one')
+        self.add_passthru_arg('--cache-dir', default=default_cache_dir, help='folder of the result cache')
+        self.add_passthru_arg('--cache-max-bytes', type=int, default=default_max_bytes,
+                              help='size of the cache above which the least recently used results are removed')
+        self.add_passthru_arg('--cache-steps', action='store_true', default=False,
+                              help='cache the output of every step and continue from the last cached step')
+        self.add_passthru_arg('--cache-first-step', type=int, default=0, help='(internal) first step to run')
+
+    def input_protocol(self):
+        # the input of a run that continues from a cached step is the output of that step
+        if self.options.cache_first_step:
+            return self.internal_protocol()
+        return super(ResultCacheMixin, self).input_protocol()
+
+    def step_keys(self, fingerprints):
+        '''
+        :return: the cache key of the output of every step; the last one is the key of the final output
+        '''
+        options = {}
+        for dest in sorted(self._passthru_arg_dests | self._file_arg_dests):
+            if dest in ignored_options or dest == 'internal_protocol':
+                continue
+            value = getattr(self.options, dest, None)
+            if dest in self._file_arg_dests and value:
+                value = fingerprints.fingerprint(value)
+            options[dest] = value
+
+        cls = type(self)
+        base = {'job': '%s.%s' % (cls.__module__, cls.__name__),
+                'helpers': source_version(helper_sources(cls)),
+                'inputs': [fingerprints.fingerprint(path) for path in self.original_input_paths],
+                'options': options}
+        steps = [[code_version(step[name], cls) if step[name] is not None else None for name in step_functions]
+                 for step in type(self).steps(self)]
+
+        keys = []
+        for step_num in range(len(steps)):
+            key = dict(base, steps=steps[:step_num + 1])
+            if step_num < len(steps) - 1:
+                # intermediate outputs are written with the internal protocol
+                key['internal_protocol'] = getattr(self.options, 'internal_protocol', 'json')
+            keys.append(_hash(key))
+        return keys
+
+    def run_job(self):
+        if not self.options.cache or '-' in self.original_input_paths or not self.original_input_paths:
+            return super(ResultCacheMixin, self).run_job()
+
+        self.set_up_logging(quiet=self.options.quiet, verbose=self.options.verbose,
+                            stream=codecs.getwriter('utf_8')(self.stderr))
+        cache = ResultCache(self.options.cache_dir, self.options.cache_max_bytes)
+        fingerprints = FingerprintCache(os.path.join(self.options.cache_dir, 'fingerprints.json'))
+        keys = self.step_keys(fingerprints)
+        fingerprints.save()
+
+        cached = cache.get(keys[-1])
+        if cached is not None:
+            sys.stderr.write("result cache hit: %s\n" % keys[-1])
+            self._write_output(cached)
+            return
+
+        # continue after the last step whose output is cached
+        first_step, input_paths = 0, self.options.args
+        if self.options.cache_steps:
+            for step_num in reversed(range(len(keys) - 1)):
+                cached = cache.get(keys[step_num])
+                if cached is not None:
+                    sys.stderr.write("result cache: reusing the output of step %d\n" % step_num)
+                    first_step, input_paths = step_num + 1, cached
+                    break
+
+        step_output_dir = tempfile.mkdtemp(prefix='job-cache-steps-')
+        args = [arg for arg in self._cl_args if arg not in self.options.args]
+        args += ['--cache-first-step', str(first_step), '--step-output-dir', step_output_dir] + input_paths
+        job = type(self)(args=args)
+        # the arguments are rewritten already, so the new job does not know the files and lists they refer to
+        job.shipped_files, job.input_lists = getattr(self, 'shipped_files', []), getattr(self, 'input_lists', [])
+
+        try:
+            with job.make_runner() as runner:
+                try:
+                    runner.run()
+                except StepFailedException as e:
+                    sys.stderr.write("%s\n" % e)
+                    sys.exit(1)
+
+                output_dir = tempfile.mkdtemp(prefix='job-cache-output-')
+                output_path = os.path.join(output_dir, 'part-00000')
+                with open(output_path, 'wb') as output:
+                    for chunk in runner.cat_output():
+                        output.write(chunk)
+
+                if self.options.cache_steps:
+                    # the steps of the run are numbered from first_step on
+                    for step_num in range(first_step, len(keys) - 1):
+                        step_dir = os.path.join(step_output_dir, '%04d' % (step_num - first_step))
+                        parts = sorted(os.path.join(step_dir, name) for name in os.listdir(step_dir)
+                                       if name.startswith('part-'))
+                        cache.put(keys[step_num], parts, {'job': type(self).__name__, 'step': step_num})
+                cache.put(keys[-1], [output_path], {'job': type(self).__name__, 'step': len(keys) - 1})
+        finally:
+            shutil.rmtree(step_output_dir, ignore_errors=True)
+
+        # with --output-dir the runner has written the output already
+        if not self.options.output_dir:
+            self._write_output([output_path])
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    def _write_output(self, paths):
+        '''
+        Writes the cached output to stdout, or to --output-dir if it is given.
+        '''
+        if self.options.output_dir:
+            os.makedirs(self.options.output_dir, exist_ok=True)
+            for path in paths:
+                shutil.copyfile(path, os.path.join(self.options.output_dir, os.path.basename(path)))
+            return
+        for path in paths:
+            with open(path, 'rb') as file:
+                shutil.copyfileobj(file, self.stdout)
+        self.stdout.flush()
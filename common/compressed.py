@@ -0,0 +1,232 @@
+'''
+Petio Todorov
+Wael Fato
+
+compressed.py
+
+Compressed input files for the jobs (.gz, .bz2 and .zst), e.g. title.basics.tsv.gz as IMDB distributes it.
+
+mrjob decompresses .gz and .bz2 input itself, but a compressed file always goes to ONE mapper (a gzip stream can only
+be read from its beginning), it only reads the first member of a gzip file with several members and it cannot read
+.zst files at all. So the jobs that inherit from CompressedInputMixin handle compressed input themselves:
+- In the process that launches the job (see common/launcher.py), every compressed input file is replaced by a small
+  list of "block descriptors" (like the chunk list of the .mtx files in Task6.py). A descriptor is one line with the
+  marker block_marker, the path of the file and the number of a block (or whole_file). The inline and local runners
+  use the absolute path; for the other runners (hadoop, emr, ...) the file and its index are uploaded with the job
+  and the path is their name in the working directory of the task. If the input of the job is only compressed files,
+  every block gets its own mapper on Hadoop (see common/launcher.py).
+- The mappers of the first step replace every descriptor by the decompressed lines of that block (see
+  _read_input below), so the mapper functions of the jobs see the same lines as for uncompressed input.
+
+Block-compressed files are splittable: the file is a series of independent compressed blocks (gzip members or zstd
+frames, like bgzip), every block ends at the end of a line, and an index file next to it (<file>.idx) lists the
+offset and length of every block. Such a file is still a valid .gz / .zst file for any other tool, and with the
+index every block becomes its own descriptor, so the blocks are spread over the mappers and decompressed in
+parallel. Files without an index are read as a whole by one mapper.
+
+Existing files (plain or compressed) are recompressed into the splittable format with:
+$ python common/compressed.py title.basics.tsv title.basics.tsv.gz --block-size 4194304
+$ python common/compressed.py retail1011.csv.bz2 retail1011.csv.zst
+.zst files need the zstandard package (pip install zstandard).
+
+A job opts in by inheriting from CompressedInputMixin, e.g.
+class MyJob(CompressedInputMixin, ProfilingMixin, BinaryProtocolMixin, MRJob).
+'''
+
+import io
+import os
+import sys
+import bz2
+import gzip
+import zlib
+import argparse
+
+# the root of the repository, for when this file is run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.launcher import LauncherMixin, replace_inputs
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+codecs = ['.gz', '.bz2', '.zst']
+index_extension = '.idx'
+default_block_size = 4 * 1024 * 1024  # uncompressed bytes per block
+
+# start of a descriptor line; a NUL byte does not occur in the text input of the jobs
+block_marker = b'\0compressed-block'
+whole_file = -1
+
+
+def codec_of(path):
+    '''
+    :return: the compression extension of a path ('.gz', '.bz2' or '.zst'), or None for an uncompressed file
+    '''
+    extension = os.path.splitext(path)[1]
+    return extension if extension in codecs else None
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError('.zst files need the zstandard package (pip install zstandard)')
+
+
+def open_compressed(path):
+    '''
+    Opens a (possibly compressed) file for reading; all members of a gzip file and all frames of a zstd file are
+    read.
+
+    :return: a binary file object of the decompressed data
+    '''
+    codec = codec_of(path)
+    if codec == '.gz':
+        return gzip.open(path, 'rb')
+    if codec == '.bz2':
+        return bz2.open(path, 'rb')
+    if codec == '.zst':
+        _require_zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, 'rb')
+
+
+def compress_block(data, codec):
+    if codec == '.gz':
+        return gzip.compress(data)
+    if codec == '.bz2':
+        return bz2.compress(data)
+    _require_zstandard()
+    return zstandard.ZstdCompressor().compress(data)  # the frame stores its decompressed size
+
+
+def decompress_block(data, codec):
+    if codec == '.gz':
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    if codec == '.bz2':
+        return bz2.decompress(data)
+    _require_zstandard()
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def read_index(path):
+    '''
+    :return: the list of (offset, length) of the blocks of a block-compressed file, or None if it has no index
+    '''
+    index_path = path + index_extension
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r') as file:
+        return [tuple(int(number) for number in line.split()) for line in file if line.strip()]
+
+
+def read_block(path, block):
+    '''
+    :param block: the number of a block of the index, or whole_file
+    :return: a generator of the decompressed lines of one block of a compressed file
+    '''
+    if block == whole_file:
+        with open_compressed(path) as file:
+            for line in file:
+                yield line
+        return
+
+    offset, length = read_index(path)[block]
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        data = decompress_block(file.read(length), codec_of(path))
+    for line in io.BytesIO(data):
+        yield line
+
+
+def recompress(source_path, target_path, block_size=default_block_size):
+    '''
+    Writes the lines of source_path (plain or compressed) to target_path as independent compressed blocks of about
+    block_size uncompressed bytes that end at the end of a line, and writes the index target_path.idx.
+
+    :return: the number of blocks
+    '''
+    codec = codec_of(target_path)
+    if codec is None:
+        raise ValueError('the target file must end with one of %s' % ', '.join(codecs))
+
+    index = []
+    with open_compressed(source_path) as source, open(target_path, 'wb') as target:
+        while True:
+            # readlines stops at the first line that reaches the size hint, so blocks never split a line
+            data = b''.join(source.readlines(block_size))
+            if not data:
+                break
+            compressed = compress_block(data, codec)
+            index.append((target.tell(), len(compressed)))
+            target.write(compressed)
+
+    with open(target_path + index_extension, 'w') as file:
+        for offset, length in index:
+            file.write('%d %d\n' % (offset, length))
+    return len(index)
+
+
+def block_descriptors(paths, names):
+    '''
+    :param paths: compressed files
+    :param names: the paths under which the tasks open the files
+    :return: a generator of the block descriptors of the files, one line per block
+    '''
+    for path, name in zip(paths, names):
+        index = read_index(path)
+        blocks = range(len(index)) if index is not None else [whole_file]
+        for block in blocks:
+            yield b'%s\t%s\t%d' % (block_marker, name.encode('utf_8'), block)
+
+
+class CompressedInputMixin(LauncherMixin):
+    '''
+    Reads .gz, .bz2 and .zst input files in the mappers of the first step, block by block for block-compressed
+    files with an index (see the top of this file).
+
+    Usage: class MyJob(CompressedInputMixin, MRJob)
+    '''
+
+    def rewrite_args(self, args):
+        '''
+        The compressed input files are replaced by the list of their blocks, and shipped to the tasks together with
+        their index (see LauncherMixin.ship_file).
+        '''
+        args = super(CompressedInputMixin, self).rewrite_args(args)
+        compressed_paths = [path for path in self.options.args if codec_of(path) is not None]
+        if not compressed_paths:
+            return args
+        names = []
+        for path in compressed_paths:
+            names.append(self.ship_file(path))
+            if os.path.exists(path + index_extension):
+                self.ship_file(path + index_extension, names[-1] + index_extension)
+        block_list = self.write_input_list('compressed-blocks-', block_descriptors(compressed_paths, names))
+        return replace_inputs(args, compressed_paths, block_list)
+
+    def _read_input(self):
+        lines = super(CompressedInputMixin, self)._read_input()
+        if not (self.options.run_mapper and self.options.step_num == 0):
+            yield from lines
+            return
+
+        for line in lines:
+            if line.startswith(block_marker):
+                _, path, block = line.rstrip(b'\r\n').split(b'\t')
+                yield from read_block(path.decode('utf_8'), int(block))
+            else:
+                yield line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='recompress a file into splittable compressed blocks')
+    parser.add_argument('source', help='plain or compressed (.gz, .bz2, .zst) input file')
+    parser.add_argument('target', help='block-compressed output file (.gz, .bz2 or .zst)')
+    parser.add_argument('--block-size', type=int, default=default_block_size,
+                        help='uncompressed bytes per block')
+    options = parser.parse_args()
+
+    n_blocks = recompress(options.source, options.target, options.block_size)
+    print("%s: %d blocks, index %s" % (options.target, n_blocks, options.target + index_extension))
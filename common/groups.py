@@ -0,0 +1,188 @@
+'''
+Petio Todorov
+Wael Fato
+
+groups.py
+
+Sorting the values of one key group without keeping the whole group in memory.
+
+Some reducers need all values of a key in order, e.g. reducer_ik_items in Task6 (a row of M and a column of N, by
+j). With big inputs a single group does not fit into the memory of a worker, so the values are sorted with an
+external merge sort:
+- the values are collected in a buffer until its (estimated) size reaches the memory budget
+- the full buffer is sorted and written to a temporary file on the local disk (a "run"), and the buffer is emptied
+- at the end the sorted runs (and the last buffer) are merged with heapq.merge, which keeps only one value per run
+  in memory
+A group that fits into the budget never touches the disk. The order is the same as the one of sorted(): both sorts
+are stable and heapq.merge takes equal values from the earlier run first.
+Reducers that only yield the first values of a group (the top 15 words of Task2, the top 10 papers of Task5) do not
+need the full order: heapq.nlargest keeps only those values in memory and reads the group once.
+
+A job opts in by inheriting from MemoryBudgetMixin, e.g.
+class MyJob(MemoryBudgetMixin, BinaryProtocolMixin, MRJob), and sorts a group in a reducer with
+self.sorted_group(values, key=..., reverse=...). The mixin adds the options
+--memory-budget: bytes of values that one reducer keeps in memory before it spills to disk
+--spill-dir: folder of the temporary runs (default: the temporary folder of the system)
+and reports the memory of every reducer task as counters of the group "memory", e.g.
+    step 1 reducer 0 peak RSS (MB)=41
+    step 1 reducer 0 largest group buffer (MB)=256
+    step 1 runs spilled=12
+'''
+
+import sys
+import heapq
+import pickle
+import resource
+import tempfile
+
+from mrjob.compat import jobconf_from_env
+
+default_memory_budget = 256 * 1024 * 1024
+counter_group = 'memory'
+
+
+def record_size(record):
+    '''
+    :return: an estimate of the memory of a record in bytes (the record and the values it contains, one level deep)
+    '''
+    size = sys.getsizeof(record)
+    if isinstance(record, (tuple, list)):
+        size += sum(sys.getsizeof(value) for value in record)
+    return size
+
+
+def write_run(records, spill_dir=None):
+    '''
+    Writes sorted records to a temporary file, which is deleted when it is closed.
+
+    :return: the file, at its beginning
+    '''
+    file = tempfile.TemporaryFile(prefix='group-run-', dir=spill_dir)
+    pickler = pickle.Pickler(file, protocol=pickle.HIGHEST_PROTOCOL)
+    for record in records:
+        pickler.dump(record)
+    file.flush()
+    file.seek(0)
+    return file
+
+
+def read_run(file):
+    '''
+    :return: a generator of the records of a run
+    '''
+    unpickler = pickle.Unpickler(file)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
+
+
+class GroupStats(object):
+    '''
+    The memory used by the groups sorted by one reducer task.
+    '''
+
+    def __init__(self):
+        self.largest_buffer = 0   # bytes of the largest buffer
+        self.runs = 0             # runs spilled to disk
+        self.spilled_records = 0  # records written to the runs
+
+
+def external_sorted(records, key=None, reverse=False, memory_budget=default_memory_budget, spill_dir=None,
+                    stats=None):
+    '''
+    Sorts records like sorted(), but keeps at most about memory_budget bytes of them in memory (see the top of this
+    file).
+
+    :param records: an iterable, e.g. the values of a reducer
+    :param spill_dir: folder of the temporary runs, or None for the temporary folder of the system
+    :param stats: a GroupStats that is updated with the memory used, or None
+    :return: a generator of the sorted records; the runs are deleted when it is exhausted or closed
+    '''
+    stats = GroupStats() if stats is None else stats
+    runs = []
+    buffer = []
+    buffer_size = 0
+
+    try:
+        for record in records:
+            buffer.append(record)
+            buffer_size += record_size(record)
+            if buffer_size >= memory_budget:
+                stats.largest_buffer = max(stats.largest_buffer, buffer_size)
+                buffer.sort(key=key, reverse=reverse)
+                runs.append(write_run(buffer, spill_dir))
+                stats.runs += 1
+                stats.spilled_records += len(buffer)
+                buffer = []
+                buffer_size = 0
+
+        stats.largest_buffer = max(stats.largest_buffer, buffer_size)
+        buffer.sort(key=key, reverse=reverse)
+        if not runs:
+            yield from buffer
+            return
+
+        # the last buffer holds the latest records, so it goes after the runs to keep the sort stable
+        yield from heapq.merge(*([read_run(run) for run in runs] + [buffer]), key=key, reverse=reverse)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def peak_rss_mb():
+    '''
+    :return: the peak resident memory of this process in MB
+    '''
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+class MemoryBudgetMixin(object):
+    '''
+    Adds the options --memory-budget and --spill-dir and the method sorted_group to a job, and reports the memory of
+    every reducer task as counters (see the top of this file).
+
+    Usage: class MyJob(MemoryBudgetMixin, MRJob)
+    '''
+
+    def configure_args(self):
+        super(MemoryBudgetMixin, self).configure_args()
+        self.add_passthru_arg('--memory-budget', type=int, default=default_memory_budget,
+                              help='bytes of values one reducer keeps in memory before it spills them to disk')
+        self.add_passthru_arg('--spill-dir', default=None,
+                              help='folder of the sorted runs spilled by the reducers (default: system temp folder)')
+
+    def sorted_group(self, values, key=None, reverse=False):
+        '''
+        Sorts the values of a reducer within the memory budget of the job.
+
+        :return: a generator of the sorted values
+        '''
+        return external_sorted(values, key=key, reverse=reverse, memory_budget=self.options.memory_budget,
+                               spill_dir=self.options.spill_dir, stats=self.group_stats)
+
+    @property
+    def group_stats(self):
+        # one GroupStats per reducer task (see run_reducer)
+        if getattr(self, '_group_stats', None) is None:
+            self._group_stats = GroupStats()
+        return self._group_stats
+
+    def run_reducer(self, step_num=0):
+        self._group_stats = GroupStats()
+        try:
+            return super(MemoryBudgetMixin, self).run_reducer(step_num)
+        finally:
+            # the counters are summed over the tasks of a step, so the peaks get the number of the task in their name
+            task = jobconf_from_env('mapreduce.task.partition', '0')
+            self.increment_counter(counter_group, 'step %d reducer %s peak RSS (MB)' % (step_num, task),
+                                   peak_rss_mb())
+            if self.group_stats.largest_buffer:
+                self.increment_counter(counter_group, 'step %d reducer %s largest group buffer (MB)'
+                                       % (step_num, task), -(-self.group_stats.largest_buffer // (1024 * 1024)))
+            if self.group_stats.runs:
+                self.increment_counter(counter_group, 'step %d runs spilled' % step_num, self.group_stats.runs)
+                self.increment_counter(counter_group, 'step %d records spilled' % step_num,
+                                       self.group_stats.spilled_records)
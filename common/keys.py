@@ -0,0 +1,202 @@
+'''
+Petio Todorov
+Wael Fato
+
+keys.py
+
+Dictionary encoding of the string keys of the shuffle: most of the bytes that the jobs send from the mappers to the
+reducers are repeated key text, e.g. the words of Task1, the [genre, word] lists of Task2, the StockCodes of Task4
+and the paper ids of Task5. With a key dictionary every known string is replaced by its (small) integer id in the
+mappers, the ids go through the shuffle and the steps in between, and only the final reducer turns them back into
+strings. Integer keys are also cheaper to compare when the records are sorted and grouped.
+
+The dictionary is one JSON string per line; the id of a string is its line number. The strings are ordered by how
+often they occur, so the most frequent keys get the smallest ids (1 byte with the binary internal protocol and 1-2
+digits with JSON). Since every string has its own line, two strings never get the same id. Strings that are not in
+the dictionary (e.g. a word that is new in this input) are shuffled as they are.
+
+The dictionary changes the order of the shuffle (ids sort differently than strings), so values with the same sort
+key (e.g. words with the same count) reach a reducer in a different order. To keep the results independent of the
+dictionary, the final reducers decode the keys before they order anything that reaches the output, and break ties on
+the decoded strings; then only the size of the shuffle depends on the dictionary.
+
+A dictionary is built by a normal run of a job with --build-key-dictionary: the reducers that see every distinct
+key (e.g. reducer_count_words of Task1) count the keys, every reducer task writes its counts into the folder
+<dictionary>.parts and at the end of the run the counts are merged into the dictionary (and the folder is
+removed). The next runs use it:
+$ python Task1_final.py --runner=local --build-key-dictionary words.keys title.basics.tsv > Task1-results.txt
+$ python Task1_final.py --runner=local --key-dictionary words.keys title.basics.tsv > Task1-results.txt
+The jobs of Task1 and Task2 encode the same words, so they can share one dictionary.
+
+A job opts in by inheriting from KeyEncodingMixin, e.g. class MyJob(KeyEncodingMixin, BinaryProtocolMixin, MRJob),
+and uses encode_key in its mappers, record_key in the reducer that sees every key and decode_key in the final
+reducer. benchmarks/key_encoding_benchmark.py measures the shuffle and the reducers with and without encoding.
+'''
+
+import os
+import sys
+import json
+import glob
+import shutil
+import tempfile
+from collections import Counter
+
+from common.launcher import LauncherMixin, set_option
+
+parts_suffix = '.parts'
+
+
+def read_dictionary(path):
+    '''
+    :return: the list of the strings of a dictionary file; the index of a string is its id
+    '''
+    with open(path, 'r', encoding='utf_8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def write_dictionary(key_counts, path):
+    '''
+    Writes a dictionary with the most frequent strings first.
+
+    :param key_counts: a Counter of the strings
+    :return: the number of strings
+    '''
+    # equal counts are ordered by the string, so the same counts always give the same dictionary
+    keys = sorted(key_counts, key=lambda key: (-key_counts[key], key))
+    with open(path, 'w', encoding='utf_8') as file:
+        for key in keys:
+            file.write(json.dumps(key) + '\n')
+    return len(keys)
+
+
+def read_counts(path):
+    counts = Counter()
+    with open(path, 'r', encoding='utf_8') as file:
+        for line in file:
+            key, count = json.loads(line)
+            counts[key] += count
+    return counts
+
+
+def merge_parts(path):
+    '''
+    Merges the counts written by the reducer tasks into the dictionary file path and removes the folder of the
+    counts.
+
+    :return: the number of strings of the dictionary, or None if no task wrote counts
+    '''
+    parts = sorted(glob.glob(os.path.join(path + parts_suffix, 'part-*.json')))
+    if not parts:
+        return None
+    counts = Counter()
+    for part in parts:
+        counts.update(read_counts(part))
+    n_keys = write_dictionary(counts, path)
+    shutil.rmtree(path + parts_suffix, ignore_errors=True)
+    return n_keys
+
+
+class KeyEncodingMixin(LauncherMixin):
+    '''
+    Adds the options --key-dictionary and --build-key-dictionary and the methods encode_key, decode_key and
+    record_key to a job (see the top of this file).
+
+    Usage: class MyJob(KeyEncodingMixin, MRJob)
+    '''
+
+    def __init__(self, args=None):
+        super(KeyEncodingMixin, self).__init__(args)
+        self.key_counts = Counter()
+
+    def rewrite_args(self, args):
+        '''
+        The reducer tasks of the local runner run in their own working directories, so a relative
+        --build-key-dictionary path is made absolute.
+        '''
+        args = super(KeyEncodingMixin, self).rewrite_args(args)
+        path = self.options.build_key_dictionary
+        if not path:
+            return args
+        if self.options.key_dictionary:
+            raise ValueError('--key-dictionary and --build-key-dictionary cannot be used together')
+        if os.path.abspath(path) == path:
+            return args
+        return set_option(args, '--build-key-dictionary', os.path.abspath(path))
+
+    def configure_args(self):
+        super(KeyEncodingMixin, self).configure_args()
+        self.add_file_arg('--key-dictionary', default=None,
+                          help='dictionary file; the keys in it are shuffled as integer ids')
+        self.add_passthru_arg('--build-key-dictionary', default=None,
+                              help='count the keys of this run and write them into this dictionary file')
+
+    def _dictionary(self):
+        # loaded once per task
+        if not hasattr(self, '_ids'):
+            self._strings = read_dictionary(self.options.key_dictionary) if self.options.key_dictionary else []
+            self._ids = {string: key_id for key_id, string in enumerate(self._strings)}
+        return self._ids, self._strings
+
+    def encode_key(self, key):
+        '''
+        :param key: a string, or a tuple / list of strings
+        :return: the key with every string of the dictionary replaced by its id
+        '''
+        ids = self._dictionary()[0]
+        if isinstance(key, str):
+            return ids.get(key, key)
+        return type(key)(ids.get(string, string) for string in key)
+
+    def decode_key(self, key):
+        '''
+        :param key: a key (or a tuple / list of keys) returned by encode_key
+        :return: the original key
+        '''
+        strings = self._dictionary()[1]
+        if isinstance(key, int):
+            return strings[key]
+        if isinstance(key, (tuple, list)):
+            return type(key)(strings[part] if isinstance(part, int) else part for part in key)
+        return key
+
+    def record_key(self, key, count=1):
+        '''
+        Counts the strings of a key for the dictionary of --build-key-dictionary (does nothing otherwise).
+        '''
+        if not self.options.build_key_dictionary:
+            return
+        if isinstance(key, str):
+            self.key_counts[key] += count
+        else:
+            for string in key:
+                self.key_counts[string] += count
+
+    def run_reducer(self, step_num=0):
+        try:
+            return super(KeyEncodingMixin, self).run_reducer(step_num)
+        finally:
+            if self.key_counts:
+                parts_dir = self.options.build_key_dictionary + parts_suffix
+                os.makedirs(parts_dir, exist_ok=True)
+                # several reducer tasks can run at the same time, so every task gets a unique file
+                fd, path = tempfile.mkstemp(dir=parts_dir, prefix='part-', suffix='.json')
+                with os.fdopen(fd, 'w', encoding='utf_8') as file:
+                    for key, count in self.key_counts.items():
+                        file.write(json.dumps([key, count]) + '\n')
+                self.key_counts.clear()
+
+    def run_job(self):
+        path = self.options.build_key_dictionary
+        if not path:
+            return super(KeyEncodingMixin, self).run_job()
+
+        # the counts of an earlier run would be merged with this one
+        for part in glob.glob(os.path.join(path + parts_suffix, 'part-*.json')):
+            os.remove(part)
+
+        result = super(KeyEncodingMixin, self).run_job()
+        n_keys = merge_parts(path)
+        # no reducer ran if the result came from the cache (common/cache.py)
+        if n_keys is not None:
+            sys.stderr.write("key dictionary with %d keys written to %s\n" % (n_keys, path))
+        return result
@@ -0,0 +1,172 @@
+'''
+Petio Todorov
+Wael Fato
+
+launcher.py
+
+Some options and input files of the jobs can only be resolved in the process that launches the job, because the
+tasks run elsewhere (in their own working directories, or on other machines), e.g.
+- a relative --profile-dir or --build-key-dictionary has to become an absolute path,
+- compressed input files and .mtx files are replaced by a small list of descriptors (blocks or chunks),
+- Task6 --mode=auto is replaced by the mode chosen from a scan of the input files.
+
+LauncherMixin does this rewriting once, in load_args: after the command line is parsed, every mixin (and the job)
+gets the arguments in rewrite_args and returns them rewritten; if anything changed they are parsed again, and the
+rewritten arguments become the ones that mrjob passes on to the tasks. The tasks receive the rewritten arguments, so
+they do not rewrite them again.
+
+A mixin or job opts in by overriding rewrite_args, e.g.
+
+class MyMixin(LauncherMixin):
+    def rewrite_args(self, args):
+        args = super(MyMixin, self).rewrite_args(args)
+        return set_option(args, '--some-dir', os.path.abspath(self.options.some_dir))
+
+The temporary input lists that replace input files are written with write_input_list and removed after the run. The
+files that such a list refers to are given to the tasks with ship_file: the runners that run on this machine (inline
+and local) open them by their absolute path, the other runners (hadoop, emr, ...) upload them with the job into the
+working directory of every task, where the list refers to them by name. When the input of the job consists only of
+such lists, every line of a list gets its own mapper on Hadoop (NLineInputFormat), because a list is far smaller than
+one input split and would otherwise be read by a single mapper.
+'''
+
+import os
+import atexit
+import tempfile
+
+from mrjob.parse import is_uri
+
+local_runners = [None, 'inline', 'local']  # runners that run the tasks on this machine (None is the inline runner)
+list_input_format = 'org.apache.hadoop.mapred.lib.NLineInputFormat'
+
+
+def set_option(args, option, value):
+    '''
+    :return: the arguments with option set to value; options given later on the command line win, so it is added at
+             the end
+    '''
+    return args + ['%s=%s' % (option, value)]
+
+
+def default_option(args, option, value):
+    '''
+    :return: the arguments with option set to value unless they set it themselves (it is added at the front, so a
+             value given on the command line wins)
+    '''
+    return ['%s=%s' % (option, value)] + args
+
+
+def replace_inputs(args, paths, new_path):
+    '''
+    :return: the arguments with the input files paths replaced by new_path
+    '''
+    return [arg for arg in args if arg not in paths] + [new_path]
+
+
+def remove_input_list(list_path):
+    if os.path.exists(list_path):
+        os.remove(list_path)
+
+
+class LauncherMixin(object):
+    '''
+    Rewrites the command line arguments of a job once, in the process that launches it (see the top of this file).
+
+    Usage: class MyMixin(LauncherMixin), with the rewriting in rewrite_args
+    '''
+
+    def load_args(self, args):
+        super(LauncherMixin, self).load_args(args)
+        # the input files of the user, before any of them is replaced
+        self.original_input_paths = list(self.options.args)
+        self.input_lists = []
+        self.shipped_files = []
+        if self.is_task():
+            return
+
+        new_args = self.rewrite_args(list(args))
+        if new_args != list(args):
+            self._cl_args = new_args
+            super(LauncherMixin, self).load_args(new_args)
+
+    def rewrite_args(self, args):
+        '''
+        :param args: the command line arguments, with self.options parsed from them
+        :return: the rewritten arguments
+        '''
+        return args
+
+    def runs_locally(self):
+        '''
+        :return: True if the tasks run on this machine and can open the local files by their absolute path
+        '''
+        return self.options.runner in local_runners
+
+    def ship_file(self, path, name=None):
+        '''
+        Makes a file available to the tasks.
+
+        :param name: the name of the file in the working directory of the tasks (default: the name of the file,
+                     numbered if another file already has it)
+        :return: the path under which the tasks open the file: the absolute path for the runners that run on this
+                 machine, otherwise the name in the working directory, into which the file is uploaded with the job
+        '''
+        path = path if is_uri(path) else os.path.abspath(path)
+        if self.runs_locally():
+            return path
+        shipped = dict(upload.rsplit('#', 1) for upload in self.shipped_files)
+        if path in shipped:
+            return shipped[path]
+        if name is None:
+            base_name = name = os.path.basename(path)
+            number = 1
+            while name in shipped.values():
+                name = '%d-%s' % (number, base_name)
+                number += 1
+        self.shipped_files.append('%s#%s' % (path, name))
+        return name
+
+    def files(self):
+        return super(LauncherMixin, self).files() + self.shipped_files
+
+    def list_input(self):
+        '''
+        :return: True if the job runs on a cluster and all its input files are input lists of write_input_list
+        '''
+        return (not self.runs_locally() and bool(self.options.args) and
+                all(path in self.input_lists for path in self.options.args))
+
+    def hadoop_input_format(self):
+        if self.list_input():
+            return list_input_format
+        return super(LauncherMixin, self).hadoop_input_format()
+
+    def jobconf(self):
+        jobconf = super(LauncherMixin, self).jobconf()
+        if self.list_input():
+            # one line of a list per mapper, and only the line (not its offset) as the input of the mapper
+            jobconf['mapreduce.input.lineinputformat.linespermap'] = 1
+            jobconf['stream.map.input.ignoreKey'] = 'true'
+        return jobconf
+
+    def write_input_list(self, prefix, lines):
+        '''
+        Writes lines into a temporary text file that becomes (part of) the input of the job. The file is removed after
+        the run; if the job is run with make_runner() instead, it is removed when the process exits.
+
+        :return: the path of the file
+        '''
+        fd, list_path = tempfile.mkstemp(prefix=prefix, suffix='.txt')
+        atexit.register(remove_input_list, list_path)
+        with os.fdopen(fd, 'wb') as file:
+            for line in lines:
+                file.write(line + b'\n')
+        self.input_lists.append(list_path)
+        return list_path
+
+    def execute(self):
+        try:
+            super(LauncherMixin, self).execute()
+        finally:
+            for list_path in self.input_lists:
+                remove_input_list(list_path)
@@ -0,0 +1,217 @@
+'''
+Petio Todorov
+Wael Fato
+
+profiling.py
+
+A --profile option for the jobs, to find out where the time of the mappers, combiners and reducers goes (e.g.
+WORD_RE.findall, the stop word lookups, exception_handler, CountVectorizer or the encoding of the records).
+
+With --profile every task (one mapper, combiner or reducer process of one step) runs under the profiler chosen with
+--profiler:
+- cprofile (the default): cProfile counts the calls and the time of every function; the result is written as a .prof
+  file. It traces every call, so the task runs noticeably slower.
+- sample: a thread looks at the stack of the task every --profile-interval seconds and counts how often every stack
+  was seen, which costs little time. The result is written in the "collapsed stack" format (one line per stack,
+  "outer;inner;innermost count"), which flamegraph.pl, speedscope or inferno turn into a flame graph.
+- both: the two profilers run together and every task writes a .prof and a .folded file, so one run gives both
+  reports. The samples then include the overhead of cProfile (every function looks slower, the calls that run
+  many small functions the most); use sample alone for an undistorted flame graph.
+With cprofile or sample, only the chosen profiler runs, so the samples are not slowed down by cProfile.
+
+At the end of the run, the files of all tasks are merged into one report in --profile-dir:
+- profile.pstats: the merged cProfile statistics (--profiler=cprofile or both; python -m pstats profile.pstats, ...)
+- profile.txt: the functions with the highest cumulative time
+- profile.folded: the merged collapsed stacks (--profiler=sample or both)
+The report can also be merged again later with: python common/profiling.py <profile dir>
+
+A job opts in by inheriting from ProfilingMixin, e.g. class MyJob(ProfilingMixin, BinaryProtocolMixin, MRJob).
+'''
+
+import os
+import sys
+import glob
+import pstats
+import cProfile
+import tempfile
+import threading
+from collections import Counter
+
+# the root of the repository, for when this file is run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.launcher import LauncherMixin, set_option
+
+default_profile_dir = 'job-profile'
+default_interval = 0.005
+profilers = ['cprofile', 'sample', 'both']
+report_lines = 40  # functions listed in profile.txt
+
+
+class StackSampler(threading.Thread):
+    '''
+    Samples the stack of one thread at a fixed interval and counts the collapsed stacks.
+    '''
+
+    def __init__(self, interval, thread_id=None):
+        super(StackSampler, self).__init__(daemon=True)
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def write_folded(counts, path):
+    with open(path, 'w') as file:
+        for stack, count in sorted(counts.items()):
+            file.write('%s %d\n' % (stack, count))
+
+
+def read_folded(path):
+    counts = Counter()
+    with open(path, 'r') as file:
+        for line in file:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            counts[stack] += int(count)
+    return counts
+
+
+def task_profile_paths(profile_dir):
+    '''
+    :return: the .prof and .folded files written by the tasks
+    '''
+    return (sorted(glob.glob(os.path.join(profile_dir, 'task-*.prof'))),
+            sorted(glob.glob(os.path.join(profile_dir, 'task-*.folded'))))
+
+
+def merge_profiles(profile_dir):
+    '''
+    Merges the cProfile profiles of all tasks into profile.pstats and profile.txt, and their collapsed stacks into
+    profile.folded.
+
+    :return: the merged pstats.Stats, or None if no task wrote a cProfile profile
+    '''
+    prof_paths, folded_paths = task_profile_paths(profile_dir)
+    if folded_paths:
+        counts = Counter()
+        for path in folded_paths:
+            counts.update(read_folded(path))
+        write_folded(counts, os.path.join(profile_dir, 'profile.folded'))
+    if not prof_paths:
+        return None
+
+    # every task of the local runner has its own working directory (and copy of mrjob), so the folders are removed
+    # from the file names, otherwise the same function of different tasks would not be merged
+    stats = pstats.Stats(*prof_paths).strip_dirs()
+    stats.dump_stats(os.path.join(profile_dir, 'profile.pstats'))
+    with open(os.path.join(profile_dir, 'profile.txt'), 'w') as file:
+        file.write("merged profile of %d tasks\n" % len(prof_paths))
+        stats.stream = file
+        stats.sort_stats('cumulative').print_stats(report_lines)
+    return stats
+
+
+class ProfilingMixin(LauncherMixin):
+    '''
+    Adds the options --profile, --profiler, --profile-dir and --profile-interval to a job (see the top of this file).
+
+    Usage: class MyJob(ProfilingMixin, MRJob)
+    '''
+
+    def rewrite_args(self, args):
+        '''
+        The tasks of the local runner run in their own working directories, so a relative --profile-dir is made
+        absolute.
+        '''
+        args = super(ProfilingMixin, self).rewrite_args(args)
+        profile_dir = os.path.abspath(self.options.profile_dir)
+        if not self.options.profile or profile_dir == self.options.profile_dir:
+            return args
+        return set_option(args, '--profile-dir', profile_dir)
+
+    def configure_args(self):
+        super(ProfilingMixin, self).configure_args()
+        self.add_passthru_arg('--profile', action='store_true', default=False,
+                              help='profile every task and merge the profiles at the end of the run')
+        self.add_passthru_arg('--profiler', default='cprofile', choices=profilers,
+                              help='cprofile traces every call, sample looks at the stack every --profile-interval, '
+                                   'both runs the two together')
+        self.add_passthru_arg('--profile-dir', default=default_profile_dir,
+                              help='folder of the profiles of the tasks and of the merged report')
+        self.add_passthru_arg('--profile-interval', type=float, default=default_interval,
+                              help='seconds between two samples of the sampling profiler')
+
+    def _run_profiled(self, task_type, step_num, run_task):
+        if not self.options.profile:
+            return run_task(step_num)
+
+        os.makedirs(self.options.profile_dir, exist_ok=True)
+        sampler = profiler = None
+        if self.options.profiler in ('sample', 'both'):
+            sampler = StackSampler(self.options.profile_interval)
+            sampler.start()
+        if self.options.profiler in ('cprofile', 'both'):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            return run_task(step_num)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            # several tasks of the same step can run at the same time, so every task gets a unique name (with both
+            # profilers the .folded file gets the name of the .prof file)
+            fd, path = tempfile.mkstemp(dir=self.options.profile_dir, suffix='.prof' if profiler else '.folded',
+                                        prefix='task-step%d-%s-' % (step_num, task_type))
+            os.close(fd)
+            if profiler is not None:
+                profiler.dump_stats(path)
+            if sampler is not None:
+                write_folded(sampler.counts, os.path.splitext(path)[0] + '.folded')
+
+    def run_mapper(self, step_num=0):
+        return self._run_profiled('mapper', step_num, super(ProfilingMixin, self).run_mapper)
+
+    def run_combiner(self, step_num=0):
+        return self._run_profiled('combiner', step_num, super(ProfilingMixin, self).run_combiner)
+
+    def run_reducer(self, step_num=0):
+        return self._run_profiled('reducer', step_num, super(ProfilingMixin, self).run_reducer)
+
+    def run_job(self):
+        if not self.options.profile:
+            return super(ProfilingMixin, self).run_job()
+
+        # the profiles of an earlier run would be merged with this one
+        os.makedirs(self.options.profile_dir, exist_ok=True)
+        for path in sum(task_profile_paths(self.options.profile_dir), []):
+            os.remove(path)
+
+        try:
+            return super(ProfilingMixin, self).run_job()
+        finally:
+            stats = merge_profiles(self.options.profile_dir)
+            if any(task_profile_paths(self.options.profile_dir)):
+                sys.stderr.write("profile written to %s\n" % self.options.profile_dir)
+            if stats is not None:
+                stats.stream = sys.stderr
+                stats.sort_stats('cumulative').print_stats(15)
+
+
+if __name__ == '__main__':
+    merge_profiles(sys.argv[1] if len(sys.argv) > 1 else default_profile_dir)
@@ -0,0 +1,207 @@
+'''
+Petio Todorov
+Wael Fato
+
+protocols.py
+
+A compact binary internal protocol for mrjob, as an alternative to the default JSON protocol.
+
+With JSON every intermediate record is text: floats are converted to decimal strings and back (e.g. a revenue
+of 0.1 * 3 becomes "0.30000000000000004"), ints are written digit by digit and lists like Task6's
+[name, j, value] triples repeat brackets, quotes and commas for every element.
+
+BinaryProtocol encodes every value with a one byte type tag followed by its payload (similar to msgpack):
+- None, True, False: only the tag
+- int: zigzag varint (small numbers like counts and indices take 1-3 bytes)
+- float: the 8 raw bytes of the float64, so values are never rounded and need no parsing
+- str: varint length + utf-8 bytes
+- list, tuple, dict: varint number of items + the encoded items (tuples stay tuples)
+
+Hadoop streaming (and mrjob's local runners) split records on newlines and keys from values on the first tab, so
+the encoded key and value are escaped: the bytes backslash, newline, carriage return and tab are replaced by a
+backslash followed by another byte. All other bytes are written as they are. The encoding is deterministic, so
+equal keys always give equal bytes and are grouped together.
+
+A job opts into the protocol by inheriting from BinaryProtocolMixin, which adds the option
+--internal-protocol=binary (the default stays json). The final output of the jobs is not affected.
+'''
+
+import re
+import struct
+
+# type tags
+NONE, TRUE, FALSE, INT, BIG_INT, FLOAT, STR, LIST, TUPLE, DICT = b'NTFidDslth'
+
+float_struct = struct.Struct('<d')
+
+# escaping of the bytes that have a meaning for Hadoop streaming
+escape_table = {b'\\': b'\\\\', b'\n': b'\\n', b'\r': b'\\r', b'\t': b'\\t'}
+unescape_table = {value: key for key, value in escape_table.items()}
+ESCAPE_RE = re.compile(b'[\\\\\n\r\t]')
+UNESCAPE_RE = re.compile(b'\\\\.', re.DOTALL)
+
+
+def _write_varint(number, out):
+    while number > 0x7F:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def _read_varint(data, pos):
+    number, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, pos
+        shift += 7
+
+
+def _encode(value, out):
+    # bool has to be checked before int, since True and False are ints as well
+    if value is None:
+        out.append(NONE)
+    elif value is True:
+        out.append(TRUE)
+    elif value is False:
+        out.append(FALSE)
+    elif isinstance(value, int):
+        if -2 ** 63 <= value < 2 ** 63:
+            out.append(INT)
+            _write_varint((value << 1) ^ (value >> 63), out)  # zigzag: small negative numbers stay short
+        else:
+            digits = str(value).encode()
+            out.append(BIG_INT)
+            _write_varint(len(digits), out)
+            out += digits
+    elif isinstance(value, float):
+        out.append(FLOAT)
+        out += float_struct.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf_8')
+        out.append(STR)
+        _write_varint(len(data), out)
+        out += data
+    elif isinstance(value, (list, tuple)):
+        out.append(TUPLE if isinstance(value, tuple) else LIST)
+        _write_varint(len(value), out)
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out.append(DICT)
+        _write_varint(len(value), out)
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    elif hasattr(value, 'item'):
+        # numpy scalars (e.g. np.int64) are encoded as the equivalent python value
+        _encode(value.item(), out)
+    else:
+        raise TypeError("BinaryProtocol cannot encode %r" % (value,))
+
+
+def _decode(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == NONE:
+        return None, pos
+    if tag == TRUE:
+        return True, pos
+    if tag == FALSE:
+        return False, pos
+    if tag == INT:
+        number, pos = _read_varint(data, pos)
+        return (number >> 1) ^ -(number & 1), pos
+    if tag == FLOAT:
+        return float_struct.unpack_from(data, pos)[0], pos + 8
+    if tag in (STR, BIG_INT):
+        length, pos = _read_varint(data, pos)
+        text = bytes(data[pos:pos + length])
+        return (text.decode('utf_8') if tag == STR else int(text)), pos + length
+    if tag in (LIST, TUPLE):
+        length, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(length):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return (tuple(items) if tag == TUPLE else items), pos
+    if tag == DICT:
+        length, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(length):
+            key, pos = _decode(data, pos)
+            result[key], pos = _decode(data, pos)
+        return result, pos
+    raise ValueError("unknown type tag %r at position %d" % (chr(tag), pos - 1))
+
+
+def escape(data):
+    '''
+    :return: data without raw backslash, newline, carriage return and tab bytes
+    '''
+    return ESCAPE_RE.sub(lambda match: escape_table[match.group()], bytes(data))
+
+
+def unescape(data):
+    '''
+    :return: the original bytes of escaped data
+    '''
+    return UNESCAPE_RE.sub(lambda match: unescape_table[match.group()], data)
+
+
+def dumps(value):
+    '''
+    :return: the escaped binary encoding of one value
+    '''
+    out = bytearray()
+    _encode(value, out)
+    return escape(out)
+
+
+def loads(data):
+    '''
+    :param data: the output of dumps
+    :return: the decoded value
+    '''
+    value, _ = _decode(unescape(data), 0)
+    return value
+
+
+class BinaryProtocol(object):
+    '''
+    mrjob protocol: a record is the encoded key, a tab and the encoded value. The last decoded key is cached, since
+    a reducer reads the same key many times in a row.
+    '''
+    _last_key_encoded = None
+    _last_key_decoded = None
+
+    def read(self, line):
+        key_encoded, value_encoded = line.split(b'\t', 1)
+        if key_encoded != self._last_key_encoded:
+            self._last_key_encoded = key_encoded
+            self._last_key_decoded = loads(key_encoded)
+        return self._last_key_decoded, loads(value_encoded)
+
+    def write(self, key, value):
+        return dumps(key) + b'\t' + dumps(value)
+
+
+class BinaryProtocolMixin(object):
+    '''
+    Adds the option --internal-protocol to a job. With --internal-protocol=binary the records between mappers,
+    combiners and reducers (and between steps) use BinaryProtocol instead of JSON.
+
+    Usage: class MyJob(BinaryProtocolMixin, MRJob)
+    '''
+
+    def configure_args(self):
+        super(BinaryProtocolMixin, self).configure_args()
+        self.add_passthru_arg('--internal-protocol', default='json', choices=['json', 'binary'],
+                              help='protocol of the intermediate records')
+
+    def internal_protocol(self):
+        if self.options.internal_protocol == 'binary':
+            return BinaryProtocol()
+        return super(BinaryProtocolMixin, self).internal_protocol()
@@ -0,0 +1,129 @@
+'''
+Petio Todorov
+Wael Fato
+
+sampling.py
+
+An approximate answer mode for the retail jobs (Task3 and Task4): with --sample-rate below 1 only a sample of the
+customers (Task3) or products (Task4) goes through the shuffle and the reducers, so the work after the mappers is
+proportional to the sample rate.
+
+The sample is taken on the key, not on the lines: a key is in the sample if a hash of the key (and --sample-seed)
+falls below the rate. The hash does not depend on the process or the input file, so a customer is either in the
+sample with ALL of its lines (from every mapper and both retail years) or not at all. The totals of the sampled keys
+are therefore exact, and the same keys are sampled in every run.
+
+What is estimated:
+- totals over all keys (e.g. the revenue of all customers, or the number of customers): the sum over the sampled
+  keys divided by the rate (Horvitz-Thompson estimate), with a normal 95% confidence interval. The variance of the
+  estimate is (1 - rate) / rate * sum(y^2) over all keys, which is estimated without bias by
+  (1 - rate) / rate^2 * sum(y^2) over the sampled keys.
+- the rank of a sampled key among ALL keys: if m sampled keys have a larger total, about m / rate keys of the full
+  data have one. The number of those keys is estimated with a score (Wilson) confidence interval of the binomial
+  sample count, which stays meaningful for m = 0.
+- a result of the top K is flagged as ambiguous if the upper end of its rank interval is above K, i.e. keys that
+  are not in the sample could push it out of the top K.
+The rank only depends on the position of a key in the sample, so Task4 (the top 1, always at position 0) reports no
+rank; Task3 reports it for its top 10.
+
+A job opts in by inheriting from SamplingMixin and calling self.in_sample(key) in its mapper before it does the
+expensive part of the parsing, e.g. class MyJob(SamplingMixin, BinaryProtocolMixin, MRJob).
+'''
+
+import math
+import hashlib
+
+z_95 = 1.959963984540054  # two-sided 95% quantile of the normal distribution
+hash_scale = float(2 ** 64)
+
+
+def key_fraction(key, seed=0):
+    '''
+    :return: a number in [0, 1) that only depends on the key and the seed (not on the process, like hash() does)
+    '''
+    digest = hashlib.blake2b(('%s\t%s' % (seed, key)).encode('utf_8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / hash_scale
+
+
+def scaled_total(sample_values, rate, z=z_95):
+    '''
+    Estimates the sum over all keys from the values of the sampled keys.
+
+    :param sample_values: the exact totals of the sampled keys
+    :return: (estimate, low, high) of the sum over all keys
+    '''
+    total = 0.0
+    squares = 0.0
+    for value in sample_values:
+        total += value
+        squares += value * value
+    half_width = z * math.sqrt((1 - rate) / rate ** 2 * squares)
+    estimate = total / rate
+    return estimate, estimate - half_width, estimate + half_width
+
+
+def count_interval(count, rate, z=z_95):
+    '''
+    Confidence interval for the number of keys of the full data with some property, when count of the sampled keys
+    have it (every key is sampled with probability rate).
+
+    :return: (estimate, low, high)
+    '''
+    q = 1 - rate
+    center = count + z * z * q / 2
+    half_width = z * math.sqrt(q) * math.sqrt(count + z * z * q / 4)
+    # the full data has at least the keys that were seen in the sample
+    return count / rate, max(count, (center - half_width) / rate), max(count, (center + half_width) / rate)
+
+
+def rank_interval(position, rate, z=z_95):
+    '''
+    :param position: the number of sampled keys that rank before a sampled key (0 for the first one)
+    :return: (estimated rank, lowest rank, highest rank) of the key among all keys, starting at 1
+    '''
+    estimate, low, high = count_interval(position, rate, z)
+    return 1 + int(round(estimate)), 1 + int(math.ceil(low - 1e-9)), 1 + int(math.floor(high + 1e-9))
+
+
+def rank_estimate(position, k, rate, z=z_95):
+    '''
+    :param position: the number of sampled keys that rank before a sampled key of the top k (0 for the first one)
+    :return: a dictionary with the estimated rank of the key, its 95% interval and whether the key might not be in
+             the top k of all keys
+    '''
+    rank, low, high = rank_interval(position, rate, z)
+    return {'estimated_rank': rank, 'rank_ci': [low, high], 'ambiguous': high > k}
+
+
+class SamplingMixin(object):
+    '''
+    Adds the options --sample-rate and --sample-seed and the method in_sample to a job (see the top of this file).
+
+    Usage: class MyJob(SamplingMixin, MRJob)
+    '''
+
+    def configure_args(self):
+        super(SamplingMixin, self).configure_args()
+        self.add_passthru_arg('--sample-rate', type=float, default=1.0,
+                              help='fraction of the keys to process; below 1 the job gives an approximate answer')
+        self.add_passthru_arg('--sample-seed', type=int, default=0, help='seed of the key sample')
+
+    def is_sampled(self):
+        '''
+        :return: True if the job runs on a sample of the keys
+        '''
+        if not 0 < self.options.sample_rate <= 1:
+            raise ValueError('--sample-rate must be in (0, 1], not %r' % self.options.sample_rate)
+        return self.options.sample_rate < 1
+
+    def in_sample(self, key):
+        '''
+        :return: True if the key belongs to the sample (always True without sampling)
+        '''
+        if self.options.sample_rate >= 1:
+            return True
+        # the keys repeat a lot (customers and products have many lines), so every key is hashed once per task
+        sampled = self.__dict__.setdefault('_sampled_keys', {})
+        if key not in sampled:
+            sampled[key] = key_fraction(key, self.options.sample_seed) < self.options.sample_rate
+        return sampled[key]
@@ -0,0 +1,106 @@
+'''
+Petio Todorov
+Wael Fato
+
+simulate.py
+
+Runs all steps of a job in the current process, the way Hadoop streaming would: every record that leaves a
+mapper, combiner or reducer is encoded with the job's internal protocol, the encoded records are sorted by key
+and decoded again before they are grouped and passed to the next function. Unlike the inline runner, this keeps
+count of what happens at every boundary, so the benchmarks can compare e.g. the size of the shuffle and the time
+spent encoding and decoding for different protocols or options.
+
+The input is processed as ONE map task (so the combiner sees all mapper output), which is what a single split of
+a large file would look like.
+'''
+
+import time
+
+
+class BoundaryStats(object):
+    '''
+    Records and bytes that crossed one boundary (e.g. "step 0 shuffle"), the time spent encoding them and decoding
+    them again, and the time of the combiners or reducers that read them.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+        self.bytes = 0
+        self.encode_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.process_seconds = 0.0
+
+    def as_dict(self):
+        return {'boundary': self.name, 'records': self.records, 'bytes': self.bytes,
+                'encode_seconds': self.encode_seconds, 'decode_seconds': self.decode_seconds,
+                'process_seconds': self.process_seconds}
+
+
+def _cross_boundary(pairs, protocol, stats):
+    '''
+    Encodes the pairs, sorts the encoded records by key (like the shuffle does) and decodes them again.
+
+    :return: the decoded pairs, sorted by their encoded key
+    '''
+    start = time.perf_counter()
+    lines = [protocol.write(key, value) for key, value in pairs]
+    stats.encode_seconds += time.perf_counter() - start
+    stats.records += len(lines)
+    stats.bytes += sum(len(line) + 1 for line in lines)  # + 1 for the newline
+
+    # sort by the encoded key only; the order of the values of one key is kept
+    lines.sort(key=lambda line: line.split(b'\t', 1)[0])
+
+    start = time.perf_counter()
+    decoded = [protocol.read(line) for line in lines]
+    stats.decode_seconds += time.perf_counter() - start
+    return decoded
+
+
+def _has_mapper(step):
+    return step['mapper'] is not None or step['mapper_init'] is not None or step['mapper_final'] is not None
+
+
+def simulate_job(job, lines):
+    '''
+    Runs every step of the job on the given input lines.
+
+    :param job: an instance of an MRJob subclass (created with the arguments to test, e.g. the protocol)
+    :param lines: input lines (bytes or str, without the trailing newline)
+    :return: (list of the final output pairs, list of BoundaryStats, one per boundary that was crossed)
+    '''
+    input_protocol = job.input_protocol()
+    internal_protocol = job.internal_protocol()
+
+    pairs = [input_protocol.read(line if isinstance(line, bytes) else line.encode('utf_8')) for line in lines]
+    all_stats = []
+
+    steps = job.steps()
+    for step_num, step in enumerate(steps):
+        if step_num > 0:
+            # the output of the previous reducers is written to disk and read by the next mappers
+            stats = BoundaryStats('step %d input' % step_num)
+            pairs = _cross_boundary(pairs, internal_protocol, stats)
+            all_stats.append(stats)
+
+        if _has_mapper(step):
+            pairs = list(job.map_pairs(pairs, step_num))
+
+        if step['combiner'] is not None:
+            stats = BoundaryStats('step %d combiner input' % step_num)
+            records = _cross_boundary(pairs, internal_protocol, stats)
+            start = time.perf_counter()
+            pairs = list(job.combine_pairs(records, step_num))
+            stats.process_seconds += time.perf_counter() - start
+            all_stats.append(stats)
+
+        if step['reducer'] is not None:
+            stats = BoundaryStats('step %d shuffle' % step_num)
+            records = _cross_boundary(pairs, internal_protocol, stats)
+            start = time.perf_counter()
+            pairs = list(job.reduce_pairs(records, step_num))
+            stats.process_seconds += time.perf_counter() - start
+            all_stats.append(stats)
+
+    return pairs, all_stats
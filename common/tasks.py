@@ -0,0 +1,50 @@
+'''
+Petio Todorov
+Wael Fato
+
+tasks.py
+
+The job class of every task and the file it is defined in, so that tools (benchmarks, the Python API) can load
+the jobs by task name. The task folders have dashes in their names, so the job scripts are imported by path.
+'''
+
+import os
+import sys
+import importlib.util
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# task name -> (job script relative to the root of the repository, name of the job class)
+TASKS = {
+    'Task1': ('Task1-final/Task1_final.py', 'MostCommonKeywords'),
+    'Task2': ('Task2-Final/Task2.py', 'MostCommonKeywordsPerGenre'),
+    'Task3': ('Task3-final/Task3_final.py', 'MRTop10Buyers'),
+    'Task4': ('Task4-final/Task4_final.py', 'MRTheBestSellingProduct'),
+    'Task5': ('Task5-final/Task5.py', 'MRcosineSimilarity'),
+    'Task6': ('Task6-Final/Task6.py', 'MRMatrixDot'),
+}
+
+
+def load_job_class(task):
+    '''
+    Imports the job script of a task (once) and returns its job class.
+
+    :param task: a key of TASKS, e.g. 'Task3'
+    :return: the MRJob subclass of the task
+    '''
+    script, class_name = TASKS[task]
+    path = os.path.join(root_dir, script)
+    module_name = os.path.splitext(os.path.basename(script))[0]
+
+    # the scripts import modules from their own folder (e.g. Task6.py imports matrix_format)
+    script_dir = os.path.dirname(path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    module = sys.modules.get(module_name)
+    if module is None or getattr(module, '__file__', None) != path:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return getattr(module, class_name)